@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""Queryable SQLite store of orthogroup annotations.
+
+Loads the per-protein tables of eggnog-summarize-orthogroups.py and
+interpro-summarize-orthogroups.py and the orthogroup table of go-summary.py
+into normalized, indexed tables:
+
+    orthogroups       (id, name)
+    proteins          (id, orthogroup_id, name)
+    protein_info      (protein_id, source, length, description)
+    terms             (id, type, term, accession, name, namespace)
+    protein_terms     (protein_id, term_id, source)
+    orthogroup_terms  (orthogroup_id, term_id, source, n_proteins)
+    loaded            (source, orthogroup_id, digest, n_proteins)
+
+Term types are GO, Pfam, CDD, SMART, InterPro, KEGG_ko, COG, eggNOG_OG,
+MetaCyc and Reactome; a term can be looked up by its full name (Pfam:PF00067,
+ko:K00001) or its accession (PF00067, K00001).
+
+    python3 annotation_db.py build annotations.sqlite --eggnog eggnog_per_protein.tsv \\
+        --interpro interproscan_per_protein.tsv --go orthogroup_go_summary.tsv
+    python3 annotation_db.py orthogroups annotations.sqlite PF00067 GO:0016491
+    python3 annotation_db.py terms annotations.sqlite OG0000123 --type GO
+
+Builds are incremental: each orthogroup's rows are hashed per source, and only
+orthogroups whose rows changed or disappeared are rewritten, so re-running
+build after new annotation files arrive only touches those orthogroups.
+"""
+import argparse
+import csv
+import hashlib
+import sqlite3
+import sys
+import time
+from itertools import groupby
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orthogroups (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS proteins (
+    id INTEGER PRIMARY KEY, orthogroup_id INTEGER NOT NULL, name TEXT NOT NULL,
+    UNIQUE (orthogroup_id, name));
+CREATE INDEX IF NOT EXISTS proteins_name ON proteins (name);
+CREATE TABLE IF NOT EXISTS protein_info (
+    protein_id INTEGER NOT NULL, source TEXT NOT NULL, length INTEGER, description TEXT,
+    PRIMARY KEY (protein_id, source));
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY, type TEXT NOT NULL, term TEXT NOT NULL, accession TEXT NOT NULL,
+    name TEXT, namespace TEXT, UNIQUE (type, term));
+CREATE INDEX IF NOT EXISTS terms_term ON terms (term);
+CREATE INDEX IF NOT EXISTS terms_accession ON terms (accession);
+CREATE TABLE IF NOT EXISTS protein_terms (
+    protein_id INTEGER NOT NULL, term_id INTEGER NOT NULL, source TEXT NOT NULL,
+    PRIMARY KEY (protein_id, term_id, source));
+CREATE INDEX IF NOT EXISTS protein_terms_term ON protein_terms (term_id);
+CREATE TABLE IF NOT EXISTS orthogroup_terms (
+    orthogroup_id INTEGER NOT NULL, term_id INTEGER NOT NULL, source TEXT NOT NULL, n_proteins INTEGER,
+    PRIMARY KEY (orthogroup_id, term_id, source));
+CREATE INDEX IF NOT EXISTS orthogroup_terms_term ON orthogroup_terms (term_id, orthogroup_id);
+CREATE TABLE IF NOT EXISTS loaded (
+    source TEXT NOT NULL, orthogroup_id INTEGER NOT NULL, digest TEXT NOT NULL, n_proteins INTEGER,
+    PRIMARY KEY (source, orthogroup_id));
+"""
+
+EGGNOG_HEADER = ["Orthogroup", "ProteinID", "Description", "GOs", "KEGG_ko", "COG_category", "eggNOG_OGs"]
+INTERPRO_HEADER = ["Orthogroup", "Protein", "Length", "Domains", "GO_Terms", "InterPro_Entries",
+                   "MetaCyc_Pathways", "Reactome_Pathways"]
+GO_HEADER = ["Orthogroup", "BP_GO_IDs", "BP_Names", "MF_GO_IDs", "MF_Names", "CC_GO_IDs", "CC_Names"]
+NAMESPACES = {"BP": "biological_process", "MF": "molecular_function", "CC": "cellular_component"}
+
+
+def _split(value, sep):
+    if not value or value == "-":
+        return []
+    return [item.strip() for item in value.split(sep) if item.strip() and item.strip() != "-"]
+
+
+def eggnog_protein(fields):
+    """(protein, length, description, [(type, term, accession, name), ...]) of an eggNOG per-protein row."""
+    _, protein, description, gos, kegg, cog, eggnog_ogs = fields[:7]
+    terms = [("GO", go, go, None) for go in _split(gos, ",")]
+    terms += [("KEGG_ko", ko, ko.split(":", 1)[-1], None) for ko in _split(kegg, ",")]
+    terms += [("COG", letter, letter, None) for letter in dict.fromkeys(cog) if letter.isalpha()]
+    terms += [("eggNOG_OG", og, og.split("@", 1)[0], None) for og in _split(eggnog_ogs, ",")]
+    return protein, None, None if description in ("", "-") else description, terms
+
+
+def _interpro_entries(value):
+    # Entries are "IPR000001:description" joined by ", ", and descriptions may contain ", "
+    entries = []
+    for piece in value.split(", ") if value else []:
+        if piece.startswith("IPR") or not entries:
+            entries.append(piece)
+        else:
+            entries[-1] += ", " + piece
+    return entries
+
+
+def interpro_protein(fields):
+    """(protein, length, description, terms) of an InterProScan per-protein row."""
+    _, protein, length, domains, gos, ipr, metacyc, reactome = (fields + [""] * 8)[:8]
+    terms = []
+    for domain in _split(domains, ", "):
+        db, _, accession = domain.partition(":")
+        terms.append((db, domain, accession, None))
+    terms += [("GO", go, go, None) for go in _split(gos, ", ")]
+    for entry in _interpro_entries(ipr):
+        accession, _, description = entry.partition(":")
+        terms.append(("InterPro", accession, accession, description or None))
+    for kind, value in (("MetaCyc", metacyc), ("Reactome", reactome)):
+        terms += [(kind, pathway, pathway.split(":", 1)[-1].strip(), None) for pathway in _split(value, ", ")]
+    return protein, int(length) if length.isdigit() else None, None, terms
+
+
+def go_summary_terms(fields):
+    """[(type, term, accession, name, namespace), ...] of a go-summary.py row."""
+    terms = []
+    for i, ns in enumerate(["BP", "MF", "CC"]):
+        ids = _split(fields[1 + 2 * i], ";")
+        names = _split(fields[2 + 2 * i], ";")
+        if len(names) != len(ids):
+            names = [None] * len(ids)
+        terms += [("GO", go, go, name, NAMESPACES[ns]) for go, name in zip(ids, names)]
+    return terms
+
+
+# source -> (expected header, csv quoting used by the writer, row parser)
+SOURCES = {
+    "eggnog": (EGGNOG_HEADER, True, eggnog_protein),
+    "interpro": (INTERPRO_HEADER, False, interpro_protein),
+    "go_summary": (GO_HEADER, True, None),
+}
+
+
+class AnnotationDB:
+    """Build and query the annotation store."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self._terms = None
+        self._orthogroups = None
+
+    def close(self):
+        self.db.close()
+
+    # --- building ---
+
+    def _orthogroup_id(self, name):
+        og_id = self._orthogroups.get(name)
+        if og_id is None:
+            og_id = self.db.execute("INSERT INTO orthogroups (name) VALUES (?)", (name,)).lastrowid
+            self._orthogroups[name] = og_id
+        return og_id
+
+    def _term_id(self, kind, term, accession, name=None, namespace=None):
+        key = (kind, term)
+        entry = self._terms.get(key)
+        if entry is None:
+            term_id = self.db.execute(
+                "INSERT INTO terms (type, term, accession, name, namespace) VALUES (?, ?, ?, ?, ?)",
+                (kind, term, accession, name, namespace)).lastrowid
+            self._terms[key] = (term_id, name is not None)
+            return term_id
+        term_id, named = entry
+        if name is not None and not named:
+            self.db.execute("UPDATE terms SET name = ?, namespace = coalesce(namespace, ?) WHERE id = ?",
+                            (name, namespace, term_id))
+            self._terms[key] = (term_id, True)
+        return term_id
+
+    def _clear(self, source, og_id):
+        proteins = "SELECT id FROM proteins WHERE orthogroup_id = ?"
+        self.db.execute(f"DELETE FROM protein_terms WHERE source = ? AND protein_id IN ({proteins})", (source, og_id))
+        self.db.execute(f"DELETE FROM protein_info WHERE source = ? AND protein_id IN ({proteins})", (source, og_id))
+        self.db.execute("DELETE FROM orthogroup_terms WHERE source = ? AND orthogroup_id = ?", (source, og_id))
+        self.db.execute("DELETE FROM proteins WHERE orthogroup_id = ? AND id NOT IN "
+                        "(SELECT protein_id FROM protein_info)", (og_id,))
+        self.db.execute("DELETE FROM loaded WHERE source = ? AND orthogroup_id = ?", (source, og_id))
+
+    def _load_orthogroup(self, source, og_id, rows):
+        _, _, parse = SOURCES[source]
+        if parse is None:
+            # go-summary.py: orthogroup-level terms only
+            terms = [self._term_id(*term) for fields in rows for term in go_summary_terms(fields)]
+            self.db.executemany("INSERT OR IGNORE INTO orthogroup_terms VALUES (?, ?, ?, NULL)",
+                                [(og_id, term_id, source) for term_id in dict.fromkeys(terms)])
+            return None
+        proteins = {name: pid for pid, name in
+                    self.db.execute("SELECT id, name FROM proteins WHERE orthogroup_id = ?", (og_id,))}
+        counts = {}
+        for fields in rows:
+            protein, length, description, terms = parse(fields)
+            protein_id = proteins.get(protein)
+            if protein_id is None:
+                protein_id = proteins[protein] = self.db.execute(
+                    "INSERT INTO proteins (orthogroup_id, name) VALUES (?, ?)", (og_id, protein)).lastrowid
+            self.db.execute("INSERT OR REPLACE INTO protein_info VALUES (?, ?, ?, ?)",
+                            (protein_id, source, length, description))
+            term_ids = list(dict.fromkeys(self._term_id(*term) for term in terms))
+            self.db.executemany("INSERT OR IGNORE INTO protein_terms VALUES (?, ?, ?)",
+                                [(protein_id, term_id, source) for term_id in term_ids])
+            for term_id in term_ids:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        self.db.executemany("INSERT INTO orthogroup_terms VALUES (?, ?, ?, ?)",
+                            [(og_id, term_id, source, n) for term_id, n in counts.items()])
+        return len({fields[1] for fields in rows})
+
+    def load(self, source, path):
+        """Load one summarizer table; returns (orthogroups updated, unchanged, removed).
+
+        Rows of an orthogroup must be contiguous, as the summarizers write them.
+        """
+        header, quoted, _ = SOURCES[source]
+        if self._terms is None:
+            self._terms = {(kind, term): (term_id, name is not None) for term_id, kind, term, name in
+                           self.db.execute("SELECT id, type, term, name FROM terms")}
+            self._orthogroups = {name: og_id for og_id, name in self.db.execute("SELECT id, name FROM orthogroups")}
+        digests = {og_id: digest for og_id, digest in
+                   self.db.execute("SELECT orthogroup_id, digest FROM loaded WHERE source = ?", (source,))}
+        updated = unchanged = 0
+        seen = set()
+        with open(path, newline="") as f, self.db:
+            first = f.readline().rstrip("\r\n").split("\t")
+            lines = (line.rstrip("\r\n") for line in f if line.strip())
+            # The summarizers write a bare newline when there is nothing to report
+            empty = first == [""] and next(lines, None) is None
+            if first != header and not empty:
+                raise ValueError(f"{path}: header {first} does not look like a {source} table")
+            for og, group in groupby(lines, key=lambda line: line.split("\t", 1)[0].strip('"')):
+                group = list(group)
+                og_id = self._orthogroup_id(og)
+                digest = hashlib.sha1("\n".join(group).encode()).hexdigest()
+                if og_id in seen:
+                    raise ValueError(f"{path}: rows of {og} are not contiguous")
+                seen.add(og_id)
+                if digests.get(og_id) == digest:
+                    unchanged += 1
+                    continue
+                self._clear(source, og_id)
+                rows = list(csv.reader(group, delimiter="\t")) if quoted else [line.split("\t") for line in group]
+                n_proteins = self._load_orthogroup(source, og_id, rows)
+                self.db.execute("INSERT INTO loaded VALUES (?, ?, ?, ?)", (source, og_id, digest, n_proteins))
+                updated += 1
+            removed = [og_id for og_id in digests if og_id not in seen]
+            for og_id in removed:
+                self._clear(source, og_id)
+            self.db.execute("DELETE FROM orthogroups WHERE id NOT IN (SELECT orthogroup_id FROM loaded)")
+            self._orthogroups = {name: og_id for og_id, name in self.db.execute("SELECT id, name FROM orthogroups")}
+        return updated, unchanged, len(removed)
+
+    # --- queries ---
+
+    def _term_ids(self, term):
+        return [term_id for term_id, in
+                self.db.execute("SELECT id FROM terms WHERE term = ? UNION SELECT id FROM terms WHERE accession = ?",
+                                (term, term))]
+
+    def orthogroups_with(self, terms, match_all=True, source=None):
+        """Sorted orthogroups carrying all (or, with match_all=False, any) of terms."""
+        result = None
+        for term in terms:
+            term_ids = self._term_ids(term)
+            query = (f"SELECT DISTINCT o.name FROM orthogroup_terms t JOIN orthogroups o ON o.id = t.orthogroup_id "
+                     f"WHERE t.term_id IN ({','.join('?' * len(term_ids))})")
+            params = list(term_ids)
+            if source:
+                query += " AND t.source = ?"
+                params.append(source)
+            found = {name for name, in self.db.execute(query, params)} if term_ids else set()
+            if result is None:
+                result = found
+            else:
+                result = result & found if match_all else result | found
+        return sorted(result or [])
+
+    def terms_of(self, orthogroup, kind=None, source=None):
+        """[(type, term, name, source, n_proteins), ...] of an orthogroup, sorted by type and term."""
+        query = ("SELECT t.type, t.term, t.name, ot.source, ot.n_proteins FROM orthogroup_terms ot "
+                 "JOIN terms t ON t.id = ot.term_id JOIN orthogroups o ON o.id = ot.orthogroup_id WHERE o.name = ?")
+        params = [orthogroup]
+        if kind:
+            query += " AND t.type = ?"
+            params.append(kind)
+        if source:
+            query += " AND ot.source = ?"
+            params.append(source)
+        return list(self.db.execute(query + " ORDER BY t.type, t.term, ot.source", params))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query an SQLite store of orthogroup annotations")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Create or incrementally update the store")
+    build.add_argument("db", help="SQLite file")
+    build.add_argument("--eggnog", help="eggnog_per_protein.tsv from eggnog-summarize-orthogroups.py")
+    build.add_argument("--interpro", help="interproscan_per_protein.tsv from interpro-summarize-orthogroups.py")
+    build.add_argument("--go", help="orthogroup_go_summary.tsv from go-summary.py")
+
+    find = sub.add_parser("orthogroups", help="Orthogroups carrying terms (e.g. PF00067 GO:0016491)")
+    find.add_argument("db", help="SQLite file")
+    find.add_argument("terms", nargs="+", help="Terms or accessions")
+    find.add_argument("--any", action="store_true", help="Match any term instead of all")
+    find.add_argument("--source", choices=list(SOURCES), help="Only count terms from this source")
+
+    show = sub.add_parser("terms", help="Terms of an orthogroup")
+    show.add_argument("db", help="SQLite file")
+    show.add_argument("orthogroup")
+    show.add_argument("--type", help="Only this term type (e.g. GO, Pfam, InterPro, KEGG_ko)")
+    show.add_argument("--source", choices=list(SOURCES), help="Only terms from this source")
+    args = parser.parse_args()
+
+    db = AnnotationDB(args.db)
+    if args.command == "build":
+        inputs = [("eggnog", args.eggnog), ("interpro", args.interpro), ("go_summary", args.go)]
+        if not any(path for _, path in inputs):
+            parser.error("build needs at least one of --eggnog, --interpro, --go")
+        for source, path in inputs:
+            if path:
+                start = time.perf_counter()
+                updated, unchanged, removed = db.load(source, path)
+                print(f"{source}: {updated} orthogroups loaded, {unchanged} unchanged, {removed} removed "
+                      f"({time.perf_counter() - start:.1f}s)")
+    elif args.command == "orthogroups":
+        for og in db.orthogroups_with(args.terms, match_all=not args.any, source=args.source):
+            print(og)
+    else:
+        writer = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+        writer.writerow(["Type", "Term", "Name", "Source", "N_Proteins"])
+        for row in db.terms_of(args.orthogroup, kind=args.type, source=args.source):
+            writer.writerow(["" if value is None else value for value in row])
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
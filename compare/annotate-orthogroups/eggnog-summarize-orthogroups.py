@@ -1,73 +1,377 @@
-import pandas as pd
+import argparse
+import csv
 import glob
-from collections import Counter, defaultdict
+import io
+import mmap
+import os
+import numpy as np
+import pandas as pd
+from parallel_shards import ordered_map
+from summary_cache import SummaryCache
 
 ANNOT_DIR = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/lecanoromycetes/v25.08.19/Results_Aug22/eggnog"
 
-output_summary = []
-per_protein_annots = defaultdict(list)
+# pandas' default NA strings; these fields are missing exactly as pd.read_csv reports them
+NA_VALUES = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+# emapper v2 output columns, used for files without a "#query" header line
+EMAPPER_COLUMNS = [
+    "query", "seed_ortholog", "evalue", "score", "eggNOG_OGs", "max_annot_lvl", "COG_category",
+    "Description", "Preferred_name", "GOs", "EC", "KEGG_ko", "KEGG_Pathway", "KEGG_Module",
+    "KEGG_Reaction", "KEGG_rclass", "BRITE", "KEGG_TC", "CAZy", "BiGG_Reaction", "PFAMs",
+]
+PER_PROTEIN_COLUMNS = ["Description", "GOs", "KEGG_ko", "COG_category", "eggNOG_OGs"]
+# (summary column, annotation column, default top-n)
+SUMMARY_TERMS = [
+    ("Top_Descriptions", "Description", 2),
+    ("Top_GO_terms", "GOs", 3),
+    ("Top_KEGG_terms", "KEGG_ko", 3),
+    ("Top_COG_categories", "COG_category", 3),
+    ("Top_eggNOG_OGs", "eggNOG_OGs", 3),
+]
+
+
+def _looks_numeric(value):
+    # Values pd.read_csv could turn into numbers or booleans
+    if value.lower() in ("true", "false"):
+        return True
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_rows(lines, header):
+    """Per-protein values from the data lines of one orthogroup.
+
+    lines are the non-comment, non-blank lines (without line endings) of an
+    annotations file. Returns rows holding the query and PER_PROTEIN_COLUMNS
+    values (None where pandas would read NaN) of annotated proteins, as
+    pd.read_csv(comment='#', sep='\\t') reads them. Lines with quoted fields,
+    extra fields or an all-numeric output column go through read_csv itself,
+    since it would convert those values.
+    """
+    if not lines:
+        return []
+    fallback = False
+    rows = []
+    for line in lines:
+        if '"' in line:
+            fallback = True
+        rows.append(line.split('#', 1)[0].split('\t'))
+
+    if len(rows) and max(map(len, rows)) > len(header):
+        fallback = True
+    columns = [header.index('query')] + [header.index(col) for col in PER_PROTEIN_COLUMNS]
+    n = len(header)
+    selected = []
+    for fields in rows:
+        if len(fields) < n:
+            fields = fields + [""] * (n - len(fields))
+        values = [fields[i] for i in columns]
+        selected.append([None if value in NA_VALUES else value for value in values])
+    for i in range(len(columns)):
+        present = [row[i] for row in selected if row[i] is not None]
+        if present and _looks_numeric(present[0]) and all(map(_looks_numeric, present)):
+            fallback = True
+    if fallback:
+        df = pd.read_csv(io.StringIO("\n".join(lines) + "\n"), comment='#', sep='\t', names=header)
+        df = df[df['eggNOG_OGs'].notna()]
+        return [[None if pd.isna(value) else str(value) for value in row]
+                for row in df[['query'] + PER_PROTEIN_COLUMNS].itertuples(index=False, name=None)]
+    # Drop empty/unannotated entries
+    return [row for row in selected if row[-1] is not None]
+
+
+def _is_data_line(line):
+    # read_csv skips comment lines and lines of nothing but spaces
+    return not line.startswith('#') and line.strip(' ') != ''
 
-def top_terms(term_list, n=3):
-    flat = [term.strip() for entry in term_list for term in str(entry).split(",") if term.strip() != '-' and term.strip()]
-    return ", ".join([f"{term} ({count})" for term, count in Counter(flat).most_common(n)])
 
-for file in glob.glob(f"{ANNOT_DIR}/*.emapper.annotations"):
-    orthogroup_id = file.split("/")[-1].split(".")[0]
+def _header_line(line):
+    # The header is the first line starting with # but not ##
+    return line.startswith('#') and not line.startswith('##')
 
-    # Read header line first (the one starting with # but not ##)
-    with open(file, 'r') as f:
+
+def read_annotations(file, header=None):
+    """Parse one *.emapper.annotations file in a single pass; returns (header, rows).
+
+    header is kept from the previous file if this one has none; with no header
+    at all, rows is None (annotation_files then falls back to EMAPPER_COLUMNS).
+    """
+    lines = []
+    header_seen = False
+    with open(file, encoding="utf-8") as f:
         for line in f:
-            if line.startswith('#') and not line.startswith('##'):
+            line = line.rstrip("\n")
+            if _is_data_line(line):
+                lines.append(line)
+            elif not header_seen and _header_line(line):
                 header = line.lstrip('#').strip().split('\t')
-                break
+                header_seen = True
+    if header is None:
+        return None, None
+    return header, parse_rows(lines, header)
 
-    # Read data skipping commented lines
-    df = pd.read_csv(file, comment='#', sep='\t', names=header)
 
-    # Drop empty/unannotated entries
-    df = df[df['eggNOG_OGs'].notna()]
-
-    # Collect annotation columns for summary
-    all_desc = df['Description'].dropna().tolist()
-    all_go    = df['GOs'].dropna().tolist()
-    all_kegg  = df['KEGG_ko'].dropna().tolist()
-    all_cog   = df['COG_category'].dropna().tolist()
-    all_og    = df['eggNOG_OGs'].dropna().tolist()
-
-    # Append summary info
-    output_summary.append({
-        "Orthogroup": orthogroup_id,
-        "Top_Descriptions": top_terms(all_desc, 2),
-        "Top_GO_terms": top_terms(all_go, 3),
-        "Top_KEGG_terms": top_terms(all_kegg, 3),
-        "Top_COG_categories": top_terms(all_cog, 3),
-        "Top_eggNOG_OGs": top_terms(all_og, 3)
+def annotation_files(annot_dir, cache=None, workers=1):
+    """Yield (orthogroup, rows) for each {OG}.emapper.annotations file, in sorted order.
+
+    With a SummaryCache, unchanged files are not parsed again. With workers > 1
+    the remaining files are parsed in a process pool (see parallel_shards.py);
+    results are merged in file order, so the output matches a serial run.
+    """
+    files = sorted(glob.glob(f"{annot_dir}/*.emapper.annotations"))
+    stale = [file for file in files if cache is None or not cache.is_fresh(file)]
+    parsed = ordered_map(read_annotations, stale, workers)
+    stale = set(stale)
+    header = None
+    for file in files:
+        orthogroup_id = file.split("/")[-1].split(".")[0]
+        if file not in stale:
+            cached = cache.load(file)
+            header, rows = cached["header"], cached["rows"]
+        else:
+            file_header, rows = next(parsed)
+            if file_header is None:
+                # No header line: reuse the previous file's header, as a serial run does, else the emapper v2 columns
+                file_header, rows = read_annotations(file, header or EMAPPER_COLUMNS)
+            header = file_header
+            if cache is not None:
+                cache.put(file, {"header": header, "rows": rows})
+        yield orthogroup_id, rows
+
+
+def read_orthogroups(tsv_path):
+    """Orthogroups.tsv → (orthogroup names, {protein: (orthogroup index, position in orthogroup)})."""
+    orthogroups = []
+    members = {}
+    with open(tsv_path) as f:
+        next(f)
+        for line in f:
+            fields = line.rstrip("\r\n").split("\t")
+            og_index = len(orthogroups)
+            orthogroups.append(fields[0])
+            position = 0
+            for cell in fields[1:]:
+                for protein in cell.split(", "):
+                    if protein:
+                        members[protein.strip()] = (og_index, position)
+                        position += 1
+    return orthogroups, members
+
+
+def proteome_orthogroups(annotations, orthogroups_tsv, og_list=None):
+    """Yield (orthogroup, rows) from one emapper run over the whole proteome.
+
+    Proteins are assigned with Orthogroups.tsv. A first pass records where each
+    protein's line is; the lines are then read back one orthogroup at a time,
+    ordered by the protein's position in Orthogroups.tsv. A per-orthogroup run
+    keeps the line order of each emapper file instead, so per-protein rows, and
+    the order of tied terms in the Top_* columns, match it only when the
+    per-orthogroup FASTAs list their members in Orthogroups.tsv order. With
+    og_list, every listed orthogroup is yielded (as a per-orthogroup run would
+    produce a file for each); otherwise those with at least one line, in sorted
+    order. Without a "#query" header line the columns are EMAPPER_COLUMNS.
+    """
+    orthogroups, members = read_orthogroups(orthogroups_tsv)
+    header = None
+    og_codes, positions, starts, ends = [], [], [], []
+    unassigned = 0
+    with open(annotations, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        start = 0
+        size = len(buf)
+        while start < size:
+            end = buf.find(b"\n", start)
+            if end < 0:
+                end = size
+            line = buf[start:end].rstrip(b"\r").decode("utf-8")
+            if _is_data_line(line):
+                member = members.get(line.split('#', 1)[0].split('\t', 1)[0])
+                if member is None:
+                    unassigned += 1
+                else:
+                    og_codes.append(member[0])
+                    positions.append(member[1])
+                    starts.append(start)
+                    ends.append(end)
+            elif header is None and _header_line(line):
+                header = line.lstrip('#').strip().split('\t')
+            start = end + 1
+        if unassigned:
+            print(f"Warning: {unassigned} annotated proteins are not in {orthogroups_tsv}; skipped")
+
+        og_codes = np.array(og_codes, dtype=np.int64)
+        order = np.lexsort((np.arange(len(og_codes)), np.array(positions, dtype=np.int64), og_codes))
+        starts = np.array(starts, dtype=np.int64)[order]
+        ends = np.array(ends, dtype=np.int64)[order]
+        og_codes = og_codes[order]
+        bounds = np.flatnonzero(np.r_[True, og_codes[1:] != og_codes[:-1], True]) if len(og_codes) else np.array([0])
+        found = {int(og_codes[lo]): (lo, hi) for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist())}
+
+        if og_list is None:
+            og_list = sorted(orthogroups[i] for i in found)
+        og_lookup = {og: i for i, og in enumerate(orthogroups)}
+        for og in og_list:
+            lo, hi = found.get(og_lookup.get(og), (0, 0))
+            lines = [buf[s:e].rstrip(b"\r").decode("utf-8") for s, e in zip(starts[lo:hi].tolist(), ends[lo:hi].tolist())]
+            yield og, parse_rows(lines, header or EMAPPER_COLUMNS)
+
+
+def top_terms_by_group(groups, values, n_groups, n=3):
+    """The n most common comma-separated terms of each orthogroup, as "term (count), ...".
+
+    groups[i] is the orthogroup index (0..n_groups-1) of values[i] (None for
+    missing). All values are split on commas in one go, then counted per
+    orthogroup and term ("-" and empty terms are skipped); terms are ranked by
+    count with ties in order of first appearance, as Counter.most_common does.
+    Returns one string per orthogroup ("" when it has no terms).
+    """
+    result = [""] * n_groups
+    present = [i for i, value in enumerate(values) if value is not None]
+    if not present or n <= 0:
+        return result
+    terms = pd.Series([values[i] for i in present], dtype=object).str.split(",").explode().str.strip()
+    keep = ((terms != "") & (terms != "-")).to_numpy()
+    if not keep.any():
+        return result
+    table = pd.DataFrame({
+        "group": np.asarray(groups, dtype=np.int64)[np.asarray(present)][terms.index.to_numpy()[keep]],
+        "term": terms.to_numpy()[keep],
     })
+    table["position"] = np.arange(len(table))
+    counts = table.groupby(["group", "term"], sort=False)["position"].agg(["size", "min"]).reset_index()
+    counts = counts.sort_values(["group", "size", "min"], ascending=[True, False, True], kind="stable")
+    counts = counts[counts.groupby("group").cumcount() < n]
+    labels = counts["term"] + " (" + counts["size"].astype(str) + ")"
+    for group, text in labels.groupby(counts["group"].to_numpy(), sort=False).agg(", ".join).items():
+        result[group] = text
+    return result
+
+
+def summarize(orthogroups, summary_out, per_protein_out, top_n=None, batch_size=2000):
+    """Stream (orthogroup, rows) pairs into the summary and per-protein TSVs.
+
+    orthogroups comes from annotation_files or proteome_orthogroups. Per-protein
+    rows are written as they are read, and top terms are computed with top_terms_by_group for batch_size
+    orthogroups at a time, so memory does not grow with the number of proteins.
+    top_n maps annotation columns to the number of top terms (defaults in
+    SUMMARY_TERMS).
+    """
+    top_n = {column: (top_n or {}).get(column, n) for _, column, n in SUMMARY_TERMS}
+    term_columns = [1 + PER_PROTEIN_COLUMNS.index(column) for _, column, _ in SUMMARY_TERMS]
+    with open(summary_out, "w", newline="") as summary_file, open(per_protein_out, "w", newline="") as per_protein_file:
+        summary_writer = csv.writer(summary_file, delimiter="\t", lineterminator="\n")
+        per_protein_writer = csv.writer(per_protein_file, delimiter="\t", lineterminator="\n")
+        # Headers are written with the first row, as pandas writes a bare newline for an empty table
+        summary_started = per_protein_started = False
+
+        batch_ogs = []
+        batch_groups = []
+        batch_values = [[] for _ in SUMMARY_TERMS]
+
+        def flush_batch():
+            nonlocal summary_started
+            if not batch_ogs:
+                return
+            if not summary_started:
+                summary_writer.writerow(["Orthogroup"] + [name for name, _, _ in SUMMARY_TERMS])
+                summary_started = True
+            tops = [top_terms_by_group(batch_groups, values, len(batch_ogs), top_n[column])
+                    for values, (_, column, _) in zip(batch_values, SUMMARY_TERMS)]
+            summary_writer.writerows([og] + list(row) for og, row in zip(batch_ogs, zip(*tops)))
+            batch_ogs.clear()
+            batch_groups.clear()
+            for values in batch_values:
+                values.clear()
+
+        for orthogroup_id, rows in orthogroups:
+            group = len(batch_ogs)
+            batch_ogs.append(orthogroup_id)
+            # Store per-protein annotation details
+            for row in rows:
+                if not per_protein_started:
+                    per_protein_writer.writerow(["Orthogroup", "ProteinID"] + PER_PROTEIN_COLUMNS)
+                    per_protein_started = True
+                per_protein_writer.writerow([orthogroup_id, "" if row[0] is None else row[0]] +
+                                            ["-" if value is None else value for value in row[1:]])
+                batch_groups.append(group)
+                for values, i in zip(batch_values, term_columns):
+                    values.append(row[i])
+            if len(batch_ogs) >= batch_size:
+                flush_batch()
+        flush_batch()
+
+        if not summary_started:
+            summary_file.write("\n")
+        if not per_protein_started:
+            per_protein_file.write("\n")
+
+    print(f"Summary saved to {summary_out}")
+    print(f"Per-protein annotations saved to {per_protein_out}")
+
+
+def parse_top_n(spec):
+    """COLUMN=N, e.g. GOs=5."""
+    column, sep, n = spec.partition("=")
+    columns = [column for _, column, _ in SUMMARY_TERMS]
+    if not sep or column not in columns or not n.isdigit():
+        raise argparse.ArgumentTypeError(f"expected COLUMN=N with COLUMN one of {', '.join(columns)}: {spec}")
+    return column, int(n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-orthogroup eggNOG-mapper annotations")
+    parser.add_argument("-i", "--annot-dir", default=ANNOT_DIR, help="Directory of *.emapper.annotations files")
+    parser.add_argument("--annotations", default=None,
+                        help="One emapper .emapper.annotations file for the whole proteome, used instead of "
+                             "--annot-dir; proteins are assigned to orthogroups with --orthogroups")
+    parser.add_argument("--orthogroups", default=None, help="Orthogroups.tsv (with --annotations)")
+    parser.add_argument("-l", "--list", default=None,
+                        help="With --annotations, summarize these orthogroups (one per line, can include .fa), "
+                             "as a per-orthogroup run over the same list would (default: every orthogroup "
+                             "with an annotated protein)")
+    parser.add_argument("--summary-out", default=None,
+                        help="Orthogroup summary TSV (default: ANNOT_DIR/../Annotate_Orthogroups/eggnog_orthogroup_summary.tsv)")
+    parser.add_argument("--per-protein-out", default=None,
+                        help="Per-protein TSV (default: ANNOT_DIR/../eggnog_per_protein.tsv)")
+    parser.add_argument("--cache", default=None,
+                        help="Parse cache for re-runs (default: .eggnog_summary_cache.sqlite next to the summary)")
+    parser.add_argument("--no-cache", action="store_true", help="Parse every file; do not read or write the cache")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for parsing --annot-dir files (default: 1)")
+    parser.add_argument("--top-n", type=parse_top_n, nargs="+", default=[], metavar="COLUMN=N",
+                        help="Number of top terms per column, e.g. --top-n GOs=5 Description=3 "
+                             "(default: Description=2, 3 for GOs, KEGG_ko, COG_category and eggNOG_OGs)")
+    parser.add_argument("--batch-size", type=int, default=2000,
+                        help="Orthogroups per top-term aggregation batch (default: 2000)")
+    args = parser.parse_args()
+
+    if args.annotations and not args.orthogroups:
+        parser.error("--annotations needs --orthogroups")
+    annot_dir = os.path.dirname(os.path.abspath(args.annotations)) if args.annotations else args.annot_dir
+    summary_out = args.summary_out or f"{annot_dir}/../Annotate_Orthogroups/eggnog_orthogroup_summary.tsv"
+    per_protein_out = args.per_protein_out or f"{annot_dir}/../eggnog_per_protein.tsv"
+
+    cache = None
+    if args.annotations:
+        og_list = None
+        if args.list:
+            with open(args.list) as f:
+                og_list = [line.strip().replace(".fa", "") for line in f if line.strip()]
+        orthogroups = proteome_orthogroups(args.annotations, args.orthogroups, og_list)
+    else:
+        if not args.no_cache:
+            cache = SummaryCache(args.cache or os.path.join(os.path.dirname(os.path.abspath(summary_out)),
+                                                            ".eggnog_summary_cache.sqlite"), "eggnog")
+        orthogroups = annotation_files(annot_dir, cache, workers=args.workers)
+    summarize(orthogroups, summary_out, per_protein_out, top_n=dict(args.top_n), batch_size=args.batch_size)
+    if cache is not None:
+        cache.report(cache.close())
+
 
-    # Store per-protein annotation details
-    for _, row in df.iterrows():
-        per_protein_annots[orthogroup_id].append({
-            "ProteinID": row['query'],
-            "Description": row['Description'] if pd.notna(row['Description']) else "-",
-            "GOs": row['GOs'] if pd.notna(row['GOs']) else "-",
-            "KEGG_ko": row['KEGG_ko'] if pd.notna(row['KEGG_ko']) else "-",
-            "COG_category": row['COG_category'] if pd.notna(row['COG_category']) else "-",
-            "eggNOG_OGs": row['eggNOG_OGs'] if pd.notna(row['eggNOG_OGs']) else "-"
-        })
-
-# Save orthogroup summary
-summary_df = pd.DataFrame(output_summary)
-summary_df.to_csv(f"{ANNOT_DIR}/../Annotate_Orthogroups/eggnog_orthogroup_summary.tsv", sep="\t", index=False)
-print("Summary saved to eggnog_orthogroup_summary.tsv")
-
-# Save per-protein detailed annotations
-per_protein_rows = []
-for og, proteins in per_protein_annots.items():
-    for prot in proteins:
-        row = {"Orthogroup": og}
-        row.update(prot)
-        per_protein_rows.append(row)
-
-per_protein_df = pd.DataFrame(per_protein_rows)
-per_protein_df.to_csv(f"{ANNOT_DIR}/../eggnog_per_protein.tsv", sep="\t", index=False)
-print("Per-protein annotations saved to eggnog_per_protein.tsv")
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
+import argparse
+import math
 import os
-import glob
 import csv
 from collections import defaultdict
-from goatools.obo_parser import GODag
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from go_ontology import DEFAULT_CACHE_DIR, load_ontology
 
 # Paths
 EGGNOG_DIR = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/lecanoromycetes/proteins/Results_May04/eggnog-annotations"
@@ -10,88 +13,306 @@ INTERPRO_DIR = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/leca
 GO_OBO_PATH = "/hpc/group/bio1/ewhisnant/databases/go/go.obo"
 OUTPUT_FILE = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/lecanoromycetes/proteins/Results_May04/orthogroup_go_summary.tsv"
 
-# Load GO ontology
-print("Loading GO ontology...")
-go_dag = GODag(GO_OBO_PATH)
 
-# Data structure: orthogroup -> namespace -> set of (GO ID, name)
-orthogroup_go = defaultdict(lambda: defaultdict(set))
+NAMESPACES = ["BP", "MF", "CC"]
+NAMESPACE_SHORT = {"biological_process": "BP", "molecular_function": "MF", "cellular_component": "CC"}
+# GO column names in the emapper header, and the GOs column of emapper v2 output without one
+EGGNOG_GO_COLUMNS = ("GOs", "GO_terms")
+EGGNOG_GO_FIELD = 9
+# InterProScan TSV (-goterms): 0 protein, ..., 11 InterPro accession, 12 InterPro description, 13 GO terms
+INTERPRO_GO_FIELD = 13
 
-# --- Process EggNOG annotations ---
-print("Processing EggNOG annotations...")
-for filepath in glob.glob(f"{EGGNOG_DIR}/*.emapper.annotations"):
-    og = os.path.basename(filepath).split(".")[0]
+
+def term_namespaces(go_dag):
+    """Index into NAMESPACES per term code (-1 outside BP/MF/CC)."""
+    ns_index = [NAMESPACES.index(NAMESPACE_SHORT[ns]) if ns in NAMESPACE_SHORT else -1 for ns in go_dag.namespace_names]
+    return np.array(ns_index, dtype=np.int8)[go_dag.namespace]
+
+
+def go_lookup_table(go_dag, term_ns):
+    """GO id (main or alt) -> (index into NAMESPACES, term code) for BP/MF/CC terms."""
+    term_ns = term_ns.tolist()
+    return {go_id: (term_ns[i], i) for go_id, i in go_dag.index.items() if term_ns[i] >= 0}
+
+
+def eggnog_go_ids(filepath):
+    """Unique GO ids in an eggNOG annotation file.
+
+    The GO column is found by name in the "#query" header line (GOs in emapper
+    v2, GO_terms in v1); files without one are read as emapper v2 output.
+    """
+    go_col = EGGNOG_GO_FIELD
+    go_fields = set()
     with open(filepath, "r") as f:
         for line in f:
             if line.startswith("#"):
+                if not line.startswith("##"):
+                    header = line.lstrip("#").rstrip("\r\n").split("\t")
+                    go_col = next((header.index(name) for name in EGGNOG_GO_COLUMNS if name in header), go_col)
                 continue
-            fields = line.strip().split("\t")
-            if len(fields) < 16:
+            fields = line.rstrip("\r\n").split("\t")
+            if len(fields) <= go_col:
                 continue
-            go_field = fields[13]
+            go_field = fields[go_col].strip()
             if go_field and go_field != "-":
-                for go_id in go_field.split(","):
-                    go_id = go_id.strip()
-                    if go_id in go_dag:
-                        term = go_dag[go_id]
-                        ns = term.namespace
-                        ns_short = {"biological_process": "BP", "molecular_function": "MF", "cellular_component": "CC"}.get(ns, None)
-                        if ns_short:
-                            orthogroup_go[og][ns_short].add((go_id, term.name))
-
-# --- Process InterProScan annotations ---
-print("Processing InterProScan annotations...")
-for file in os.listdir(INTERPRO_DIR):
-    if not file.endswith(".tsv"):
-        continue
-    og = file.replace(".interproscan.tsv", "")
-    filepath = os.path.join(INTERPRO_DIR, file)
+                go_fields.add(go_field)
+    return {go_id.strip() for go_field in go_fields for go_id in go_field.split(",")}
+
+
+def interpro_go_ids(filepath):
+    """Unique GO ids in an InterProScan TSV file (evidence suffixes like "(InterPro)" removed)."""
+    go_fields = set()
     with open(filepath) as f:
         for line in f:
             if line.startswith("#"):
                 continue
-            fields = line.strip().split("\t")
-            if len(fields) < 14:
+            fields = line.rstrip("\r\n").split("\t")
+            if len(fields) <= INTERPRO_GO_FIELD:
                 continue
-            go_field = fields[12]
+            go_field = fields[INTERPRO_GO_FIELD].strip()
             if go_field and go_field != "-":
-                for go_id in go_field.split("|"):
-                    go_id = go_id.strip().split("(")[0]
-                    if go_id in go_dag:
-                        term = go_dag[go_id]
-                        ns = term.namespace
-                        ns_short = {"biological_process": "BP", "molecular_function": "MF", "cellular_component": "CC"}.get(ns, None)
-                        if ns_short:
-                            orthogroup_go[og][ns_short].add((go_id, term.name))
-
-# Collect all orthogroups across both datasets
-all_orthogroups = set(orthogroup_go.keys())
-for file in glob.glob(f"{EGGNOG_DIR}/*.emapper.annotations"):
-    og = os.path.basename(file).split(".")[0]
-    all_orthogroups.add(og)
-for file in os.listdir(INTERPRO_DIR):
-    if file.endswith(".tsv"):
-        og = file.replace(".interproscan.tsv", "")
-        all_orthogroups.add(og)
-
-# Write output
-print(f"Writing summary to: {OUTPUT_FILE}")
-with open(OUTPUT_FILE, "w") as out:
-    writer = csv.writer(out, delimiter="\t")
-    writer.writerow([
-        "Orthogroup",
-        "BP_GO_IDs", "BP_Names",
-        "MF_GO_IDs", "MF_Names",
-        "CC_GO_IDs", "CC_Names"
-    ])
-
-    for og in sorted(all_orthogroups):
-        row = [og]
-        for ns in ['BP', 'MF', 'CC']:
-            terms = sorted(orthogroup_go[og][ns])
-            ids = "; ".join(t[0] for t in terms)
-            names = "; ".join(t[1] for t in terms)
-            row.extend([ids if ids else "-", names if names else "-"])
-        writer.writerow(row)
-
-print("Done.")
+                go_fields.add(go_field)
+    return {go_id.strip().split("(")[0] for go_field in go_fields for go_id in go_field.split("|")}
+
+
+def annotation_jobs(eggnog_dir, interpro_dir):
+    """(orthogroup, parser, path) for every annotation file, scanning each directory once."""
+    jobs = []
+    with os.scandir(eggnog_dir) as entries:
+        for entry in entries:
+            # Same files as glob("*.emapper.annotations"), which skips hidden names
+            if entry.name.endswith(".emapper.annotations") and not entry.name.startswith("."):
+                jobs.append((entry.name.split(".")[0], eggnog_go_ids, entry.path))
+    with os.scandir(interpro_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".tsv"):
+                jobs.append((entry.name.replace(".interproscan.tsv", ""), interpro_go_ids, entry.path))
+    return jobs
+
+
+def _ragged_ranges(starts, lengths):
+    """Concatenation of arange(start, start + length) for each (start, length)."""
+    ends = np.cumsum(lengths)
+    return np.arange(int(ends[-1]) if len(ends) else 0) - np.repeat(ends - lengths - starts, lengths)
+
+
+def incidence_matrix(orthogroups, orthogroup_go):
+    """Orthogroup × GO-term incidence in CSR form: (indptr, sorted term codes of each orthogroup)."""
+    rows = [sorted({code for terms in orthogroup_go[og] for code in terms.values()}) for og in orthogroups]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    codes = np.fromiter((code for row in rows for code in row), dtype=np.int64, count=int(indptr[-1]))
+    return indptr, codes
+
+
+def propagate(indptr, codes, go_dag, chunk_terms=1 << 14, chunk_orthogroups=1024):
+    """True-path rule: add every is_a ancestor to each orthogroup's terms.
+
+    The transitive closure is held as one bit row per term in use (the term
+    plus its ancestors); an orthogroup's propagated terms are the OR of the
+    rows of its direct terms. Returns the propagated (indptr, codes).
+    """
+    offsets, ancestor_codes = go_dag.ancestor_offsets, go_dag.ancestor_codes
+    used = np.unique(codes)
+    universe = np.union1d(used, ancestor_codes[_ragged_ranges(offsets[used], offsets[used + 1] - offsets[used])])
+    n_universe = len(universe)
+    lengths = offsets[universe + 1] - offsets[universe]
+    rows = np.concatenate([np.arange(n_universe), np.repeat(np.arange(n_universe), lengths)])
+    cols = np.concatenate([np.arange(n_universe), np.searchsorted(
+        universe, ancestor_codes[_ragged_ranges(offsets[universe], lengths)])])
+    closure = np.zeros((n_universe, (n_universe + 7) // 8), dtype=np.uint8)
+    np.bitwise_or.at(closure, (rows, cols >> 3), (0x80 >> (cols & 7)).astype(np.uint8))
+
+    local = np.searchsorted(universe, codes)
+    counts = np.diff(indptr)
+    new_counts = np.zeros(len(counts), dtype=np.int64)
+    new_codes = []
+    row = 0
+    while row < len(counts):
+        # Chunks of orthogroups bounded in direct terms and rows, to bound the unpacked bit matrix
+        end = int(np.searchsorted(indptr, indptr[row] + chunk_terms, side="right")) - 1
+        end = min(max(end, row + 1), row + chunk_orthogroups, len(counts))
+        nonempty = np.flatnonzero(counts[row:end]) + row
+        if len(nonempty):
+            bits = np.bitwise_or.reduceat(closure[local[indptr[row]:indptr[end]]], indptr[nonempty] - indptr[row], axis=0)
+            # Unpack only the non-zero bytes; (orthogroup, term) pairs come out sorted
+            og_idx, byte_idx = np.nonzero(bits)
+            byte_row, bit = np.nonzero(np.unpackbits(bits[og_idx, byte_idx][:, None], axis=1))
+            og_idx, term_idx = og_idx[byte_row], byte_idx[byte_row] * 8 + bit
+            new_counts[nonempty] = np.bincount(og_idx, minlength=len(nonempty))
+            new_codes.append(universe[term_idx])
+        row = end
+    new_indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    new_indptr[1:] = np.cumsum(new_counts)
+    return new_indptr, np.concatenate(new_codes) if new_codes else np.zeros(0, dtype=np.int64)
+
+
+def hypergeom_sf(k, N, K, n):
+    """P(X >= k) for X ~ Hypergeometric(population N, K successes, n draws), vectorized over k and K.
+
+    Sums the pmf over k..min(K, n) with a log-factorial table, so the work is
+    bounded by the number of annotated orthogroups rather than by terms × n.
+    """
+    log_factorial = np.array([math.lgamma(i + 1) for i in range(N + 1)])
+
+    def log_comb(a, b):
+        return log_factorial[a] - log_factorial[b] - log_factorial[a - b]
+
+    lengths = np.maximum(np.minimum(K, n) - k + 1, 0)
+    p = np.zeros(len(k))
+    tail = lengths > 0
+    if not tail.any():
+        return p
+    x = _ragged_ranges(k[tail], lengths[tail])
+    K_x = np.repeat(K[tail], lengths[tail])
+    log_pmf = log_comb(K_x, x) + log_comb(N - K_x, n - x) - log_comb(N, n)
+    starts = np.cumsum(lengths[tail]) - lengths[tail]
+    peak = np.maximum.reduceat(log_pmf, starts)
+    total = np.add.reduceat(np.exp(log_pmf - np.repeat(peak, lengths[tail])), starts)
+    p[tail] = np.minimum(1.0, np.exp(peak) * total)
+    return p
+
+
+def benjamini_hochberg(p):
+    """Benjamini-Hochberg adjusted p-values."""
+    order = np.argsort(p, kind="stable")
+    ranked = p[order] * len(p) / np.arange(1, len(p) + 1)
+    adjusted = np.empty_like(p)
+    adjusted[order] = np.minimum(1.0, np.minimum.accumulate(ranked[::-1])[::-1])
+    return adjusted
+
+
+def enrichment(indptr, codes, orthogroups, foreground, n_terms):
+    """One-sided hypergeometric test of every annotated term for a foreground set of orthogroups.
+
+    Returns (term codes, foreground counts, background counts, n, N, p, BH-adjusted p).
+    """
+    is_foreground = np.array([og in foreground for og in orthogroups], dtype=bool)
+    N, n = len(orthogroups), int(is_foreground.sum())
+    row_of = np.repeat(np.arange(N), np.diff(indptr))
+    K = np.bincount(codes, minlength=n_terms)
+    k = np.bincount(codes[is_foreground[row_of]], minlength=n_terms)
+    tested = np.flatnonzero(K)
+    p = hypergeom_sf(k[tested], N, K[tested], n)
+    return tested, k[tested], K[tested], n, N, p, benjamini_hochberg(p)
+
+
+def read_orthogroup_list(path):
+    """Orthogroup ids from the first column of a text file (blank and # lines skipped)."""
+    with open(path) as f:
+        return {line.split()[0] for line in f if line.strip() and not line.startswith("#")}
+
+
+def summarize(eggnog_dir, interpro_dir, go_obo_path, output_file, go_cache=DEFAULT_CACHE_DIR, workers=4,
+              propagate_terms=False, incidence_output=None, foreground_file=None, enrichment_output=None):
+    # Load GO ontology (compiled once per go.obo version, see go_ontology.py)
+    print("Loading GO ontology...")
+    go_dag = load_ontology(go_obo_path, go_cache, verbose=True)
+    term_ns = term_namespaces(go_dag)
+    lookup = go_lookup_table(go_dag, term_ns)
+
+    # Data structure: orthogroup -> namespace index -> {GO ID: term code}
+    orthogroup_go = defaultdict(lambda: [{}, {}, {}])
+
+    # --- Process EggNOG and InterProScan annotations ---
+    jobs = annotation_jobs(eggnog_dir, interpro_dir)
+    print(f"Processing {len(jobs)} EggNOG and InterProScan annotation files...")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for (og, _, _), go_ids in zip(jobs, pool.map(lambda job: job[1](job[2]), jobs)):
+            terms = orthogroup_go[og]
+            for go_id in go_ids:
+                hit = lookup.get(go_id)
+                if hit is not None:
+                    terms[hit[0]][go_id] = hit[1]
+
+    orthogroups = sorted(orthogroup_go)
+    if propagate_terms or incidence_output or foreground_file:
+        indptr, codes = incidence_matrix(orthogroups, orthogroup_go)
+        if propagate_terms:
+            print("Propagating GO terms to their is_a ancestors...")
+            indptr, codes = propagate(indptr, codes, go_dag)
+            # Propagated rows list main GO ids (alt ids of direct annotations are resolved)
+            for i, og in enumerate(orthogroups):
+                terms = [{}, {}, {}]
+                for code in codes[indptr[i]:indptr[i + 1]].tolist():
+                    terms[term_ns[code]][go_dag.ids[code]] = code
+                orthogroup_go[og] = terms
+        if incidence_output:
+            used = np.unique(codes)
+            np.savez(incidence_output, orthogroups=np.array(orthogroups, dtype=str),
+                     go_ids=np.array([go_dag.ids[code] for code in used.tolist()], dtype=str),
+                     indptr=indptr, indices=np.searchsorted(used, codes).astype(np.int32))
+            print(f"Orthogroup × GO incidence ({len(orthogroups)} × {len(used)}, {len(codes)} entries) "
+                  f"written to: {incidence_output}")
+
+    # Write output
+    print(f"Writing summary to: {output_file}")
+    with open(output_file, "w") as out:
+        writer = csv.writer(out, delimiter="\t")
+        writer.writerow([
+            "Orthogroup",
+            "BP_GO_IDs", "BP_Names",
+            "MF_GO_IDs", "MF_Names",
+            "CC_GO_IDs", "CC_Names"
+        ])
+
+        for og in orthogroups:
+            row = [og]
+            for terms in orthogroup_go[og]:
+                terms = sorted(terms.items())
+                ids = "; ".join(go_id for go_id, _ in terms)
+                names = "; ".join(go_dag.names[code] for _, code in terms)
+                row.extend([ids if ids else "-", names if names else "-"])
+            writer.writerow(row)
+
+    if foreground_file:
+        foreground = read_orthogroup_list(foreground_file)
+        missing = len(foreground - set(orthogroups))
+        if missing:
+            print(f"Warning: {missing} foreground orthogroups have no annotation files and are ignored")
+        tested, k, K, n, N, p, p_bh = enrichment(indptr, codes, orthogroups, foreground, len(go_dag.ids))
+        if n == 0:
+            print("No foreground orthogroups found; skipping enrichment.")
+        else:
+            print(f"Writing enrichment of {n} foreground orthogroups ({len(tested)} terms tested) to: {enrichment_output}")
+            order = sorted(range(len(tested)), key=lambda i: (p[i], go_dag.ids[tested[i]]))
+            with open(enrichment_output, "w") as out:
+                writer = csv.writer(out, delimiter="\t")
+                writer.writerow(["GO_ID", "Namespace", "Name", "Study_Count", "Study_Size", "Background_Count",
+                                 "Background_Size", "Fold_Enrichment", "P_Value", "P_BH"])
+                for i in order:
+                    code = int(tested[i])
+                    fold = (k[i] / n) / (K[i] / N)
+                    writer.writerow([go_dag.ids[code], NAMESPACES[term_ns[code]], go_dag.names[code], k[i], n, K[i], N,
+                                     f"{fold:.3f}", f"{p[i]:.4g}", f"{p_bh[i]:.4g}"])
+
+    print("Done.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize GO terms per orthogroup from eggNOG and InterProScan annotations")
+    parser.add_argument("--eggnog-dir", default=EGGNOG_DIR, help="Directory of *.emapper.annotations files")
+    parser.add_argument("--interpro-dir", default=INTERPRO_DIR, help="Directory of *.interproscan.tsv files")
+    parser.add_argument("--obo", default=GO_OBO_PATH, help="Path to go.obo")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE, help="Output TSV")
+    parser.add_argument("--go-cache", default=DEFAULT_CACHE_DIR,
+                        help=f"Directory for the compiled GO ontology (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-go-cache", action="store_true", help="Compile go.obo in memory without caching it")
+    parser.add_argument("--workers", type=int, default=4, help="Files read concurrently (threads, default: 4)")
+    parser.add_argument("--propagate", action="store_true",
+                        help="Add all is_a ancestors of each orthogroup's terms (true-path rule)")
+    parser.add_argument("--incidence", help="Also save the orthogroup × GO-term incidence matrix (CSR) as .npz")
+    parser.add_argument("--foreground",
+                        help="Orthogroup list (first column, e.g. CAFE-expanded families) to test for GO enrichment "
+                             "against all summarized orthogroups; combine with --propagate for true-path counts")
+    parser.add_argument("--enrichment-output", help="Enrichment TSV (default: <output>_enrichment.tsv)")
+    args = parser.parse_args()
+    enrichment_output = args.enrichment_output or f"{os.path.splitext(args.output)[0]}_enrichment.tsv"
+    summarize(args.eggnog_dir, args.interpro_dir, args.obo, args.output,
+              go_cache=None if args.no_go_cache else args.go_cache, workers=args.workers,
+              propagate_terms=args.propagate, incidence_output=args.incidence,
+              foreground_file=args.foreground, enrichment_output=enrichment_output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Compiled, cached GO ontology for the orthogroup summarizers.
+
+go.obo is parsed once into integer-coded arrays and saved as an .npz file
+keyed by the OBO's sha256, so later runs load it in milliseconds and an
+updated go.obo is compiled again automatically:
+
+  - term names and ids: one newline-joined blob each (interned, in OBO order)
+  - namespace: int8 code per term
+  - lookup keys: primary ids followed by alt_ids, each mapped to a term code
+  - is_a parents and all is_a ancestors: CSR arrays (offsets + term codes)
+
+Lookups match goatools' GODag(go_obo) with default options: obsolete terms
+are left out, alt_ids resolve to their main term, and parents/ancestors
+follow is_a only.
+
+    from go_ontology import load_ontology
+    go = load_ontology("go.obo")          # compiles into ~/.cache/go_ontology/ on first use
+    if "GO:0016491" in go:
+        term = go["GO:0016491"]           # term.id, term.name, term.namespace
+        go.ancestors("GO:0016491")        # ['GO:0003824', 'GO:0003674']
+
+    python3 go_ontology.py go.obo          # compile (or reuse) the cache and print its path
+"""
+import argparse
+import hashlib
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "go_ontology")
+
+GOTermInfo = namedtuple("GOTermInfo", ["id", "name", "namespace"])
+
+
+def file_sha256(path, block=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_obo_terms(obo_path):
+    """Yield (id, name, namespace, alt_ids, is_a, is_obsolete) per [Term] stanza.
+
+    Follows goatools' OBOReader line by line, so header defaults, stanza ends
+    and tag parsing behave the same.
+    """
+    default_namespace = "default"
+    header = True
+    term = None
+    in_typedef = False
+    with open(obo_path) as f:
+        for line in f:
+            if header:
+                if line[:17] == "default-namespace":
+                    default_namespace = line[18:].strip()
+                elif line[:6].lower() == "[term]":
+                    header = False
+            if term is None and line[:6].lower() == "[term]":
+                term = {"id": "", "name": "", "namespace": default_namespace, "alt_ids": [], "is_a": [],
+                        "obsolete": False}
+            elif not in_typedef and line[:9].lower() == "[typedef]":
+                in_typedef = True
+            elif term is not None or in_typedef:
+                line = line.rstrip()
+                if line:
+                    if term is None:
+                        continue
+                    if line[:4] == "id: ":
+                        term["id"] = line[4:]
+                    elif line[:8] == "alt_id: ":
+                        term["alt_ids"].append(line[8:])
+                    elif line[:6] == "name: ":
+                        term["name"] = line[6:]
+                    elif line[:11] == "namespace: ":
+                        term["namespace"] = line[11:]
+                    elif line[:6] == "is_a: ":
+                        term["is_a"].append(line[6:].split()[0])
+                    elif line[:13] == "is_obsolete: " and line[13:] == "true":
+                        term["obsolete"] = True
+                elif term is not None:
+                    yield term
+                    term = None
+                else:
+                    in_typedef = False
+        if term is not None:
+            yield term
+
+
+def _csr(lists):
+    offsets = np.zeros(len(lists) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(items) for items in lists])
+    values = np.fromiter((i for items in lists for i in items), dtype=np.int32, count=int(offsets[-1]))
+    return offsets, values
+
+
+def _blob(strings):
+    return np.frombuffer("\n".join(strings).encode(), dtype=np.uint8)
+
+
+def _unblob(array):
+    return array.tobytes().decode().split("\n") if len(array) else []
+
+
+def compile_obo(obo_path):
+    """Parse go.obo into the arrays stored in the cache (a dict of NumPy arrays)."""
+    terms = {}
+    alt_ids = {}
+    for term in read_obo_terms(obo_path):
+        if term["obsolete"]:
+            continue
+        terms[term["id"]] = term
+        for alt in term["alt_ids"]:
+            alt_ids[alt] = term["id"]
+    ids = list(terms)
+    code = {go_id: i for i, go_id in enumerate(ids)}
+    namespaces = sorted({term["namespace"] for term in terms.values()})
+    ns_code = {ns: i for i, ns in enumerate(namespaces)}
+
+    parents = [sorted({code[p] for p in terms[go_id]["is_a"] if p in code}) for go_id in ids]
+    ancestors = [None] * len(ids)
+    for start in range(len(ids)):
+        # Iterative postorder, so deep is_a chains do not hit the recursion limit
+        stack = [(start, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if ancestors[node] is not None:
+                continue
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((p, False) for p in parents[node] if ancestors[p] is None)
+                continue
+            found = set(parents[node])
+            for p in parents[node]:
+                found.update(ancestors[p] or ())
+            ancestors[node] = sorted(found)
+
+    # goatools adds alt_ids after the primary ids, so an alt_id wins over a primary id of the same name
+    key_term = dict(code)
+    for alt, main in alt_ids.items():
+        key_term[alt] = code[main]
+    parent_offsets, parent_codes = _csr(parents)
+    ancestor_offsets, ancestor_codes = _csr(ancestors)
+    return {
+        "format_version": np.array([FORMAT_VERSION]),
+        "ids": _blob(ids),
+        "names": _blob(terms[go_id]["name"] for go_id in ids),
+        "namespace_names": _blob(namespaces),
+        "namespace": np.array([ns_code[terms[go_id]["namespace"]] for go_id in ids], dtype=np.int8),
+        "keys": _blob(key_term),
+        "key_term": np.array(list(key_term.values()), dtype=np.int32),
+        "parent_offsets": parent_offsets,
+        "parent_codes": parent_codes,
+        "ancestor_offsets": ancestor_offsets,
+        "ancestor_codes": ancestor_codes,
+    }
+
+
+class GOOntology:
+    """Read-only GO lookups over the compiled arrays."""
+
+    def __init__(self, arrays):
+        self.ids = _unblob(arrays["ids"])
+        self.names = _unblob(arrays["names"])
+        self.namespace_names = _unblob(arrays["namespace_names"])
+        self.namespace = arrays["namespace"]
+        self.index = dict(zip(_unblob(arrays["keys"]), arrays["key_term"].tolist()))
+        self.parent_offsets = arrays["parent_offsets"]
+        self.parent_codes = arrays["parent_codes"]
+        self.ancestor_offsets = arrays["ancestor_offsets"]
+        self.ancestor_codes = arrays["ancestor_codes"]
+        self._terms = {}
+
+    def __len__(self):
+        """Number of lookup keys (terms plus alt_ids), like len(GODag)."""
+        return len(self.index)
+
+    def __contains__(self, go_id):
+        return go_id in self.index
+
+    def __getitem__(self, go_id):
+        i = self.index[go_id]
+        term = self._terms.get(i)
+        if term is None:
+            term = self._terms[i] = GOTermInfo(self.ids[i], self.names[i],
+                                               self.namespace_names[self.namespace[i]])
+        return term
+
+    def code(self, go_id):
+        """Integer term code of go_id (alt_ids resolve to their main term)."""
+        return self.index[go_id]
+
+    def parent_codes_of(self, i):
+        return self.parent_codes[self.parent_offsets[i]:self.parent_offsets[i + 1]]
+
+    def ancestor_codes_of(self, i):
+        return self.ancestor_codes[self.ancestor_offsets[i]:self.ancestor_offsets[i + 1]]
+
+    def parents(self, go_id):
+        """Primary ids of the is_a parents of go_id."""
+        return [self.ids[i] for i in self.parent_codes_of(self.index[go_id]).tolist()]
+
+    def ancestors(self, go_id):
+        """Primary ids of all is_a ancestors of go_id (term.get_all_parents() in goatools)."""
+        return [self.ids[i] for i in self.ancestor_codes_of(self.index[go_id]).tolist()]
+
+
+def load_ontology(obo_path, cache_dir=DEFAULT_CACHE_DIR, verbose=False):
+    """GOOntology for obo_path, compiled into cache_dir/<sha256>.npz on first use.
+
+    cache_dir=None compiles in memory without reading or writing a cache.
+    """
+    start = time.perf_counter()
+    if cache_dir is None:
+        return GOOntology(compile_obo(obo_path))
+    cache_path = os.path.join(cache_dir, f"{file_sha256(obo_path)}.npz")
+    arrays = None
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as saved:
+                if int(saved["format_version"][0]) == FORMAT_VERSION:
+                    arrays = {key: saved[key] for key in saved.files}
+        except (OSError, ValueError, KeyError):
+            arrays = None
+    action = "Loaded"
+    if arrays is None:
+        arrays = compile_obo(obo_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, cache_path)
+        action = "Compiled"
+    ontology = GOOntology(arrays)
+    if verbose:
+        print(f"{action} GO ontology ({len(ontology.ids)} terms) from {cache_path} "
+              f"in {time.perf_counter() - start:.2f}s")
+    return ontology
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile go.obo into the cached GO ontology")
+    parser.add_argument("obo", help="Path to go.obo")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare every lookup, parent set and ancestor set against goatools' GODag")
+    args = parser.parse_args()
+
+    ontology = load_ontology(args.obo, args.cache_dir, verbose=True)
+    if args.check:
+        from goatools.obo_parser import GODag
+        go_dag = GODag(args.obo, prt=None)
+        mismatches = 0
+        if set(go_dag) != set(ontology.index):
+            print(f"Key sets differ: {len(go_dag)} in GODag, {len(ontology)} compiled")
+            mismatches += 1
+        for go_id in set(go_dag) & set(ontology.index):
+            term, compiled = go_dag[go_id], ontology[go_id]
+            if (term.id, term.name, term.namespace) != tuple(compiled) or \
+                    sorted(p.id for p in term.parents) != sorted(ontology.parents(go_id)) or \
+                    sorted(term.get_all_parents()) != sorted(ontology.ancestors(go_id)):
+                mismatches += 1
+        print(f"{len(go_dag)} GODag keys checked, {mismatches} mismatches")
+
+
+if __name__ == "__main__":
+    main()
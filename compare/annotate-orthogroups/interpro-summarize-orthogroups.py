@@ -1,31 +1,36 @@
+import argparse
 import os
+import sys
+from array import array
 from collections import defaultdict
+from itertools import groupby
+import numpy as np
+from parallel_shards import ordered_map
+from summary_cache import SummaryCache
 
-input_folder = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/lecanoromycetes/v25.08.19/Results_Aug22/iprscan-annotations"
-output_summary = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/lecanoromycetes/v25.08.19/Results_Aug22/Annotate_Orthogroups/interproscan_orthogroup_summary.tsv"
-output_per_protein = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/lecanoromycetes/v25.08.19/Results_Aug22/Annotate_Orthogroups/interproscan_per_protein.tsv"
-
-# Data structure: orthogroup -> protein -> annotations
-data = defaultdict(lambda: defaultdict(lambda: {
-    'length': None,
-    'domains': defaultdict(int),
-    'ipr_desc': defaultdict(int),
-    'go_terms': set(),
-    'metacyc_pathways': set(),
-    'reactome_pathways': set()
-}))
-
-for filename in os.listdir(input_folder):
-    if not filename.endswith(".tsv"):
-        continue
-    filepath = os.path.join(input_folder, filename)
+INPUT_FOLDER = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/lecanoromycetes/v25.08.19/Results_Aug22/iprscan-annotations"
+OUTPUT_SUMMARY = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/lecanoromycetes/v25.08.19/Results_Aug22/Annotate_Orthogroups/interproscan_orthogroup_summary.tsv"
+OUTPUT_PER_PROTEIN = "/hpc/group/bio1/ewhisnant/comp-genomics/compare/orthofinder/lecanoromycetes/v25.08.19/Results_Aug22/Annotate_Orthogroups/interproscan_per_protein.tsv"
+
+
+def orthogroup_name(filename):
     # Remove suffixes like '.interproscan' or '.interproscan.tsv'
     og = filename
     for suffix in ['.interproscan.tsv', '.interproscan', '.tsv']:
         if og.endswith(suffix):
             og = og[:-len(suffix)]
             break
+    return og
+
 
+def parse_file(filepath):
+    """Per-protein annotations of one InterProScan TSV, in order of first appearance.
+
+    Returns a list of [protein, length, domain counts, InterPro entry counts,
+    GO terms, MetaCyc pathways, Reactome pathways], with counts as
+    insertion-ordered dicts, so it can be cached and merged as-is.
+    """
+    proteins = {}
     with open(filepath) as f:
         for line in f:
             if line.startswith("#") or not line.strip():
@@ -38,100 +43,274 @@ for filename in os.listdir(input_folder):
             seq_len = fields[2]
             source = fields[3]
             db_id = fields[4]
-            sig_desc = fields[5]
-            start = fields[6]
-            end = fields[7]
-            evalue = fields[8]
             ipr_id = fields[11]
             ipr_desc_str = fields[12]
             go_terms_str = fields[13]
             pathways_str = fields[14]
 
-            data[og][protein_id]['length'] = seq_len
+            record = proteins.get(protein_id)
+            if record is None:
+                record = proteins[protein_id] = [protein_id, None, {}, {}, [], [], []]
+            record[1] = seq_len
+            domains, ipr_desc, go_terms, metacyc, reactome = record[2:]
 
             # Domain key simplified: source:db_id (drop positions and evalue)
             if source in ["Pfam", "CDD", "SMART"]:
                 domain_key = f"{source}:{db_id}"
-                data[og][protein_id]['domains'][domain_key] += 1
+                domains[domain_key] = domains.get(domain_key, 0) + 1
 
             if ipr_id and ipr_id != "-":
                 ipr_entry = f"{ipr_id}:{ipr_desc_str}" if ipr_desc_str and ipr_desc_str != "-" else ipr_id
-                data[og][protein_id]['ipr_desc'][ipr_entry] += 1
+                ipr_desc[ipr_entry] = ipr_desc.get(ipr_entry, 0) + 1
 
             if go_terms_str and go_terms_str != "-":
                 for go in go_terms_str.split("|"):
                     go_id = go.split("(")[0].strip()
-                    if go_id:
-                        data[og][protein_id]['go_terms'].add(go_id)
+                    if go_id and go_id not in go_terms:
+                        go_terms.append(go_id)
 
             if pathways_str and pathways_str != "-":
                 for pw in pathways_str.split("|"):
                     pw = pw.strip()
                     if pw:
-                        if pw.startswith("Reactome:"):
-                            data[og][protein_id]['reactome_pathways'].add(pw)
-                        else:
-                            data[og][protein_id]['metacyc_pathways'].add(pw)
-
-# Write per protein output
-with open(output_per_protein, "w") as out_prot:
-    header = [
-        "Orthogroup", "Protein", "Length",
-        "Domains", "GO_Terms", "InterPro_Entries", "MetaCyc_Pathways", "Reactome_Pathways"
-    ]
-    out_prot.write("\t".join(header) + "\n")
-    for og in sorted(data):
-        for prot in sorted(data[og]):
-            length = data[og][prot]['length'] or "-"
-            domains = ", ".join(sorted(data[og][prot]['domains'].keys()))
-            go_terms = ", ".join(sorted(data[og][prot]['go_terms']))
-            ipr_desc = ", ".join(sorted(data[og][prot]['ipr_desc'].keys()))
-            metacyc = ", ".join(sorted(data[og][prot]['metacyc_pathways']))
-            reactome = ", ".join(sorted(data[og][prot]['reactome_pathways']))
-            out_prot.write(f"{og}\t{prot}\t{length}\t{domains}\t{go_terms}\t{ipr_desc}\t{metacyc}\t{reactome}\n")
-
-# Write summary per orthogroup
-with open(output_summary, "w") as out_sum:
-    header = [
-        "Orthogroup", "Num_Proteins", "Median_Length", "Domains",
-        "GO_Terms", "InterPro_Entries", "MetaCyc_Pathways", "Reactome_Pathways"
-    ]
-    out_sum.write("\t".join(header) + "\n")
-
-    for og in sorted(data):
-        proteins = data[og]
-        num_proteins = len(proteins)
-
-        lengths = [int(proteins[p]['length']) for p in proteins if proteins[p]['length']]
-        lengths.sort()
-        if lengths:
-            mid = len(lengths) // 2
-            median_length = (lengths[mid-1] + lengths[mid]) / 2 if len(lengths) % 2 == 0 else lengths[mid]
+                        pathways = reactome if pw.startswith("Reactome:") else metacyc
+                        if pw not in pathways:
+                            pathways.append(pw)
+    return list(proteins.values())
+
+
+class Vocabulary:
+    """Interned names: each distinct string is stored once and referred to by an integer code."""
+
+    __slots__ = ("codes", "names")
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+# Annotation kinds in AnnotationStore rows
+DOMAIN, IPR, GO, METACYC, REACTOME = range(5)
+
+
+class AnnotationStore:
+    """All parsed annotations as parallel arrays of integer codes.
+
+    Every protein gets an index (in order of first appearance); every
+    annotation is one row of (protein, kind, code, count), with codes into
+    per-kind vocabularies (MetaCyc and Reactome share the pathway vocabulary).
+    Rows are grouped by protein with NumPy only when the tables are written.
+    """
+
+    def __init__(self):
+        self.vocabularies = [Vocabulary(), Vocabulary(), Vocabulary(), Vocabulary()]
+        self.vocabularies.append(self.vocabularies[METACYC])
+        self.orthogroups = {}          # orthogroup -> {protein: protein index}, in insertion order
+        self.protein_length = []       # interned length strings (None if never set)
+        self.row_protein = array("i")
+        self.row_kind = array("b")
+        self.row_code = array("i")
+        self.row_count = array("i")
+
+    def add(self, og, proteins):
+        """Merge parse_file() output for one file of orthogroup og."""
+        if not proteins:
+            return
+        members = self.orthogroups.setdefault(og, {})
+        vocabularies = self.vocabularies
+        for protein_id, seq_len, domains, ipr_desc, go_terms, metacyc, reactome in proteins:
+            index = members.get(protein_id)
+            if index is None:
+                index = members[protein_id] = len(self.protein_length)
+                self.protein_length.append(None)
+            self.protein_length[index] = sys.intern(seq_len)
+            for kind, counts in ((DOMAIN, domains), (IPR, ipr_desc)):
+                for name, count in counts.items():
+                    self._append(index, kind, vocabularies[kind].code(name), count)
+            for kind, names in ((GO, go_terms), (METACYC, metacyc), (REACTOME, reactome)):
+                for name in names:
+                    self._append(index, kind, vocabularies[kind].code(name), 1)
+
+    def _append(self, protein, kind, code, count):
+        self.row_protein.append(protein)
+        self.row_kind.append(kind)
+        self.row_code.append(code)
+        self.row_count.append(count)
+
+    def grouped(self):
+        """Rows sorted by protein (stable) as NumPy arrays, plus each protein's row offsets."""
+        protein = np.frombuffer(self.row_protein, dtype=np.int32) if len(self.row_protein) else np.zeros(0, np.int32)
+        order = np.argsort(protein, kind="stable")
+        columns = [np.frombuffer(column, dtype=dtype)[order] if len(column) else np.zeros(0, dtype)
+                   for column, dtype in ((self.row_kind, np.int8), (self.row_code, np.int32),
+                                         (self.row_count, np.int32))]
+        offsets = np.searchsorted(protein[order], np.arange(len(self.protein_length) + 1))
+        return columns, offsets
+
+    def by_kind(self, kinds, codes, counts):
+        """Split rows into per-kind {code: total count} dicts, in order of first appearance."""
+        totals = ({}, {}, {}, {}, {})
+        for kind, code, count in zip(kinds.tolist(), codes.tolist(), counts.tolist()):
+            kind_totals = totals[kind]
+            kind_totals[code] = kind_totals.get(code, 0) + count
+        return totals
+
+    def names(self, kind, codes):
+        """Sorted names for distinct codes of one kind."""
+        names = self.vocabularies[kind].names
+        return sorted(names[code] for code in codes)
+
+    def ranked(self, kind, totals):
+        """Names ranked by total count, ties in order of first appearance."""
+        names = self.vocabularies[kind].names
+        return [names[code] for code in sorted(totals, key=totals.get, reverse=True)]
+
+
+def orthogroup_files(input_folder):
+    """{orthogroup: [InterProScan TSV paths]}, with each orthogroup's files in sorted order."""
+    files = defaultdict(list)
+    for filename in sorted(os.listdir(input_folder)):
+        if filename.endswith(".tsv"):
+            files[orthogroup_name(filename)].append(os.path.join(input_folder, filename))
+    return files
+
+
+def load_files(paths, cache=None, workers=1):
+    """Yield parse_file() results for paths, in order.
+
+    Unchanged files come from the cache (see summary_cache.py); the rest are
+    parsed, in a process pool with workers > 1 (see parallel_shards.py).
+    """
+    stale = [path for path in paths if cache is None or not cache.is_fresh(path)]
+    parsed = ordered_map(parse_file, stale, workers)
+    stale = set(stale)
+    for path in paths:
+        if path not in stale:
+            yield cache.load(path)
+            continue
+        proteins = next(parsed)
+        if cache is not None:
+            cache.put(path, proteins)
+        yield proteins
+
+
+PER_PROTEIN_HEADER = [
+    "Orthogroup", "Protein", "Length",
+    "Domains", "GO_Terms", "InterPro_Entries", "MetaCyc_Pathways", "Reactome_Pathways"
+]
+SUMMARY_HEADER = [
+    "Orthogroup", "Num_Proteins", "Median_Length", "Domains",
+    "GO_Terms", "InterPro_Entries", "MetaCyc_Pathways", "Reactome_Pathways"
+]
+
+
+def write_orthogroup(store, grouped, og, out_prot, out_sum):
+    """Append the per-protein rows and the summary row of one orthogroup.
+
+    grouped is store.grouped(), computed once per store.
+    """
+    (kinds, codes, counts), offsets = grouped
+
+    def annotations(proteins):
+        # Per-kind totals over the rows of these proteins (in protein order)
+        if proteins[-1] - proteins[0] == len(proteins) - 1:
+            rows = slice(offsets[proteins[0]], offsets[proteins[-1] + 1])
+        else:
+            rows = np.concatenate([np.arange(offsets[p], offsets[p + 1]) for p in proteins])
+        return store.by_kind(kinds[rows], codes[rows], counts[rows])
+
+    members = store.orthogroups[og]
+    for prot in sorted(members):
+        index = members[prot]
+        length = store.protein_length[index] or "-"
+        totals = annotations([index])
+        domains, go_terms, ipr_desc, metacyc, reactome = (
+            ", ".join(store.names(k, totals[k])) for k in (DOMAIN, GO, IPR, METACYC, REACTOME))
+        out_prot.write(f"{og}\t{prot}\t{length}\t{domains}\t{go_terms}\t{ipr_desc}\t{metacyc}\t{reactome}\n")
+
+    proteins = list(members.values())
+    num_proteins = len(proteins)
+
+    lengths = [int(store.protein_length[p]) for p in proteins if store.protein_length[p]]
+    lengths.sort()
+    if lengths:
+        mid = len(lengths) // 2
+        median_length = (lengths[mid-1] + lengths[mid]) / 2 if len(lengths) % 2 == 0 else lengths[mid]
+    else:
+        median_length = "-"
+
+    totals = annotations(proteins)
+    domain_str = ", ".join(store.ranked(DOMAIN, totals[DOMAIN]))
+    ipr_desc_str = ", ".join(store.ranked(IPR, totals[IPR]))
+    go_terms_str, metacyc_str, reactome_str = (
+        ", ".join(store.names(k, totals[k])) for k in (GO, METACYC, REACTOME))
+
+    out_sum.write(f"{og}\t{num_proteins}\t{median_length}\t{domain_str}\t{go_terms_str}\t{ipr_desc_str}\t{metacyc_str}\t{reactome_str}\n")
+
+
+def summarize(input_folder, output_summary, output_per_protein, cache=None, stream=False, workers=1):
+    """Write the per-protein and orthogroup summary tables, orthogroups in sorted order.
+
+    By default all files are loaded into one AnnotationStore first. With
+    stream, each orthogroup is loaded, written and dropped in turn, so memory
+    is bounded by the largest orthogroup; the output is the same. workers
+    processes parse files in parallel.
+    """
+    files = orthogroup_files(input_folder)
+    ordered = [(og, path) for og in sorted(files) for path in files[og]]
+    loaded = zip(ordered, load_files([path for _, path in ordered], cache, workers))
+
+    with open(output_per_protein, "w") as out_prot, open(output_summary, "w") as out_sum:
+        out_prot.write("\t".join(PER_PROTEIN_HEADER) + "\n")
+        out_sum.write("\t".join(SUMMARY_HEADER) + "\n")
+
+        if stream:
+            for og, group in groupby(loaded, key=lambda item: item[0][0]):
+                store = AnnotationStore()
+                for _, proteins in group:
+                    store.add(og, proteins)
+                if og in store.orthogroups:
+                    write_orthogroup(store, store.grouped(), og, out_prot, out_sum)
         else:
-            median_length = "-"
-
-        domain_counts = defaultdict(int)
-        ipr_desc_counts = defaultdict(int)
-        go_terms_set = set()
-        metacyc_set = set()
-        reactome_set = set()
-
-        for prot in proteins:
-            for d, c in proteins[prot]['domains'].items():
-                domain_counts[d] += c
-            for ipr, c in proteins[prot]['ipr_desc'].items():
-                ipr_desc_counts[ipr] += c
-            go_terms_set.update(proteins[prot]['go_terms'])
-            metacyc_set.update(proteins[prot]['metacyc_pathways'])
-            reactome_set.update(proteins[prot]['reactome_pathways'])
-
-        domain_str = ", ".join(sorted(domain_counts, key=domain_counts.get, reverse=True))
-        ipr_desc_str = ", ".join(sorted(ipr_desc_counts, key=ipr_desc_counts.get, reverse=True))
-        go_terms_str = ", ".join(sorted(go_terms_set))
-        metacyc_str = ", ".join(sorted(metacyc_set))
-        reactome_str = ", ".join(sorted(reactome_set))
-
-        out_sum.write(f"{og}\t{num_proteins}\t{median_length}\t{domain_str}\t{go_terms_str}\t{ipr_desc_str}\t{metacyc_str}\t{reactome_str}\n")
-
-print(f"Per-protein annotation saved to {output_per_protein}")
-print(f"Orthogroup summary saved to {output_summary}")
+            store = AnnotationStore()
+            for (og, _), proteins in loaded:
+                store.add(og, proteins)
+            grouped = store.grouped()
+            for og in sorted(store.orthogroups):
+                write_orthogroup(store, grouped, og, out_prot, out_sum)
+
+    print(f"Per-protein annotation saved to {output_per_protein}")
+    print(f"Orthogroup summary saved to {output_summary}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-orthogroup InterProScan annotations")
+    parser.add_argument("-i", "--input", default=INPUT_FOLDER, help="Directory of *.interproscan.tsv files")
+    parser.add_argument("--summary-out", default=OUTPUT_SUMMARY, help="Orthogroup summary TSV")
+    parser.add_argument("--per-protein-out", default=OUTPUT_PER_PROTEIN, help="Per-protein TSV")
+    parser.add_argument("--cache", default=None,
+                        help="Parse cache for re-runs (default: .interproscan_summary_cache.sqlite next to the summary)")
+    parser.add_argument("--no-cache", action="store_true", help="Parse every file; do not read or write the cache")
+    parser.add_argument("--stream", action="store_true",
+                        help="Load and write one orthogroup at a time (memory bounded by the largest orthogroup)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for parsing files (default: 1)")
+    args = parser.parse_args()
+    cache = None
+    if not args.no_cache:
+        cache = SummaryCache(args.cache or os.path.join(os.path.dirname(os.path.abspath(args.summary_out)),
+                                                        ".interproscan_summary_cache.sqlite"), "interproscan")
+    summarize(args.input, args.summary_out, args.per_protein_out, cache, stream=args.stream,
+              workers=args.workers)
+    if cache is not None:
+        cache.report(cache.close())
+
+
+if __name__ == "__main__":
+    main()
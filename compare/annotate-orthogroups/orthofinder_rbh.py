@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Reciprocal best hits and pairwise hit matrices from an OrthoFinder WorkingDirectory.
+
+OrthoFinder keeps one BlastX_Y.txt.gz per species pair (species X queried
+against species Y), with sequences written as numeric "X_Y" ids that are
+decoded through SequenceIDs.txt and SpeciesIDs.txt. This reads them without
+re-running OrthoFinder:
+
+    python3 orthofinder_rbh.py Results_Jul11/WorkingDirectory -o rbh --workers 32
+    python3 orthofinder_rbh.py WorkingDirectory -o rbh --exclude Lecanora_sp --format parquet
+
+Each species pair is handled by one worker: both BLAST files are filtered
+and reduced to the best hit per query (parse_blast.top_hits: bit score, then
+E-value, then % identity, then input order; BLAST writes each query's hits
+together, so only the current query is ranked while a file is read), and the
+two directions are hash-joined into reciprocal best hits. The output directory gets:
+
+  - Reciprocal_Best_Hits.tsv (or .parquet): Species_A, Gene_A, Species_B,
+    Gene_B and identity, bit score and E-value in both directions
+  - Pairwise_Hit_Counts.tsv: hits passing the filters (row = query species)
+  - Pairwise_Best_Hit_Counts.tsv / Pairwise_Best_Hit_Identity.tsv: queries
+    with a hit and their mean best-hit % identity
+  - Pairwise_RBH_Counts.tsv / Pairwise_RBH_Identity.tsv: reciprocal best hits
+    and their mean % identity (both directions averaged)
+
+Species commented out in SpeciesIDs.txt (#) or given to --exclude are left
+out; the self-comparison files (BlastX_X) are not read. SequenceIDs.txt is
+compiled once into memory-mapped arrays under <output>/SequenceIDs_index/.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from parallel_shards import ordered_map
+from parse_blast import read_blast_chunks, top_hits, write_hits
+
+RBH_COLUMNS = ["Species_A", "Gene_A", "Species_B", "Gene_B", "Identity_AB", "Identity_BA",
+               "Bitscore_AB", "Bitscore_BA", "Evalue_AB", "Evalue_BA"]
+BEST_HIT_COLUMNS = ["query", "subject", "% identity", "evalue", "bit score"]
+
+
+def read_species_ids(working_dir):
+    """{species number: name} from SpeciesIDs.txt, without species commented out with #."""
+    species = {}
+    with open(os.path.join(working_dir, "SpeciesIDs.txt")) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            number, name = line.rstrip("\n").split(": ", 1)
+            species[int(number)] = os.path.splitext(name)[0]
+    return species
+
+
+class SequenceIds:
+    """SequenceIDs.txt compiled into memory-mapped arrays.
+
+    The sequence "X_Y" is entry species_offsets[X] + Y; its name, the first
+    whitespace-separated word of its FASTA header as OrthoFinder's own
+    outputs use it, is a slice of one UTF-8 blob
+    (names[name_offsets[i]:name_offsets[i + 1]]).
+    """
+
+    ARRAYS = ("names", "name_offsets", "species_offsets")
+    FORMAT_VERSION = 2
+
+    def __init__(self, index_dir):
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r"))
+        self._decoded = {}
+
+    @classmethod
+    def open(cls, sequence_ids_path, index_dir):
+        """Load the index in index_dir, compiling it first if SequenceIDs.txt changed."""
+        stat = os.stat(sequence_ids_path)
+        stamp = {"source": os.path.abspath(sequence_ids_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                 "format_version": cls.FORMAT_VERSION}
+        meta_path = os.path.join(index_dir, "meta.json")
+        try:
+            with open(meta_path) as f:
+                fresh = json.load(f) == stamp
+        except (OSError, ValueError):
+            fresh = False
+        if not fresh:
+            cls.compile(sequence_ids_path, index_dir)
+            with open(meta_path, "w") as f:
+                json.dump(stamp, f)
+        return cls(index_dir)
+
+    @classmethod
+    def compile(cls, sequence_ids_path, index_dir):
+        keys, names = [], []
+        with open(sequence_ids_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                key, header = line.rstrip("\n").split(": ", 1)
+                species, seq = key.split("_")
+                keys.append((int(species), int(seq)))
+                names.append(header.split(None, 1)[0].encode() if header.strip() else b"")
+        keys = np.array(keys, dtype=np.int64).reshape(-1, 2)
+        counts = np.zeros(int(keys[:, 0].max()) + 1 if len(keys) else 0, dtype=np.int64)
+        np.maximum.at(counts, keys[:, 0], keys[:, 1] + 1)
+        species_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        species_offsets[1:] = np.cumsum(counts)
+        ordered = [b""] * int(species_offsets[-1])
+        for (species, seq), name in zip(keys.tolist(), names):
+            ordered[species_offsets[species] + seq] = name
+        name_offsets = np.zeros(len(ordered) + 1, dtype=np.int64)
+        name_offsets[1:] = np.cumsum([len(name) for name in ordered])
+        os.makedirs(index_dir, exist_ok=True)
+        arrays = {"names": np.frombuffer(b"".join(ordered), dtype=np.uint8), "name_offsets": name_offsets,
+                  "species_offsets": species_offsets}
+        for name, array in arrays.items():
+            np.save(os.path.join(index_dir, f"{name}.npy"), array)
+
+    def species_names(self, species):
+        """Sequence names of one species as an object array indexed by sequence number (decoded once)."""
+        names = self._decoded.get(species)
+        if names is None:
+            start, end = int(self.species_offsets[species]), int(self.species_offsets[species + 1])
+            offsets = self.name_offsets[start:end + 1]
+            blob = self.names[offsets[0]:offsets[-1]].tobytes()
+            offsets = (offsets - offsets[0]).tolist()
+            names = self._decoded[species] = np.array(
+                [blob[a:b].decode() for a, b in zip(offsets[:-1], offsets[1:])], dtype=object)
+        return names
+
+
+def blast_file(working_dir, x, y):
+    for suffix in (".txt.gz", ".txt"):
+        path = os.path.join(working_dir, f"Blast{x}_{y}{suffix}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _seq_numbers(ids):
+    """Sequence numbers Y of categorical OrthoFinder "X_Y" ids."""
+    numbers = np.array([int(name.rsplit("_", 1)[1]) for name in ids.cat.categories], dtype=np.int32)
+    return numbers[ids.cat.codes.to_numpy()] if len(numbers) else np.zeros(0, dtype=np.int32)
+
+
+def best_hits(path, evalue_thresh, identity_thresh, chunksize=1_000_000):
+    """(passing hits, best hit per query) of one BlastX_Y file; query and subject are sequence numbers.
+
+    OrthoFinder's BLAST files are grouped by query, so top_hits ranks only the
+    current query's hits as the file is read.
+    """
+    n_hits = 0
+
+    def counted(chunks):
+        nonlocal n_hits
+        for chunk in chunks:
+            n_hits += len(chunk)
+            yield chunk
+
+    best = [top[BEST_HIT_COLUMNS].assign(query=_seq_numbers(top["query"]), subject=_seq_numbers(top["subject"]))
+            for top in top_hits(counted(read_blast_chunks(path, evalue_thresh, identity_thresh, chunksize)), k=1)]
+    if not best:
+        return n_hits, pd.DataFrame({"query": np.zeros(0, np.int32), "subject": np.zeros(0, np.int32),
+                                     "% identity": np.zeros(0, np.float32), "evalue": np.zeros(0),
+                                     "bit score": np.zeros(0, np.float32)})
+    return n_hits, best[0] if len(best) == 1 else pd.concat(best, ignore_index=True)
+
+
+def reciprocal_best_hits(best_xy, best_yx):
+    """Hash join of the best hits of both directions: (x, y) pairs that are each other's best hit."""
+    rbh = best_xy.merge(best_yx, left_on=["query", "subject"], right_on=["subject", "query"], suffixes=("_xy", "_yx"))
+    return rbh.sort_values("query_xy", kind="stable").reset_index(drop=True)
+
+
+def _pair_task(job):
+    x, y, path_xy, path_yx, evalue_thresh, identity_thresh, chunksize = job
+    hits_xy, best_xy = best_hits(path_xy, evalue_thresh, identity_thresh, chunksize)
+    hits_yx, best_yx = best_hits(path_yx, evalue_thresh, identity_thresh, chunksize)
+    rbh = reciprocal_best_hits(best_xy, best_yx)
+    return {
+        "pair": (x, y),
+        "hits": (hits_xy, hits_yx),
+        "best": (len(best_xy), len(best_yx)),
+        "best_identity": (float(best_xy["% identity"].astype(np.float64).sum()),
+                          float(best_yx["% identity"].astype(np.float64).sum())),
+        "rbh": {name: rbh[name].to_numpy() for name in rbh.columns},
+    }
+
+
+def _matrix_frame(matrix, names):
+    return pd.DataFrame(matrix, index=pd.Index(names, name="Species"), columns=names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reciprocal best hits from an OrthoFinder WorkingDirectory")
+    parser.add_argument("working_dir", help="OrthoFinder WorkingDirectory (SpeciesIDs.txt, SequenceIDs.txt, Blast*.txt.gz)")
+    parser.add_argument("-o", "--output-dir", required=True, help="Output directory")
+    parser.add_argument("-e", "--evalue", type=float, default=1e-3, help="Keep hits with E-value <= this (default: 1e-3)")
+    parser.add_argument("-i", "--identity", type=float, default=0.0, help="Keep hits with %% identity >= this (default: 0)")
+    parser.add_argument("--exclude", nargs="+", default=[], metavar="SPECIES",
+                        help="Species (SpeciesIDs.txt names without extension) to leave out")
+    parser.add_argument("--format", choices=["tsv", "parquet"], default="tsv",
+                        help="Reciprocal best hit table format (default: tsv)")
+    parser.add_argument("--workers", type=int, default=1, help="Species pairs processed in parallel (default: 1)")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="BLAST lines read per chunk (default: 1000000)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    species = read_species_ids(args.working_dir)
+    unknown = set(args.exclude) - set(species.values())
+    if unknown:
+        parser.error(f"--exclude: unknown species {', '.join(sorted(unknown))}")
+    species = {number: name for number, name in species.items() if name not in args.exclude}
+    numbers = sorted(species)
+    position = {number: i for i, number in enumerate(numbers)}
+    names = [species[number] for number in numbers]
+    os.makedirs(args.output_dir, exist_ok=True)
+    ids = SequenceIds.open(os.path.join(args.working_dir, "SequenceIDs.txt"),
+                           os.path.join(args.output_dir, "SequenceIDs_index"))
+
+    jobs = []
+    for x, y in combinations(numbers, 2):
+        path_xy, path_yx = blast_file(args.working_dir, x, y), blast_file(args.working_dir, y, x)
+        if path_xy is None or path_yx is None:
+            print(f"Warning: missing BLAST results for species {x} and {y}; skipping the pair", file=sys.stderr)
+            continue
+        jobs.append((x, y, path_xy, path_yx, args.evalue, args.identity, args.chunksize))
+    print(f"{len(species)} species, {len(jobs)} species pairs, {args.workers} workers")
+
+    n = len(numbers)
+    hit_counts = np.zeros((n, n), dtype=np.int64)
+    best_counts = np.zeros((n, n), dtype=np.int64)
+    best_identity = np.zeros((n, n))
+    rbh_counts = np.zeros((n, n), dtype=np.int64)
+    rbh_identity = np.zeros((n, n))
+
+    def rbh_tables():
+        for done, result in enumerate(ordered_map(_pair_task, jobs, workers=args.workers, shard_size=1), 1):
+            x, y = result["pair"]
+            i, j = position[x], position[y]
+            hit_counts[i, j], hit_counts[j, i] = result["hits"]
+            best_counts[i, j], best_counts[j, i] = result["best"]
+            best_identity[i, j], best_identity[j, i] = result["best_identity"]
+            rbh = result["rbh"]
+            rbh_counts[i, j] = rbh_counts[j, i] = len(rbh["query_xy"])
+            rbh_identity[i, j] = rbh_identity[j, i] = float(
+                (rbh["% identity_xy"].astype(np.float64) + rbh["% identity_yx"]).sum() / 2)
+            if done % 100 == 0:
+                print(f"  {done}/{len(jobs)} species pairs ({time.perf_counter() - start:.0f}s)")
+            if len(rbh["query_xy"]):
+                yield pd.DataFrame({
+                    "Species_A": pd.Categorical([species[x]] * len(rbh["query_xy"]), categories=names),
+                    "Gene_A": ids.species_names(x)[rbh["query_xy"]],
+                    "Species_B": pd.Categorical([species[y]] * len(rbh["query_xy"]), categories=names),
+                    "Gene_B": ids.species_names(y)[rbh["subject_xy"]],
+                    "Identity_AB": rbh["% identity_xy"], "Identity_BA": rbh["% identity_yx"],
+                    "Bitscore_AB": rbh["bit score_xy"], "Bitscore_BA": rbh["bit score_yx"],
+                    "Evalue_AB": rbh["evalue_xy"], "Evalue_BA": rbh["evalue_yx"],
+                })
+
+    rbh_path = os.path.join(args.output_dir, f"Reciprocal_Best_Hits.{args.format}")
+    empty = pd.DataFrame({name: pd.Series(dtype=object) for name in RBH_COLUMNS})
+    n_rbh = write_hits(rbh_tables(), rbh_path, args.format, empty=empty)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_best = np.where(best_counts > 0, best_identity / best_counts, np.nan)
+        mean_rbh = np.where(rbh_counts > 0, rbh_identity / rbh_counts, np.nan)
+    for filename, matrix in [("Pairwise_Hit_Counts.tsv", hit_counts), ("Pairwise_Best_Hit_Counts.tsv", best_counts),
+                             ("Pairwise_Best_Hit_Identity.tsv", mean_best.round(2)),
+                             ("Pairwise_RBH_Counts.tsv", rbh_counts), ("Pairwise_RBH_Identity.tsv", mean_rbh.round(2))]:
+        _matrix_frame(matrix, names).to_csv(os.path.join(args.output_dir, filename), sep="\t")
+    print(f"{n_rbh} reciprocal best hits written to {rbh_path} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
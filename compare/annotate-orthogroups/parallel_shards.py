@@ -0,0 +1,32 @@
+"""Ordered, sharded process-pool map for the orthogroup summarizers.
+
+The summarizers parse thousands of small annotation files; with --workers the
+file list is cut into shards that are parsed in a process pool, and results
+come back in input order so the merged tables match a serial run exactly.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _run_shard(fn, shard):
+    return [fn(item) for item in shard]
+
+
+def ordered_map(fn, items, workers=1, shard_size=32):
+    """Yield fn(item) for items, in order, using `workers` processes.
+
+    fn must be a module-level function. At most 2 × workers shards are in
+    flight, so finished results are not buffered for the whole input.
+    """
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+    items = list(items)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for start in range(0, len(items), shard_size):
+            pending.append(pool.submit(_run_shard, fn, items[start:start + shard_size]))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -1,49 +1,313 @@
+#!/usr/bin/env python3
+"""Filter BLAST tabular (-outfmt 6) hits by E-value and % identity.
+
+The file is read in chunks with typed columns (categorical query/subject
+ids, int32 coordinates, float32 identity and bit score, float64 E-value),
+each chunk is filtered before anything else is built from it, and passing
+hits are written straight to TSV or Parquet:
+
+    python3 parse_blast.py all_vs_all.tsv.gz 1e-5 30 -o hits.parquet
+    python3 parse_blast.py all_vs_all.tsv 1e-5 30 > hits.tsv
+    python3 parse_blast.py all_vs_all.tsv 1e-5 30 --best -o best_hits.tsv
+
+--best / --top-k K keep the K best passing hits per query, ranked by bit
+score (high first), then E-value (low first), then % identity (high first),
+then input order. Queries are written in order of first appearance. Input
+grouped by query (BLAST's default output) is reduced one query at a time;
+other input is detected and ranked with the top K of every query kept
+(queries × K rows).
+
+gzip, bz2, xz and zstd input is read transparently (zstd needs the
+zstandard package); Parquet output needs pyarrow.
+"""
+import argparse
+import bz2
+import gzip
+import io
+import lzma
+import os
 import sys
+import numpy as np
 import pandas as pd
 
-def parse_blast(file_path, evalue_thresh, identity_thresh):
-    hits = []
-    with open(file_path) as f:
-        for line in f:
-            if line.startswith("#") or not line.strip():
-                continue
-            cols = line.strip().split('\t')
-            # Columns based on your example:
-            # query acc.ver, subject acc.ver, % identity, alignment length, mismatches,
-            # gap opens, q. start, q. end, s. start, s. end, evalue, bit score
-            query, subject = cols[0], cols[1]
-            pct_identity = float(cols[2])
-            evalue = float(cols[10])
-            
-            if evalue <= evalue_thresh and pct_identity >= identity_thresh:
-                hits.append({
-                    'query': query,
-                    'subject': subject,
-                    '% identity': pct_identity,
-                    'alignment length': int(cols[3]),
-                    'mismatches': int(cols[4]),
-                    'gap opens': int(cols[5]),
-                    'q start': int(cols[6]),
-                    'q end': int(cols[7]),
-                    's start': int(cols[8]),
-                    's end': int(cols[9]),
-                    'evalue': evalue,
-                    'bit score': float(cols[11])
-                })
-
-    df = pd.DataFrame(hits)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# query acc.ver, subject acc.ver, % identity, alignment length, mismatches,
+# gap opens, q. start, q. end, s. start, s. end, evalue, bit score
+BLAST_COLUMNS = ["query", "subject", "% identity", "alignment length", "mismatches", "gap opens",
+                 "q start", "q end", "s start", "s end", "evalue", "bit score"]
+# % identity is read as float64 so the threshold is applied to the exact value, then stored as float32.
+# evalue stays float64: float32 underflows below ~1e-45, and BLAST reports E-values down to 1e-180.
+READ_DTYPES = {"query": "category", "subject": "category", "% identity": np.float64,
+               **{name: np.int32 for name in BLAST_COLUMNS[3:10]},
+               "evalue": np.float64, "bit score": np.float32}
+MAGIC = [(b"\x1f\x8b", "gzip"), (b"\x28\xb5\x2f\xfd", "zstd"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz")]
+
+
+def _compression(file_path):
+    """Compression of file_path from its first bytes (None when uncompressed)."""
+    with open(file_path, "rb") as f:
+        head = f.read(6)
+    return next((kind for magic, kind in MAGIC if head.startswith(magic)), None)
+
+
+def _open_binary(file_path):
+    """file_path opened for reading as decompressed bytes."""
+    kind = _compression(file_path)
+    if kind == "gzip":
+        return gzip.open(file_path, "rb")
+    if kind == "bz2":
+        return bz2.open(file_path, "rb")
+    if kind == "xz":
+        return lzma.open(file_path, "rb")
+    if kind == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd input needs the zstandard package (pip install zstandard)") from None
+        return zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"), closefd=True)
+    return open(file_path, "rb")
+
+
+class _DataLines(io.RawIOBase):
+    """Binary stream without the lines that start with "#" (-outfmt 7 comments).
+
+    pandas' comment= option would also cut a line at a "#" inside an id, so
+    whole comment lines are dropped here instead. Blocks without any comment
+    line are passed through as they are.
+    """
+
+    def __init__(self, raw, block_size=1 << 22):
+        self.raw = raw
+        self.block_size = block_size
+        self.tail = b""
+        self.data = b""
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def _next_block(self):
+        """Next run of complete data lines; b"" at the end of the input."""
+        while True:
+            block = self.raw.read(self.block_size)
+            if not block:
+                block, self.tail = self.tail, b""
+                if not block:
+                    return b""
+            else:
+                block = self.tail + block
+                cut = block.rfind(b"\n") + 1
+                block, self.tail = block[:cut], block[cut:]
+            if block.startswith(b"#") or b"\n#" in block:
+                block = b"".join(line for line in block.splitlines(keepends=True) if not line.startswith(b"#"))
+            if block:
+                return block
+
+    def readinto(self, buffer):
+        if self.offset == len(self.data):
+            self.data, self.offset = self._next_block(), 0
+        n = min(len(buffer), len(self.data) - self.offset)
+        buffer[:n] = self.data[self.offset:self.offset + n]
+        self.offset += n
+        return n
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def read_blast_chunks(file_path, evalue_thresh, identity_thresh, chunksize=1_000_000):
+    """Yield DataFrames of the hits with evalue <= evalue_thresh and % identity >= identity_thresh.
+
+    Lines starting with "#" (-outfmt 7 comments) and blank lines are skipped;
+    columns beyond the first 12 are ignored. Floats are parsed round-trip
+    exact, so thresholds compare the same values float() would give.
+    """
+    lines = io.BufferedReader(_DataLines(_open_binary(file_path)), buffer_size=1 << 20)
+    reader = pd.read_csv(lines, sep="\t", header=None, names=BLAST_COLUMNS, usecols=range(len(BLAST_COLUMNS)),
+                         dtype=READ_DTYPES, chunksize=chunksize, float_precision="round_trip")
+    with lines, reader:
+        for chunk in reader:
+            keep = (chunk["evalue"].to_numpy() <= evalue_thresh) & (chunk["% identity"].to_numpy() >= identity_thresh)
+            hits = chunk[keep].reset_index(drop=True)
+            hits["% identity"] = hits["% identity"].astype(np.float32)
+            for name in ("query", "subject"):
+                hits[name] = hits[name].cat.remove_unused_categories()
+            yield hits
+
+
+def _empty_hits():
+    return pd.DataFrame({name: pd.Series(dtype="category" if dtype == "category" else
+                                         np.float32 if name == "% identity" else dtype)
+                         for name, dtype in READ_DTYPES.items()})
+
+
+def _concat(frames):
+    """Concatenate hit frames, keeping query and subject categorical."""
+    df = pd.concat(frames, ignore_index=True)
+    for name in ("query", "subject"):
+        df[name] = pd.api.types.union_categoricals([frame[name] for frame in frames])
     return df
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python parse_blast_all.py <blast_output.txt> <evalue_thresh> <identity_thresh>")
-        sys.exit(1)
 
-    blast_file = sys.argv[1]
-    evalue_threshold = float(sys.argv[2])
-    identity_threshold = float(sys.argv[3])
+def parse_blast(file_path, evalue_thresh, identity_thresh, chunksize=1_000_000):
+    """All passing hits as one DataFrame (query and subject stay categorical)."""
+    chunks = list(read_blast_chunks(file_path, evalue_thresh, identity_thresh, chunksize))
+    if not chunks:
+        return _empty_hits()
+    return _concat(chunks)
+
+
+def _rank_top(hits, k):
+    """Keep the k best rows per query of hits, ordered by the query's first appearance, then rank.
+
+    hits carries _row (input order of the hit) and _first (first input row of its query).
+    """
+    codes = hits["query"].cat.codes.to_numpy()
+    first = np.full(len(hits["query"].cat.categories), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, codes, hits["_first"].to_numpy())
+    first = first[codes]
+    order = np.lexsort((hits["_row"].to_numpy(), -hits["% identity"].to_numpy(), hits["evalue"].to_numpy(),
+                        -hits["bit score"].to_numpy(), first))
+    first = first[order]
+    position = np.arange(len(order))
+    group_start = np.maximum.accumulate(np.where(np.r_[True, first[1:] != first[:-1]], position, 0))
+    top = hits.iloc[order[position - group_start < k]].reset_index(drop=True)
+    top["_first"] = first[position - group_start < k]
+    for name in ("query", "subject"):
+        top[name] = top[name].cat.remove_unused_categories()
+    return top
+
+
+def top_hits(chunks, k=1):
+    """Yield the k best hits per query from filtered hit chunks (see the module docstring for the ranking).
+
+    Input is taken to be grouped by query, as BLAST writes it: only the open
+    query's top k is ranked again with each chunk, and finished queries are
+    set aside as they end. The first time a query's hits turn out to be split
+    up (within a chunk, or a finished query showing up again) the input is not
+    grouped, and from then on the top k of every query are ranked together
+    (queries × k rows). Results are yielded once the input is read,
+    in order of each query's first appearance.
+    """
+    pending = None
+    n_rows = 0
+    grouped = True
+    finished = []
+    finished_queries = set()
+    for chunk in chunks:
+        if not len(chunk):
+            continue
+        chunk = chunk.assign(_row=np.arange(n_rows, n_rows + len(chunk)))
+        chunk["_first"] = chunk["_row"]
+        n_rows += len(chunk)
+        if grouped:
+            codes = chunk["query"].cat.codes.to_numpy()
+            queries = set(chunk["query"].unique())
+            # The open query may only continue at the start of the chunk
+            open_query = pending["query"].iloc[0] if pending is not None and len(pending) else None
+            grouped = (1 + np.count_nonzero(codes[1:] != codes[:-1]) == len(queries) and
+                       finished_queries.isdisjoint(queries) and
+                       (open_query not in queries or open_query == chunk["query"].iloc[0]))
+            if not grouped:
+                # A query's hits are split up: rank the finished queries together with the rest
+                pending = _concat(finished + [pending]) if finished else pending
+                finished, finished_queries = [], set()
+        pending = _rank_top(chunk if pending is None else _concat([pending, chunk]), k)
+        if grouped:
+            # Every query but the chunk's last one is complete
+            done = (pending["query"] != chunk["query"].iloc[-1]).to_numpy()
+            if done.any():
+                finished.append(pending[done].reset_index(drop=True))
+                finished_queries.update(finished[-1]["query"].unique())
+                pending = pending[~done].reset_index(drop=True)
+    for top in finished + ([pending] if pending is not None and len(pending) else []):
+        yield top.drop(columns=["_row", "_first"])
 
-    df_hits = parse_blast(blast_file, evalue_threshold, identity_threshold)
 
-    print(f"Found {len(df_hits)} hits passing filters (E-value ≤ {evalue_threshold}, % identity ≥ {identity_threshold})")
-    print(df_hits.to_string(index=False))
+def _parquet_schema(schema):
+    """schema with int32-indexed string dictionaries, so a later chunk with more categories than the first still fits."""
+    return pa.schema([pa.field(field.name, pa.dictionary(pa.int32(), pa.string()), field.nullable)
+                      if pa.types.is_dictionary(field.type) else field for field in schema], metadata=schema.metadata)
+
+
+def write_hits(chunks, output, fmt="tsv", empty=None):
+    """Write hit chunks to output ("-" for stdout, TSV only) as TSV or Parquet; returns the number of hits.
+
+    empty is the (zero-row) frame whose columns are written when there are no
+    chunks; it defaults to the BLAST hit columns.
+    """
+    empty = _empty_hits() if empty is None else empty
+    n_hits = 0
+    if fmt == "parquet":
+        if pa is None:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow, or conda install -c conda-forge pyarrow)")
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output, _parquet_schema(table.schema))
+            writer.write_table(table.cast(writer.schema))
+            n_hits += len(chunk)
+        if writer is None:
+            writer = pq.ParquetWriter(output, _parquet_schema(pa.Table.from_pandas(empty, preserve_index=False).schema))
+        writer.close()
+        return n_hits
+
+    out = sys.stdout if output == "-" else open(output, "w", newline="")
+    try:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(out, sep="\t", index=False, header=header)
+            header = False
+            n_hits += len(chunk)
+        if header:
+            empty.to_csv(out, sep="\t", index=False)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return n_hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter BLAST tabular hits by E-value and % identity")
+    parser.add_argument("blast_file", help="BLAST -outfmt 6/7 file (optionally gzip/bz2/xz/zstd compressed)")
+    parser.add_argument("evalue_thresh", type=float, help="Keep hits with E-value <= this")
+    parser.add_argument("identity_thresh", type=float, help="Keep hits with %% identity >= this")
+    parser.add_argument("-o", "--output", default="-", help="Output file; '-' writes TSV to stdout (default)")
+    parser.add_argument("--format", choices=["tsv", "parquet"],
+                        help="Output format (default: parquet for *.parquet outputs, otherwise tsv)")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="Lines read per chunk (default: 1000000)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--best", action="store_true", help="Keep only the best hit per query")
+    mode.add_argument("--top-k", type=int, metavar="K", help="Keep the K best hits per query")
+    args = parser.parse_args()
+
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "tsv")
+    if fmt == "parquet" and args.output == "-":
+        parser.error("Parquet output needs a file name (-o hits.parquet)")
+    if args.top_k is not None and args.top_k < 1:
+        parser.error("--top-k must be at least 1")
+    chunks = read_blast_chunks(args.blast_file, args.evalue_thresh, args.identity_thresh, args.chunksize)
+    if args.best or args.top_k:
+        chunks = top_hits(chunks, k=1 if args.best else args.top_k)
+    try:
+        n_hits = write_hits(chunks, args.output, fmt)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    except BrokenPipeError:
+        # Output piped into e.g. head; stop quietly
+        sys.stdout = open(os.devnull, "w")
+        return
+    kept = f", {'best hit' if args.best else f'top {args.top_k} hits'} per query" if args.best or args.top_k else ""
+    print(f"Found {n_hits} hits passing filters (E-value ≤ {args.evalue_thresh}, % identity ≥ {args.identity_thresh}"
+          f"{kept})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
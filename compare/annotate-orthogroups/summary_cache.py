@@ -0,0 +1,91 @@
+"""Per-file cache of parsed annotation files for the orthogroup summarizers.
+
+eggnog-summarize-orthogroups.py and interpro-summarize-orthogroups.py store
+what they parsed from each annotation file in a small SQLite database next to
+their summary output (Annotate_Orthogroups/). On the next run a file whose
+path, size and mtime are unchanged is taken from the cache instead of being
+parsed again. Entries for files that no longer exist, or that are missing
+from a directory this run scanned, are evicted; entries for other
+directories are kept, so runs over different inputs can share a cache. The output
+tables are always rewritten in full from the cached and freshly parsed parts.
+"""
+import json
+import os
+import sqlite3
+
+
+class SummaryCache:
+    """Parsed results keyed by file path, reused while size and mtime match.
+
+    kind and version name the parser; a cache written by another kind or
+    version is cleared on open.
+    """
+
+    def __init__(self, path, kind, version=1):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS files "
+                        "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, value TEXT)")
+        stamp = f"{kind}:{version}"
+        saved = self.db.execute("SELECT value FROM meta WHERE key = 'parser'").fetchone()
+        if saved is None or saved[0] != stamp:
+            self.db.execute("DELETE FROM files")
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('parser', ?)", (stamp,))
+        self.db.commit()
+        self.seen = set()
+        self.hits = self.misses = 0
+        self._stats = {}
+        self._pending = 0
+
+    def is_fresh(self, file_path):
+        """True if file_path has an entry matching its current size and mtime."""
+        file_path = os.path.abspath(file_path)
+        self.seen.add(file_path)
+        stat = os.stat(file_path)
+        row = self.db.execute("SELECT size, mtime_ns FROM files WHERE path = ?", (file_path,)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            self.misses += 1
+            # put() stores the stat seen here, so a file changing while it is parsed is parsed again next time
+            self._stats[file_path] = (stat.st_size, stat.st_mtime_ns)
+            return False
+        self.hits += 1
+        return True
+
+    def load(self, file_path):
+        """Cached value of a file that is_fresh() accepted."""
+        row = self.db.execute("SELECT value FROM files WHERE path = ?", (os.path.abspath(file_path),)).fetchone()
+        return json.loads(row[0])
+
+    def get(self, file_path):
+        """Cached value for file_path, or None if missing or the file changed."""
+        return self.load(file_path) if self.is_fresh(file_path) else None
+
+    def put(self, file_path, value, commit_every=500):
+        """Store the parsed value of a file that is_fresh() or get() missed."""
+        file_path = os.path.abspath(file_path)
+        size, mtime_ns = self._stats.pop(file_path)
+        self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                        (file_path, size, mtime_ns, json.dumps(value, separators=(",", ":"))))
+        # Commit now and then, so an interrupted run keeps what it parsed
+        self._pending += 1
+        if self._pending >= commit_every:
+            self.db.commit()
+            self._pending = 0
+
+    def close(self):
+        """Evict stale entries, commit and close; returns the number evicted.
+
+        An entry is stale when its file no longer exists, or when it sits in a
+        directory scanned in this run but was not among the files seen.
+        """
+        scanned = {os.path.dirname(path) for path in self.seen}
+        stale = [path for path, in self.db.execute("SELECT path FROM files") if path not in self.seen and
+                 (os.path.dirname(path) in scanned or not os.path.exists(path))]
+        self.db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in stale])
+        self.db.commit()
+        self.db.close()
+        return len(stale)
+
+    def report(self, evicted):
+        print(f"Cache {self.path}: {self.hits} files reused, {self.misses} parsed, {evicted} stale entries evicted")
@@ -0,0 +1,35 @@
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+COMPARE = os.path.dirname(os.path.dirname(TESTS))
+sys.path.insert(0, os.path.join(COMPARE, "benchmark"))
+from make_synthetic_orthofinder import generate
+
+
+def load_script(path, name):
+    """Import a script whose file name is not a module name (e.g. eggnog-summarize-orthogroups.py)."""
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def synthetic_source(tmp_path_factory):
+    data = tmp_path_factory.mktemp("synthetic")
+    generate(str(data), n_orthogroups=25, n_species=6, mean_members=8, n_go_terms=60, seed=3)
+    return data
+
+
+@pytest.fixture
+def synthetic(synthetic_source, tmp_path):
+    """A small synthetic OrthoFinder results directory (make_synthetic_orthofinder.py), free to modify."""
+    data = tmp_path / "data"
+    shutil.copytree(synthetic_source, data)
+    return data
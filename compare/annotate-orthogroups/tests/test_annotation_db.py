@@ -0,0 +1,90 @@
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import annotation_db
+
+EGGNOG = ("Orthogroup\tProteinID\tDescription\tGOs\tKEGG_ko\tCOG_category\teggNOG_OGs\n"
+          "OG0000000\tXylpar1_g1\tMajor facilitator superfamily\tGO:0005355,GO:0008645\tko:K08139\tG\t"
+          "KOG0254@2759|Eukaryota\n"
+          "OG0000000\tXylpar1_g2\t\"Sugar transporter, putative\"\tGO:0005355\t-\tG\t-\n"
+          "OG0000001\tLecano1_g7\t-\t-\tko:K00001\tCE\t-\n")
+
+INTERPRO = ("Orthogroup\tProtein\tLength\tDomains\tGO_Terms\tInterPro_Entries\tMetaCyc_Pathways\tReactome_Pathways\n"
+            "OG0000000\tXylpar1_g1\t512\tPfam:PF00083\tGO:0016020, GO:0022857\t"
+            "IPR005828:Major facilitator, sugar transporter-like\t-\t-\n")
+
+
+@pytest.fixture
+def db(tmp_path):
+    store = annotation_db.AnnotationDB(str(tmp_path / "annotations.sqlite"))
+    yield store
+    store.close()
+
+
+def test_load_and_query(tmp_path, db):
+    (tmp_path / "eggnog.tsv").write_text(EGGNOG)
+    (tmp_path / "interpro.tsv").write_text(INTERPRO)
+    assert db.load("eggnog", tmp_path / "eggnog.tsv") == (2, 0, 0)
+    assert db.load("interpro", tmp_path / "interpro.tsv") == (1, 0, 0)
+
+    assert db.orthogroups_with(["GO:0005355", "PF00083"]) == ["OG0000000"]
+    assert db.orthogroups_with(["K08139", "K00001"], match_all=False) == ["OG0000000", "OG0000001"]
+    terms = db.terms_of("OG0000000", kind="GO")
+    assert [(term, source, n) for _, term, _, source, n in terms] == [
+        ("GO:0005355", "eggnog", 2), ("GO:0008645", "eggnog", 1),
+        ("GO:0016020", "interpro", 1), ("GO:0022857", "interpro", 1)]
+    assert db.terms_of("OG0000000", kind="InterPro")[0][2] == "Major facilitator, sugar transporter-like"
+
+    # Unchanged rows are skipped; a dropped orthogroup is removed
+    assert db.load("eggnog", tmp_path / "eggnog.tsv") == (0, 2, 0)
+    (tmp_path / "eggnog.tsv").write_text(EGGNOG.rsplit("OG0000001", 1)[0])
+    assert db.load("eggnog", tmp_path / "eggnog.tsv") == (0, 1, 1)
+    assert db.orthogroups_with(["K00001"]) == []
+
+
+@pytest.mark.parametrize("text", ["", "\n"])
+def test_empty_table(tmp_path, db, text):
+    # eggnog-summarize-orthogroups.py writes a bare newline when no orthogroup has annotations
+    (tmp_path / "eggnog.tsv").write_text(EGGNOG)
+    db.load("eggnog", tmp_path / "eggnog.tsv")
+    (tmp_path / "eggnog.tsv").write_text(text)
+    assert db.load("eggnog", tmp_path / "eggnog.tsv") == (0, 0, 2)
+    assert db.orthogroups_with(["GO:0005355"]) == []
+
+
+def test_wrong_header(tmp_path, db):
+    (tmp_path / "eggnog.tsv").write_text(INTERPRO)
+    with pytest.raises(ValueError, match="does not look like"):
+        db.load("eggnog", tmp_path / "eggnog.tsv")
+    (tmp_path / "eggnog.tsv").write_text("\n" + EGGNOG.split("\n", 1)[1])
+    with pytest.raises(ValueError, match="does not look like"):
+        db.load("eggnog", tmp_path / "eggnog.tsv")
+
+
+def test_summarizer_tables(synthetic, tmp_path, db):
+    # Build from real summarizer output and check lookups against a scan of the per-protein table
+    eggnog = tmp_path / "eggnog_per_protein.tsv"
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(annotation_db.__file__),
+                                                 "eggnog-summarize-orthogroups.py"),
+                    "-i", str(synthetic / "eggnog"), "--summary-out", str(tmp_path / "summary.tsv"),
+                    "--per-protein-out", str(eggnog), "--no-cache"], check=True, stdout=subprocess.DEVNULL)
+    db.load("eggnog", eggnog)
+
+    with open(eggnog) as f:
+        rows = list(csv.DictReader(f, delimiter="\t"))
+    by_go = {}
+    for row in rows:
+        for go in row["GOs"].split(","):
+            if go != "-":
+                by_go.setdefault(go, set()).add(row["Orthogroup"])
+    assert by_go
+    for go, orthogroups in by_go.items():
+        assert db.orthogroups_with([go], source="eggnog") == sorted(orthogroups)
+    first, second = sorted(by_go)[:2]
+    assert db.orthogroups_with([first, second]) == sorted(by_go[first] & by_go[second])
+    assert db.orthogroups_with([first, second], match_all=False) == sorted(by_go[first] | by_go[second])
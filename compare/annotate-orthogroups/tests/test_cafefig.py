@@ -0,0 +1,99 @@
+import contextlib
+import copy
+import io
+import os
+import random
+import re
+import sys
+
+import pytest
+
+from conftest import COMPARE
+
+ete3 = pytest.importorskip("ete3")
+sys.path.insert(0, os.path.join(COMPARE, "cafe", "plot_results"))
+import cafefig
+
+# (((A,B),C),(D,E)) with CAFE 4's in-order node IDs
+HEADER = """Tree:(((A:1,B:1):1,C:2):1,(D:1.5,E:1.5):1.5)
+Lambda:\t0.002\t0.01
+Lambda tree:(((1,1)1,2)2,(1,1)2)
+# IDs of nodes:(((A<0>,B<2>)<1>,C<4>)<3>,(D<6>,E<8>)<7>)<5>
+# Output format for: ' Average Expansion', 'Expansions', 'No-change', 'Contractions', and 'Branch-specific P-values' = (node ID, node ID): (0,2) (1,4) (6,8) (3,7)
+Average Expansion:\t(0.1,-0.2)\t(0.05,0.3)\t(-0.1,0)\t(0.2,-0.05)
+Expansion :\t(10,3)\t(4,12)\t(2,0)\t(6,1)
+Remain :\t(80,90)\t(85,70)\t(95,97)\t(88,94)
+Decrease :\t(10,7)\t(11,18)\t(3,3)\t(6,5)
+'ID'\t'Newick'\t'Family-wide P-value'\t'Viterbi P-values'
+"""
+
+
+def random_family(rng, name):
+    s = [rng.randint(0, 6) for _ in range(9)]
+    newick = (f"(((A_{s[0]}:1,B_{s[1]}:1)_{s[2]}:1,C_{s[3]}:2)_{s[4]}:1,"
+              f"(D_{s[5]}:1.5,E_{s[6]}:1.5)_{s[7]}:1.5)_{s[8]}")
+    pvalues = "(" + ",".join("({},{})".format(*(rng.choice(["0.001", "0.02", "0.3", "-"]) for _ in range(2)))
+                             for _ in range(4)) + ")"
+    return f"{name}\t{newick}\t{rng.choice([0.0001, 0.01, 0.04, 0.3])}\t{pvalues}\n"
+
+
+@pytest.fixture
+def report(tmp_path):
+    rng = random.Random(23)
+    path = tmp_path / "report.cafe"
+    path.write_text(HEADER + "".join(random_family(rng, f"OG{i:07d}") for i in range(300)))
+    return path
+
+
+def baseline_family_tree(c, line):
+    """The original Family.get_tree_with_famsizes: a deep copy of the species tree per family."""
+    values = line.strip().split()
+    pvalue = float(values[2])
+    size_tree = ete3.Tree(values[1].replace(')_', ')') + ';')
+    tree = copy.deepcopy(c.tree)
+    for node, size_tree_node in zip(tree.traverse(), size_tree.traverse()):
+        node.fam_size = int(size_tree_node.name.split('_')[1]) if size_tree_node.is_leaf() \
+            else int(size_tree_node.support)
+        node.event = None
+    for node_id, node_size in zip(c.cafe_node_id_order, re.findall(r'[\d\.]+|-', values[3])):
+        node = tree.search_nodes(id=node_id)[0]
+        if node_size == '-' or pvalue > c.family_p_cutoff:
+            node.pvalue = None
+        else:
+            node.pvalue = float(node_size)
+            if node.pvalue <= c.branch_p_cutoff:
+                if node.fam_size > node.up.fam_size:
+                    node.event = '+'
+                elif node.fam_size < node.up.fam_size:
+                    node.event = '-'
+    return pvalue, tree
+
+
+def node_state(tree):
+    return {node.id: (node.fam_size, node.event, getattr(node, 'pvalue', 'unset')) for node in tree.traverse()}
+
+
+@pytest.mark.parametrize("pb, pf", [(0.05, 0.05), (0.01, 0.5)])
+def test_matches_baseline(report, pb, pf):
+    with contextlib.redirect_stdout(io.StringIO()):
+        c = cafefig.CAFE_fig(str(report), None, None, pb, pf, None, 'pdf', False)
+
+    expansions = {node.id: 0 for node in c.tree.traverse()}
+    contractions = dict(expansions)
+    lines = [line for line in report.read_text().splitlines(True) if cafefig.is_valid_format(line)]
+    families = list(c)
+    assert [family.name for family in families] == [line.split("\t")[0] for line in lines]
+    for family, line in zip(families, lines):
+        pvalue, tree = baseline_family_tree(c, line)
+        family.get_tree_with_famsizes()
+        assert node_state(family.tree) == node_state(tree), family.name
+        if pvalue <= pf:
+            for node in tree.traverse():
+                expansions[node.id] += node.event == '+'
+                contractions[node.id] += node.event == '-'
+
+    assert {node.id: node.sig_expansions for node in c.tree.traverse()} == expansions
+    assert {node.id: node.sig_contractions for node in c.tree.traverse()} == contractions
+    assert sum(expansions.values()) and sum(contractions.values())
+    assert {node.name: node.avg_expansion for node in c.tree.traverse() if node.is_leaf()} == \
+        {"A": 0.1, "B": -0.2, "C": 0.3, "D": -0.1, "E": 0.0}
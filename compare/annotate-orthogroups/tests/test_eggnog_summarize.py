@@ -0,0 +1,170 @@
+import glob
+import importlib.util
+import os
+import random
+import subprocess
+import sys
+from collections import Counter, defaultdict
+
+import pandas as pd
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(os.path.dirname(HERE), "eggnog-summarize-orthogroups.py")
+sys.path.insert(0, os.path.dirname(HERE))
+spec = importlib.util.spec_from_file_location("eggnog_summarize", SCRIPT)
+eggnog_summarize = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(eggnog_summarize)
+
+
+def top_terms(term_list, n=3):
+    """The original per-orthogroup implementation, kept as the oracle for top_terms_by_group."""
+    flat = [term.strip() for entry in term_list for term in str(entry).split(",") if term.strip() != '-' and term.strip()]
+    return ", ".join([f"{term} ({count})" for term, count in Counter(flat).most_common(n)])
+
+
+def test_top_terms_by_group_matches_top_terms():
+    rng = random.Random(7)
+    terms = ["GO:0005215", "GO:0008150", " K00001", "K00002 ", "-", "", "COG0001", "2759|Eukaryota"]
+    for n_groups in (1, 5, 40):
+        groups, values = [], []
+        for group in range(n_groups):
+            for _ in range(rng.randint(0, 8)):
+                groups.append(group)
+                values.append(None if rng.random() < 0.1 else ",".join(rng.choices(terms, k=rng.randint(1, 4))))
+        for n in (0, 1, 2, 3, 5):
+            expected = [top_terms([v for g, v in zip(groups, values) if g == group and v is not None], n)
+                        for group in range(n_groups)]
+            assert eggnog_summarize.top_terms_by_group(groups, values, n_groups, n) == expected
+
+
+def baseline_summarize(annot_dir, summary_out, per_protein_out):
+    """The original script, with its paths as arguments and files in sorted order."""
+    output_summary = []
+    per_protein_annots = defaultdict(list)
+    for file in sorted(glob.glob(f"{annot_dir}/*.emapper.annotations")):
+        orthogroup_id = file.split("/")[-1].split(".")[0]
+        with open(file, 'r') as f:
+            for line in f:
+                if line.startswith('#') and not line.startswith('##'):
+                    header = line.lstrip('#').strip().split('\t')
+                    break
+        df = pd.read_csv(file, comment='#', sep='\t', names=header)
+        df = df[df['eggNOG_OGs'].notna()]
+        output_summary.append({
+            "Orthogroup": orthogroup_id,
+            "Top_Descriptions": top_terms(df['Description'].dropna().tolist(), 2),
+            "Top_GO_terms": top_terms(df['GOs'].dropna().tolist(), 3),
+            "Top_KEGG_terms": top_terms(df['KEGG_ko'].dropna().tolist(), 3),
+            "Top_COG_categories": top_terms(df['COG_category'].dropna().tolist(), 3),
+            "Top_eggNOG_OGs": top_terms(df['eggNOG_OGs'].dropna().tolist(), 3)
+        })
+        for _, row in df.iterrows():
+            per_protein_annots[orthogroup_id].append({"ProteinID": row['query'], **{
+                column: row[column] if pd.notna(row[column]) else "-"
+                for column in ["Description", "GOs", "KEGG_ko", "COG_category", "eggNOG_OGs"]}})
+    pd.DataFrame(output_summary).to_csv(summary_out, sep="\t", index=False)
+    pd.DataFrame([{"Orthogroup": og, **prot} for og, proteins in per_protein_annots.items()
+                  for prot in proteins]).to_csv(per_protein_out, sep="\t", index=False)
+
+
+EMAPPER_HEADER = "#" + "\t".join(eggnog_summarize.EMAPPER_COLUMNS) + "\n"
+
+
+def emapper_row(query, eggnog_ogs, cog, description, gos, kegg):
+    return "\t".join([query, "5101.XP_1.1", "1e-100", "300.5", eggnog_ogs, "4751|Fungi", cog, description,
+                      "-", gos, "-", kegg] + ["-"] * 9) + "\n"
+
+
+@pytest.fixture
+def eggnog_dir(synthetic):
+    """Synthetic emapper files plus the values pandas treats specially."""
+    annot_dir = synthetic / "eggnog"
+    (annot_dir / "OG0000100.emapper.annotations").write_text(
+        "## emapper-2.1.12\n" + EMAPPER_HEADER +
+        emapper_row("p1", "KOG1@2759|Eukaryota", "NA", '"Quoted, description"', "GO:0000001", "ko:K00001") +
+        emapper_row("p2", "", "G", "Unannotated", "-", "-") +
+        emapper_row("p3", "KOG1@2759|Eukaryota", "G", "null", "GO:0000001,GO:0000002", "") +
+        "## 3 queries scanned\n")
+    (annot_dir / "OG0000101.emapper.annotations").write_text("## emapper-2.1.12\n" + EMAPPER_HEADER)
+    return annot_dir
+
+
+def run_script(*args):
+    subprocess.run([sys.executable, SCRIPT, *map(str, args)], check=True, stdout=subprocess.DEVNULL)
+
+
+def assert_same_files(expected_dir, actual_dir, names):
+    for name in names:
+        assert (actual_dir / name).read_bytes() == (expected_dir / name).read_bytes(), name
+
+
+OUTPUTS = ["summary.tsv", "per_protein.tsv"]
+
+
+def test_matches_baseline(eggnog_dir, tmp_path):
+    baseline_summarize(eggnog_dir, tmp_path / "summary.tsv", tmp_path / "per_protein.tsv")
+    out = tmp_path / "out"
+    out.mkdir()
+    run_script("-i", eggnog_dir, "--summary-out", out / "summary.tsv", "--per-protein-out", out / "per_protein.tsv",
+               "--no-cache")
+    assert_same_files(tmp_path, out, OUTPUTS)
+
+
+def test_small_batches_match_baseline(eggnog_dir, tmp_path):
+    baseline_summarize(eggnog_dir, tmp_path / "summary.tsv", tmp_path / "per_protein.tsv")
+    out = tmp_path / "out"
+    out.mkdir()
+    run_script("-i", eggnog_dir, "--summary-out", out / "summary.tsv", "--per-protein-out", out / "per_protein.tsv",
+               "--no-cache", "--batch-size", 4)
+    assert_same_files(tmp_path, out, OUTPUTS)
+
+
+@pytest.mark.parametrize("header", [EMAPPER_HEADER, ""])
+def test_proteome_mode_matches_baseline(synthetic, tmp_path, header):
+    # One emapper run over the whole proteome, lines in arbitrary order, plus a protein in no orthogroup
+    lines = [line for path in sorted((synthetic / "eggnog").iterdir()) for line in path.read_text().splitlines(True)
+             if not line.startswith("#")]
+    random.Random(3).shuffle(lines)
+    proteome = tmp_path / "proteome.emapper.annotations"
+    proteome.write_text("## emapper-2.1.12\n" + header + "".join(lines) +
+                        emapper_row("orphan", "KOG1@2759|Eukaryota", "G", "-", "-", "-"))
+
+    baseline_summarize(synthetic / "eggnog", tmp_path / "summary.tsv", tmp_path / "per_protein.tsv")
+    out = tmp_path / "out"
+    out.mkdir()
+    run_script("--annotations", proteome, "--orthogroups", synthetic / "Orthogroups" / "Orthogroups.tsv",
+               "-l", synthetic / "Orthogroups" / "OG_list.txt",
+               "--summary-out", out / "summary.tsv", "--per-protein-out", out / "per_protein.tsv")
+    assert_same_files(tmp_path, out, OUTPUTS)
+
+
+def test_cached_rerun_matches_baseline(eggnog_dir, tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    options = ["-i", eggnog_dir, "--summary-out", out / "summary.tsv", "--per-protein-out", out / "per_protein.tsv",
+               "--cache", tmp_path / "cache.sqlite"]
+    run_script(*options)
+    # Change one file, remove another and add a new one between runs
+    changed = eggnog_dir / "OG0000004.emapper.annotations"
+    changed.write_text(changed.read_text().replace("Protein family", "Renamed family"))
+    os.utime(changed, ns=(0, 0))
+    (eggnog_dir / "OG0000007.emapper.annotations").unlink()
+    (eggnog_dir / "OG0000102.emapper.annotations").write_text(
+        EMAPPER_HEADER + emapper_row("q1", "KOG2@2759|Eukaryota", "S", "New", "GO:0000003", "-"))
+    run_script(*options)
+
+    baseline_summarize(eggnog_dir, tmp_path / "summary.tsv", tmp_path / "per_protein.tsv")
+    assert_same_files(tmp_path, out, OUTPUTS)
+
+
+def test_workers_match_baseline(eggnog_dir, tmp_path):
+    # A headerless file takes the previous file's header, which workers parsing out of order must not change
+    (eggnog_dir / "OG0000050.emapper.annotations").write_text(
+        emapper_row("h1", "KOG3@2759|Eukaryota", "K", "Headerless", "GO:0000004", "ko:K00004"))
+    baseline_summarize(eggnog_dir, tmp_path / "summary.tsv", tmp_path / "per_protein.tsv")
+    out = tmp_path / "out"
+    out.mkdir()
+    run_script("-i", eggnog_dir, "--summary-out", out / "summary.tsv", "--per-protein-out", out / "per_protein.tsv",
+               "--no-cache", "--workers", 3)
+    assert_same_files(tmp_path, out, OUTPUTS)
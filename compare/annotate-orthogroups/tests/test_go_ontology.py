@@ -0,0 +1,64 @@
+import contextlib
+import io
+import os
+import random
+import sys
+
+import pytest
+
+from conftest import COMPARE
+
+sys.path.insert(0, os.path.join(COMPARE, "annotate-orthogroups"))
+sys.path.insert(0, os.path.join(COMPARE, "benchmark"))
+import go_ontology
+from make_synthetic_orthofinder import write_go_obo
+
+obo_parser = pytest.importorskip("goatools.obo_parser")
+
+# Stanzas goatools skips or treats specially: a Typedef, an obsolete term, a default namespace
+EXTRA_OBO = """
+[Typedef]
+id: part_of
+name: part of
+is_a: GO:0000001
+
+[Term]
+id: GO:9000001
+name: term without a namespace
+is_a: GO:0000001 ! root
+alt_id: GO:9000002
+
+[Term]
+id: GO:9000003
+name: obsolete with parent
+namespace: biological_process
+is_a: GO:0000001
+is_obsolete: true
+"""
+
+
+@pytest.fixture
+def obo(tmp_path):
+    path = tmp_path / "go.obo"
+    write_go_obo(path, 400, random.Random(2))
+    text = path.read_text().replace("data-version: synthetic\n",
+                                    "data-version: synthetic\ndefault-namespace: gene_ontology\n")
+    path.write_text(text + EXTRA_OBO)
+    return path
+
+
+def test_matches_goatools(obo, tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        dag = obo_parser.GODag(str(obo))
+    compiled = go_ontology.load_ontology(obo, cache_dir=tmp_path / "cache")
+    cached = go_ontology.load_ontology(obo, cache_dir=tmp_path / "cache")
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    for go in (compiled, cached):
+        assert len(go) == len(dag)
+        for go_id, term in dag.items():
+            assert go_id in go
+            assert go[go_id] == (term.id, term.name, term.namespace)
+            assert sorted(go.parents(go_id)) == sorted(parent.id for parent in term.parents)
+            assert sorted(go.ancestors(go_id)) == sorted(term.get_all_parents())
+        assert "GO:0000097" not in go and "GO:9000003" not in go
@@ -0,0 +1,199 @@
+import csv
+import importlib.util
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+spec = importlib.util.spec_from_file_location("go_summary", os.path.join(os.path.dirname(HERE), "go-summary.py"))
+go_summary = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(go_summary)
+
+GO_OBO = """format-version: 1.2
+
+[Term]
+id: GO:0003674
+name: molecular_function
+namespace: molecular_function
+
+[Term]
+id: GO:0005215
+name: transporter activity
+namespace: molecular_function
+is_a: GO:0003674 ! molecular_function
+
+[Term]
+id: GO:0022857
+name: transmembrane transporter activity
+namespace: molecular_function
+is_a: GO:0005215 ! transporter activity
+
+[Term]
+id: GO:0005355
+name: glucose transmembrane transporter activity
+namespace: molecular_function
+is_a: GO:0022857 ! transmembrane transporter activity
+
+[Term]
+id: GO:0008150
+name: biological_process
+namespace: biological_process
+
+[Term]
+id: GO:0006810
+name: transport
+namespace: biological_process
+is_a: GO:0008150 ! biological_process
+
+[Term]
+id: GO:0008645
+name: hexose transmembrane transport
+namespace: biological_process
+is_a: GO:0006810 ! transport
+
+[Term]
+id: GO:0005575
+name: cellular_component
+namespace: cellular_component
+
+[Term]
+id: GO:0016020
+name: membrane
+namespace: cellular_component
+is_a: GO:0005575 ! cellular_component
+"""
+
+# emapper v2.1 output: GOs is column 9, KEGG_Module column 13
+EMAPPER = """## emapper-2.1.12
+## command: emapper.py -i OG0000000.fa --itype proteins -o OG0000000
+##
+#query	seed_ortholog	evalue	score	eggNOG_OGs	max_annot_lvl	COG_category	Description	Preferred_name	GOs	EC	KEGG_ko	KEGG_Pathway	KEGG_Module	KEGG_Reaction	KEGG_rclass	BRITE	KEGG_TC	CAZy	BiGG_Reaction	PFAMs
+Xylpar1_g000123	5101.XP_018284412.1	1.2e-210	702.2	KOG0254@2759|Eukaryota,3NU4K@4751|Fungi	4751|Fungi	G	Major facilitator superfamily	HXT1	GO:0005355,GO:0008645	-	ko:K08139	-	M00012	-	-	ko00000,ko02000	2.A.1.1	-	-	Sugar_tr
+## 1 queries scanned
+"""
+
+# InterProScan TSV with -goterms: GO terms are column 13, the InterPro description column 12
+INTERPROSCAN = ("Xylpar1_g000456\t9f2c4be81a0e5b7d3c6a1f0e2d4b8a7c\t512\tPfam\tPF00083\tSugar (and other) transporter\t"
+                "40\t480\t2.1E-90\tT\t01-06-2025\tIPR005828\tMajor facilitator, sugar transporter-like\t"
+                "GO:0016020(InterPro)|GO:0022857(InterPro)\t-\n")
+
+
+@pytest.fixture
+def annotations(tmp_path):
+    eggnog_dir = tmp_path / "eggnog"
+    interpro_dir = tmp_path / "iprscan"
+    eggnog_dir.mkdir()
+    interpro_dir.mkdir()
+    (eggnog_dir / "OG0000000.emapper.annotations").write_text(EMAPPER)
+    (interpro_dir / "OG0000001.interproscan.tsv").write_text(INTERPROSCAN)
+    (interpro_dir / "OG0000002.interproscan.tsv").write_text("")
+    (tmp_path / "go.obo").write_text(GO_OBO)
+    return tmp_path
+
+
+def read_tsv(path):
+    with open(path) as f:
+        return list(csv.DictReader(f, delimiter="\t"))
+
+
+def test_go_columns(annotations):
+    assert go_summary.eggnog_go_ids(annotations / "eggnog" / "OG0000000.emapper.annotations") == \
+        {"GO:0005355", "GO:0008645"}
+    assert go_summary.interpro_go_ids(annotations / "iprscan" / "OG0000001.interproscan.tsv") == \
+        {"GO:0016020", "GO:0022857"}
+
+
+def test_propagation_and_enrichment(annotations):
+    (annotations / "foreground.txt").write_text("OG0000000\n")
+    go_summary.summarize(annotations / "eggnog", annotations / "iprscan", annotations / "go.obo",
+                         annotations / "summary.tsv", go_cache=None, workers=1, propagate_terms=True,
+                         foreground_file=annotations / "foreground.txt",
+                         enrichment_output=annotations / "enrichment.tsv")
+
+    summary = {row["Orthogroup"]: row for row in read_tsv(annotations / "summary.tsv")}
+    assert summary["OG0000000"]["BP_GO_IDs"] == "GO:0006810; GO:0008150; GO:0008645"
+    assert summary["OG0000000"]["MF_GO_IDs"] == "GO:0003674; GO:0005215; GO:0005355; GO:0022857"
+    assert summary["OG0000001"]["MF_GO_IDs"] == "GO:0003674; GO:0005215; GO:0022857"
+    assert summary["OG0000001"]["CC_GO_IDs"] == "GO:0005575; GO:0016020"
+    assert summary["OG0000002"]["BP_GO_IDs"] == summary["OG0000002"]["MF_GO_IDs"] == "-"
+
+    enrichment = {row["GO_ID"]: row for row in read_tsv(annotations / "enrichment.tsv")}
+    # 3 orthogroups, 1 in the foreground: a term only the foreground has gives P(X >= 1) = 1/3
+    glucose = enrichment["GO:0005355"]
+    assert (glucose["Study_Count"], glucose["Study_Size"], glucose["Background_Count"],
+            glucose["Background_Size"]) == ("1", "1", "1", "3")
+    assert float(glucose["P_Value"]) == pytest.approx(1 / 3, rel=1e-3)
+    assert float(enrichment["GO:0022857"]["P_Value"]) == pytest.approx(2 / 3, rel=1e-3)
+    assert float(enrichment["GO:0016020"]["P_Value"]) == 1
+
+
+def baseline_summary(eggnog_dir, interpro_dir, go_obo_path, output_file):
+    """The original go-summary.py, reading GO ids from the GOs and InterProScan GO columns."""
+    import contextlib
+    import glob
+    import io
+    from collections import defaultdict
+    from goatools.obo_parser import GODag
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        go_dag = GODag(str(go_obo_path))
+    short = {"biological_process": "BP", "molecular_function": "MF", "cellular_component": "CC"}
+    orthogroup_go = defaultdict(lambda: defaultdict(set))
+
+    def add(og, go_id):
+        if go_id in go_dag and go_dag[go_id].namespace in short:
+            orthogroup_go[og][short[go_dag[go_id].namespace]].add((go_id, go_dag[go_id].name))
+
+    for filepath in glob.glob(f"{eggnog_dir}/*.emapper.annotations"):
+        og = os.path.basename(filepath).split(".")[0]
+        with open(filepath) as f:
+            for line in f:
+                fields = line.strip().split("\t")
+                if line.startswith("#") or len(fields) < 16:
+                    continue
+                if fields[9] and fields[9] != "-":
+                    for go_id in fields[9].split(","):
+                        add(og, go_id.strip())
+    for file in os.listdir(interpro_dir):
+        if not file.endswith(".tsv"):
+            continue
+        with open(os.path.join(interpro_dir, file)) as f:
+            for line in f:
+                fields = line.strip().split("\t")
+                if line.startswith("#") or len(fields) < 14:
+                    continue
+                if fields[13] and fields[13] != "-":
+                    for go_id in fields[13].split("|"):
+                        add(file.replace(".interproscan.tsv", ""), go_id.strip().split("(")[0])
+
+    all_orthogroups = set(orthogroup_go)
+    all_orthogroups.update(os.path.basename(file).split(".")[0]
+                           for file in glob.glob(f"{eggnog_dir}/*.emapper.annotations"))
+    all_orthogroups.update(file.replace(".interproscan.tsv", "") for file in os.listdir(interpro_dir)
+                           if file.endswith(".tsv"))
+    with open(output_file, "w") as out:
+        writer = csv.writer(out, delimiter="\t")
+        writer.writerow(["Orthogroup", "BP_GO_IDs", "BP_Names", "MF_GO_IDs", "MF_Names", "CC_GO_IDs", "CC_Names"])
+        for og in sorted(all_orthogroups):
+            row = [og]
+            for ns in ["BP", "MF", "CC"]:
+                terms = sorted(orthogroup_go[og][ns])
+                row.extend(["; ".join(t[0] for t in terms) or "-", "; ".join(t[1] for t in terms) or "-"])
+            writer.writerow(row)
+
+
+def test_matches_baseline(synthetic, tmp_path):
+    pytest.importorskip("goatools")
+    # An alt_id (GO:0000110 is an alt_id of GO:0000050), an unknown id and an orthogroup without GO terms
+    (synthetic / "eggnog" / "OG0000100.emapper.annotations").write_text(
+        EMAPPER.replace("GO:0005355,GO:0008645", "GO:0000110,GO:9999999,GO:0000002"))
+    (synthetic / "iprscan-annotations" / "OG0000101.interproscan.tsv").write_text(
+        INTERPROSCAN.replace("GO:0016020(InterPro)|GO:0022857(InterPro)", "-"))
+    baseline_summary(synthetic / "eggnog", synthetic / "iprscan-annotations", synthetic / "go" / "go.obo",
+                     tmp_path / "baseline.tsv")
+    go_summary.summarize(synthetic / "eggnog", synthetic / "iprscan-annotations", synthetic / "go" / "go.obo",
+                         tmp_path / "summary.tsv", go_cache=tmp_path / "go_cache", workers=3)
+    assert (tmp_path / "summary.tsv").read_bytes() == (tmp_path / "baseline.tsv").read_bytes()
+    assert "GO:0000110" in (tmp_path / "summary.tsv").read_text()
@@ -0,0 +1,93 @@
+import os
+import random
+import subprocess
+import sys
+
+from conftest import COMPARE
+
+sys.path.insert(0, os.path.join(COMPARE, "orthofinder", "python"))
+import hmm_domtbl
+
+REFINE = os.path.join(COMPARE, "orthofinder", "python", "refine_orthogroups.py")
+
+
+def domtbl_line(target, tlen, query, qlen, i_evalue, score, hmm_from, hmm_to):
+    return (f"{target} - {tlen} {query} - {qlen} 1e-50 200.0 0.1 1 1 1e-30 {i_evalue:g} {score} 0.2 "
+            f"{hmm_from} {hmm_to} {hmm_from + 3} {hmm_to + 3} {hmm_from} {hmm_to + 5} 0.95 some protein\n")
+
+
+def random_domtbl(path, rng, targets, query="OG0000000", qlen=200):
+    lines = ["# target name accession tlen query name ...\n"]
+    for target in targets:
+        for _ in range(rng.randint(0, 4)):
+            start = rng.randint(1, qlen)
+            lines.append(domtbl_line(target, 400, query, qlen, rng.choice([1e-40, 1e-3, 0.5]),
+                                     round(rng.uniform(1, 90), 1), start, rng.randint(start, qlen)))
+    path.write_text("".join(lines) + "#\n# Program: hmmsearch\n")
+
+
+def brute_force_coverage(path, max_evalue):
+    """target -> (positions covered, summed score, domains), one domain line at a time."""
+    result = {}
+    with open(path) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            cols = line.split()
+            if float(cols[12]) > max_evalue:
+                continue
+            positions, score, n = result.get(cols[0], (set(), 0.0, 0))
+            positions |= set(range(int(cols[15]), int(cols[16]) + 1))
+            result[cols[0]] = (positions, score + float(cols[13]), n + 1)
+    return {target: (len(positions), score, n) for target, (positions, score, n) in result.items()}
+
+
+def test_coverage_matches_brute_force(tmp_path):
+    rng = random.Random(11)
+    for trial in range(20):
+        path = tmp_path / f"{trial}.tbl"
+        random_domtbl(path, rng, [f"seq{i}" for i in range(rng.randint(0, 12))])
+        for max_evalue in (0.01, 1.0):
+            cov = hmm_domtbl.hmm_coverage(hmm_domtbl.read_domtblout(path), max_evalue=max_evalue)
+            got = {target: (covered, round(score, 6), n) for target, covered, score, n in zip(
+                cov["target"].tolist(), cov["covered"].tolist(), cov["score"].tolist(), cov["n_domains"].tolist())}
+            expected = {target: (covered, round(score, 6), n)
+                        for target, (covered, score, n) in brute_force_coverage(path, max_evalue).items()}
+            assert got == expected
+            assert all(0 < c <= 1 for c in cov["coverage"].tolist())
+
+
+def test_refine_hmm_method(synthetic, tmp_path):
+    rng = random.Random(5)
+    tables = tmp_path / "hmmsearch"
+    tables.mkdir()
+    species_of = {}
+    with open(synthetic / "Orthogroups" / "Orthogroups.tsv") as f:
+        species = f.readline().rstrip("\n").split("\t")[1:]
+        for line in f:
+            cells = line.rstrip("\n").split("\t")
+            for sp, cell in zip(species, cells[1:]):
+                species_of.update((seq_id, sp) for seq_id in cell.split(", ") if seq_id)
+    orthogroups = sorted(path.name[:-3] for path in (synthetic / "Orthogroup_Sequences").iterdir())
+    for og in orthogroups:
+        with open(synthetic / "Orthogroup_Sequences" / f"{og}.fa") as f:
+            members = [line[1:].split()[0] for line in f if line.startswith(">")]
+        random_domtbl(tables / f"{og}.tbl", rng, members, query=og)
+
+    subprocess.run([sys.executable, REFINE, "-i", str(synthetic / "Orthogroup_Sequences"), "-o", str(tmp_path / "out"),
+                    "-l", str(synthetic / "Orthogroups" / "OG_list.txt"),
+                    "-t", str(synthetic / "Orthogroups" / "Orthogroups.tsv"),
+                    "-m", "hmm:0.5:20", "--hmm-dir", str(tables)], check=True, stdout=subprocess.DEVNULL)
+
+    with open(tmp_path / "out" / "Orthogroup_Refined_Gene_Counts.tsv") as f:
+        header = f.readline().rstrip("\n").split("\t")[1:]
+        counts = {cells[0]: dict(zip(header, map(int, cells[1:])))
+                  for cells in (line.rstrip("\n").split("\t") for line in f)}
+    for og in orthogroups:
+        passing = {target for target, (covered, score, _) in
+                   brute_force_coverage(tables / f"{og}.tbl", 0.01).items() if covered / 200 >= 0.5 and score >= 20}
+        with open(tmp_path / "out" / f"{og}.fa") as f:
+            kept = [line[1:].split()[0] for line in f if line.startswith(">")]
+        assert set(kept) == passing
+        assert {sp: counts[sp][og] for sp in species} == \
+            {sp: sum(species_of[seq_id] == sp for seq_id in kept) for sp in species}
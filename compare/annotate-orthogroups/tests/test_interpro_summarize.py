@@ -0,0 +1,152 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(os.path.dirname(HERE), "interpro-summarize-orthogroups.py")
+
+
+def baseline_summarize(input_folder, output_summary, output_per_protein):
+    """The original script, with its paths as arguments and files in sorted order."""
+    data = defaultdict(lambda: defaultdict(lambda: {
+        'length': None, 'domains': defaultdict(int), 'ipr_desc': defaultdict(int),
+        'go_terms': set(), 'metacyc_pathways': set(), 'reactome_pathways': set()}))
+    for filename in sorted(os.listdir(input_folder)):
+        if not filename.endswith(".tsv"):
+            continue
+        og = filename
+        for suffix in ['.interproscan.tsv', '.interproscan', '.tsv']:
+            if og.endswith(suffix):
+                og = og[:-len(suffix)]
+                break
+        with open(os.path.join(input_folder, filename)) as f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+                fields = line.strip().split("\t")
+                if len(fields) < 15:
+                    continue
+                protein = data[og][fields[0]]
+                protein['length'] = fields[2]
+                if fields[3] in ["Pfam", "CDD", "SMART"]:
+                    protein['domains'][f"{fields[3]}:{fields[4]}"] += 1
+                ipr_id, ipr_desc_str, go_terms_str, pathways_str = fields[11:15]
+                if ipr_id and ipr_id != "-":
+                    ipr_entry = f"{ipr_id}:{ipr_desc_str}" if ipr_desc_str and ipr_desc_str != "-" else ipr_id
+                    protein['ipr_desc'][ipr_entry] += 1
+                if go_terms_str and go_terms_str != "-":
+                    for go in go_terms_str.split("|"):
+                        go_id = go.split("(")[0].strip()
+                        if go_id:
+                            protein['go_terms'].add(go_id)
+                if pathways_str and pathways_str != "-":
+                    for pw in pathways_str.split("|"):
+                        pw = pw.strip()
+                        if pw:
+                            key = 'reactome_pathways' if pw.startswith("Reactome:") else 'metacyc_pathways'
+                            protein[key].add(pw)
+
+    with open(output_per_protein, "w") as out_prot:
+        out_prot.write("Orthogroup\tProtein\tLength\tDomains\tGO_Terms\tInterPro_Entries\tMetaCyc_Pathways\t"
+                       "Reactome_Pathways\n")
+        for og in sorted(data):
+            for prot in sorted(data[og]):
+                p = data[og][prot]
+                cells = [", ".join(sorted(p[key])) for key in
+                         ('domains', 'go_terms', 'ipr_desc', 'metacyc_pathways', 'reactome_pathways')]
+                out_prot.write("\t".join([og, prot, p['length'] or "-"] + cells) + "\n")
+
+    with open(output_summary, "w") as out_sum:
+        out_sum.write("Orthogroup\tNum_Proteins\tMedian_Length\tDomains\tGO_Terms\tInterPro_Entries\t"
+                      "MetaCyc_Pathways\tReactome_Pathways\n")
+        for og in sorted(data):
+            proteins = data[og]
+            lengths = sorted(int(proteins[p]['length']) for p in proteins if proteins[p]['length'])
+            if lengths:
+                mid = len(lengths) // 2
+                median_length = (lengths[mid-1] + lengths[mid]) / 2 if len(lengths) % 2 == 0 else lengths[mid]
+            else:
+                median_length = "-"
+            domain_counts, ipr_desc_counts = defaultdict(int), defaultdict(int)
+            go_terms_set, metacyc_set, reactome_set = set(), set(), set()
+            for prot in proteins:
+                for d, c in proteins[prot]['domains'].items():
+                    domain_counts[d] += c
+                for ipr, c in proteins[prot]['ipr_desc'].items():
+                    ipr_desc_counts[ipr] += c
+                go_terms_set.update(proteins[prot]['go_terms'])
+                metacyc_set.update(proteins[prot]['metacyc_pathways'])
+                reactome_set.update(proteins[prot]['reactome_pathways'])
+            out_sum.write("\t".join([og, str(len(proteins)), str(median_length),
+                                     ", ".join(sorted(domain_counts, key=domain_counts.get, reverse=True)),
+                                     ", ".join(sorted(go_terms_set)),
+                                     ", ".join(sorted(ipr_desc_counts, key=ipr_desc_counts.get, reverse=True)),
+                                     ", ".join(sorted(metacyc_set)), ", ".join(sorted(reactome_set))]) + "\n")
+
+
+def ips_line(protein, length, db, accession, ipr="-", ipr_desc="-", go="-", pathways="-"):
+    return (f"{protein}\t0123456789abcdef\t{length}\t{db}\t{accession}\t{db} signature\t10\t90\t1.0E-10\tT\t"
+            f"01-01-2025\t{ipr}\t{ipr_desc}\t{go}\t{pathways}\n")
+
+
+@pytest.fixture
+def interpro_dir(synthetic):
+    """Synthetic InterProScan files plus split orthogroups, ties and lines the original skipped."""
+    input_dir = synthetic / "iprscan-annotations"
+    (input_dir / "OG0000100.interproscan.tsv").write_text(
+        "# comment\n" + ips_line("p2", 300, "Pfam", "PF00002") + ips_line("p1", 120, "CDD", "cd00001") +
+        ips_line("p1", 120, "SMART", "SM00001", "IPR000002", "Second, with comma", "GO:0000002(InterPro)") +
+        "p3\tshort line\n\n" +
+        ips_line("p2", 300, "PANTHER", "PTHR1", "IPR000001", "-", "GO:0000001(InterPro)|GO:0000002(PANTHER)",
+                 "MetaCyc: PWY-1|Reactome: R-HSA-1"))
+    (input_dir / "OG0000100.tsv").write_text(
+        ips_line("p3", 80, "Pfam", "PF00002") + ips_line("p2", 310, "SMART", "SM00001"))
+    (input_dir / "OG0000101.interproscan").write_text(ips_line("p9", 50, "Pfam", "PF00009"))
+    (input_dir / "OG0000102.interproscan.tsv").write_text("")
+    (input_dir / "OG0000103.interproscan.tsv").write_text(ips_line("p4", 1, "Pfam", "PF00001")[:-1])
+    return input_dir
+
+
+def run_script(*args):
+    subprocess.run([sys.executable, SCRIPT, *map(str, args)], check=True, stdout=subprocess.DEVNULL)
+
+
+def assert_same_files(expected_dir, actual_dir):
+    for name in ["summary.tsv", "per_protein.tsv"]:
+        assert (actual_dir / name).read_bytes() == (expected_dir / name).read_bytes(), name
+
+
+def test_matches_baseline(interpro_dir, tmp_path):
+    baseline_summarize(interpro_dir, tmp_path / "summary.tsv", tmp_path / "per_protein.tsv")
+    out = tmp_path / "out"
+    out.mkdir()
+    run_script("-i", interpro_dir, "--summary-out", out / "summary.tsv", "--per-protein-out", out / "per_protein.tsv",
+               "--no-cache")
+    assert_same_files(tmp_path, out)
+
+
+def test_stream_matches_baseline(interpro_dir, tmp_path):
+    baseline_summarize(interpro_dir, tmp_path / "summary.tsv", tmp_path / "per_protein.tsv")
+    out = tmp_path / "out"
+    out.mkdir()
+    run_script("-i", interpro_dir, "--summary-out", out / "summary.tsv", "--per-protein-out", out / "per_protein.tsv",
+               "--no-cache", "--stream")
+    assert_same_files(tmp_path, out)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_workers_and_cache_match_baseline(interpro_dir, tmp_path, stream):
+    baseline_summarize(interpro_dir, tmp_path / "summary.tsv", tmp_path / "per_protein.tsv")
+    out = tmp_path / "out"
+    out.mkdir()
+    options = ["-i", interpro_dir, "--summary-out", out / "summary.tsv", "--per-protein-out", out / "per_protein.tsv",
+               "--cache", tmp_path / "cache.sqlite", "--workers", 3] + (["--stream"] if stream else [])
+    run_script(*options)
+    assert_same_files(tmp_path, out)
+    # The second run reads every file from the cache
+    (out / "summary.tsv").unlink()
+    run_script(*options)
+    assert_same_files(tmp_path, out)
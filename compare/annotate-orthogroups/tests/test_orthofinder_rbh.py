@@ -0,0 +1,104 @@
+import csv
+import gzip
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(os.path.dirname(HERE), "orthofinder_rbh.py")
+
+SPECIES = {0: "Xylpar1", 1: "Lecano1", 2: "Cladonia_sp", 3: "Excluded_sp"}
+N_GENES = {0: 12, 1: 9, 2: 15, 3: 4}
+
+
+@pytest.fixture
+def working_dir(tmp_path):
+    """A small OrthoFinder WorkingDirectory: SpeciesIDs.txt, SequenceIDs.txt and gzipped BlastX_Y files."""
+    rng = random.Random(17)
+    wd = tmp_path / "WorkingDirectory"
+    wd.mkdir()
+    (wd / "SpeciesIDs.txt").write_text("".join(f"{x}: {name}.faa\n" for x, name in SPECIES.items() if x != 3) +
+                                       f"#3: {SPECIES[3]}.faa\n")
+    with open(wd / "SequenceIDs.txt", "w") as out:
+        for x in SPECIES:
+            for y in range(N_GENES[x]):
+                out.write(f"{x}_{y}: {SPECIES[x]}_g{y:04d} hypothetical protein {y}\n")
+    for x in SPECIES:
+        for y in SPECIES:
+            if x == y:
+                continue
+            lines = []
+            for q in range(N_GENES[x]):
+                for _ in range(rng.randint(0, 4)):
+                    # Mostly the "same" gene number, so reciprocal hits happen; coarse values, so ties happen
+                    subject = rng.choice([q % N_GENES[y], q % N_GENES[y], rng.randrange(N_GENES[y])])
+                    lines.append(f"{x}_{q}\t{y}_{subject}\t{rng.choice([35.5, 60.0, 88.25])}\t"
+                                 f"200\t10\t0\t1\t200\t1\t200\t{rng.choice([1e-50, 1e-20, 1e-4, 0.5])}\t"
+                                 f"{rng.choice([50.1, 120.0, 300.0])}\n")
+            with gzip.open(wd / f"Blast{x}_{y}.txt.gz", "wt") as out:
+                out.writelines(lines)
+    return wd
+
+
+def brute_force_best(path, evalue_thresh, identity_thresh):
+    """({query: (subject, identity, evalue, bit score)}, hits passing); best by bit score, E-value, identity, order."""
+    hits = {}
+    with gzip.open(path, "rt") as f:
+        for order, line in enumerate(f):
+            cols = line.rstrip("\n").split("\t")
+            identity, evalue, bitscore = float(cols[2]), float(cols[10]), float(cols[11])
+            if evalue <= evalue_thresh and identity >= identity_thresh:
+                hits.setdefault(cols[0], []).append(((-bitscore, evalue, -identity, order),
+                                                     (cols[1], identity, evalue, bitscore)))
+    return {query: min(candidates)[1] for query, candidates in hits.items()}, sum(map(len, hits.values()))
+
+
+def name(seq_id):
+    x, y = map(int, seq_id.split("_"))
+    return f"{SPECIES[x]}_g{y:04d}"
+
+
+def read_matrix(path):
+    with open(path) as f:
+        rows = list(csv.reader(f, delimiter="\t"))
+    return {(row[0], column): value for row in rows[1:] for column, value in zip(rows[0][1:], row[1:])}
+
+
+@pytest.mark.parametrize("workers, chunksize", [(1, 1_000_000), (2, 3)])
+def test_matches_brute_force(working_dir, tmp_path, workers, chunksize):
+    out = tmp_path / "rbh"
+    subprocess.run([sys.executable, SCRIPT, str(working_dir), "-o", str(out), "-e", "1e-3", "-i", "40",
+                    "--workers", str(workers), "--chunksize", str(chunksize)], check=True, stdout=subprocess.DEVNULL)
+
+    expected_rbh = []
+    hit_counts, best_counts, rbh_counts = {}, {}, {}
+    for x, y in [(0, 1), (0, 2), (1, 2)]:
+        best_xy, hits_xy = brute_force_best(working_dir / f"Blast{x}_{y}.txt.gz", 1e-3, 40)
+        best_yx, hits_yx = brute_force_best(working_dir / f"Blast{y}_{x}.txt.gz", 1e-3, 40)
+        a, b = SPECIES[x], SPECIES[y]
+        hit_counts[a, b], hit_counts[b, a] = str(hits_xy), str(hits_yx)
+        best_counts[a, b], best_counts[b, a] = str(len(best_xy)), str(len(best_yx))
+        pairs = [(query, hit) for query, hit in sorted(best_xy.items(), key=lambda item: int(item[0].split("_")[1]))
+                 if hit[0] in best_yx and best_yx[hit[0]][0] == query]
+        rbh_counts[a, b] = rbh_counts[b, a] = str(len(pairs))
+        for query, (subject, identity, evalue, bitscore) in pairs:
+            _, identity_ba, evalue_ba, bitscore_ba = best_yx[subject]
+            expected_rbh.append([a, name(query), b, name(subject), identity, identity_ba, bitscore, bitscore_ba,
+                                 evalue, evalue_ba])
+    assert expected_rbh
+
+    with open(out / "Reciprocal_Best_Hits.tsv") as f:
+        rows = list(csv.reader(f, delimiter="\t"))
+    assert rows[0] == ["Species_A", "Gene_A", "Species_B", "Gene_B", "Identity_AB", "Identity_BA",
+                       "Bitscore_AB", "Bitscore_BA", "Evalue_AB", "Evalue_BA"]
+    assert [row[:4] + [float(value) for value in row[4:]] for row in rows[1:]] == \
+        [row[:4] + [pytest.approx(value, rel=1e-6) for value in row[4:]] for row in expected_rbh]
+
+    for filename, expected in [("Pairwise_Hit_Counts.tsv", hit_counts), ("Pairwise_Best_Hit_Counts.tsv", best_counts),
+                               ("Pairwise_RBH_Counts.tsv", rbh_counts)]:
+        matrix = read_matrix(out / filename)
+        assert set(name for name, _ in matrix) == {SPECIES[0], SPECIES[1], SPECIES[2]}
+        assert {key: value for key, value in matrix.items() if key[0] != key[1]} == expected, filename
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import COMPARE
+
+sys.path.insert(0, os.path.join(COMPARE, "orthofinder", "python"))
+import orthogroup_store
+
+SeqIO = pytest.importorskip("Bio.SeqIO")
+
+# Layouts the original SeqIO-based reader accepted
+ODD_FASTAS = {
+    "OG0000900.fa": ">a desc\r\nMKV\r\nLL\r\n>b\r\nMK\r\n",
+    "OG0000901.fa": ">a\nMKVLL\n\n>b\n\nMK",
+    "OG0000902.fa": ">no_sequence\n>b\nM K V\n",
+    "OG0000903.fa": "",
+}
+
+
+def baseline_records(path):
+    """(id, length) of each record, as the original script read them with SeqIO."""
+    return [(record.id, len(record)) for record in SeqIO.parse(path, "fasta")]
+
+
+@pytest.fixture
+def fasta_dir(synthetic):
+    sequences = synthetic / "Orthogroup_Sequences"
+    for name, text in ODD_FASTAS.items():
+        (sequences / name).write_bytes(text.encode())
+    return sequences
+
+
+def test_read_fasta_matches_seqio(fasta_dir):
+    for path in sorted(fasta_dir.iterdir()):
+        records = orthogroup_store.read_fasta(path)
+        assert list(zip(records.ids, records.lengths.tolist())) == baseline_records(path), path.name
+
+
+def test_write_keeps_records(fasta_dir, tmp_path):
+    for path in sorted(fasta_dir.iterdir()):
+        records = orthogroup_store.read_fasta(path)
+        keep = np.arange(len(records)) % 2 == 0
+        records.write(tmp_path / path.name, keep)
+        expected = [(r.id, str(r.seq)) for i, r in enumerate(SeqIO.parse(path, "fasta")) if i % 2 == 0]
+        assert [(r.id, str(r.seq)) for r in SeqIO.parse(tmp_path / path.name, "fasta")] == expected, path.name
+
+
+def test_packed_store_matches_directory(fasta_dir, tmp_path):
+    store_path = tmp_path / "sequences.ogstore"
+    names = sorted(path.name[:-3] for path in fasta_dir.iterdir())
+    assert orthogroup_store.pack(str(fasta_dir), str(store_path)) == len(names)
+
+    store = orthogroup_store.open_sequences(str(store_path))
+    directory = orthogroup_store.open_sequences(str(fasta_dir))
+    assert isinstance(store, orthogroup_store.PackedOrthogroupStore)
+    assert "OG0000404" not in store
+    for og in names:
+        assert bytes(store.raw(og)) == (fasta_dir / f"{og}.fa").read_bytes()
+        assert store.digest(og) == directory.digest(og)
+        packed, loose = store.records(og), directory.records(og)
+        assert packed.ids == loose.ids
+        assert packed.lengths.tolist() == loose.lengths.tolist()
+
+    subprocess.run([sys.executable, orthogroup_store.__file__, "extract", str(store_path), "OG0000002.fa",
+                    "OG0000900", "-o", str(tmp_path / "extracted")], check=True)
+    for og in ["OG0000002", "OG0000900"]:
+        assert (tmp_path / "extracted" / f"{og}.fa").read_bytes() == (fasta_dir / f"{og}.fa").read_bytes()
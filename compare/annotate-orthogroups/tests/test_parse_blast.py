@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import parse_blast
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def blast_line(query, subject, bitscore):
+    return f"{query}\t{subject}\t95.500\t300\t13\t0\t1\t300\t5\t304\t1.5e-80\t{bitscore}\n"
+
+
+def test_parquet_chunks_with_more_categories_than_the_first(tmp_path):
+    # The first chunk has one query (int8 dictionary indices), the second 200 (more than int8 holds)
+    blast = tmp_path / "hits.tsv"
+    with open(blast, "w") as out:
+        out.writelines(blast_line("q_first", f"s{i}", 300 + i) for i in range(200))
+        out.writelines(blast_line(f"q{i}", "s0", 250) for i in range(200))
+
+    output = tmp_path / "hits.parquet"
+    chunks = parse_blast.read_blast_chunks(blast, 1e-5, 30, chunksize=200)
+    assert parse_blast.write_hits(chunks, output, "parquet") == 400
+
+    hits = pq.read_table(output).to_pandas()
+    assert hits["query"].astype(str).tolist() == ["q_first"] * 200 + [f"q{i}" for i in range(200)]
+    assert hits["subject"].astype(str).tolist() == [f"s{i}" for i in range(200)] + ["s0"] * 200
+    assert hits["bit score"].tolist() == [300 + i for i in range(200)] + [250] * 200
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3, 100])
+def test_top_hits_detects_ungrouped_input(tmp_path, chunksize):
+    # q1's hits are split up around q2; its best hit (bit score 90) comes last
+    blast = tmp_path / "hits.tsv"
+    blast.write_text(blast_line("q0", "s1", 50) + blast_line("q1", "s1", 60) + blast_line("q2", "s2", 70) +
+                     blast_line("q2", "s3", 80) + blast_line("q1", "s4", 90))
+    chunks = parse_blast.read_blast_chunks(blast, 1e-5, 30, chunksize=chunksize)
+    best = [(str(query), str(subject)) for top in parse_blast.top_hits(chunks, k=1)
+            for query, subject in zip(top["query"], top["subject"])]
+    assert best == [("q0", "s1"), ("q1", "s4"), ("q2", "s3")]
+
+
+def baseline_hits(path, evalue_thresh, identity_thresh):
+    """The original line-by-line parser: (query, subject, % identity, evalue) of each passing hit."""
+    hits = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            cols = line.strip().split("\t")
+            if float(cols[10]) <= evalue_thresh and float(cols[2]) >= identity_thresh:
+                hits.append((cols[0], cols[1], float(cols[2]), float(cols[10])))
+    return hits
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "bz2", "xz"])
+def test_comment_lines_and_hash_in_ids(tmp_path, compression):
+    # -outfmt 7 comment lines around the hits; ids with "#" must be kept whole
+    text = ("# BLASTP 2.15.0+\n# Query: sp|P1#2\n# 2 hits found\n" + blast_line("sp|P1#2", "tr|Q9#x", 80) +
+            blast_line("sp|P1#2", "s2", 40) + "\n# Query: q3\n" + blast_line("q3", "s#3", 60) +
+            "# BLAST processed 2 queries")
+    plain = tmp_path / "hits.tsv"
+    plain.write_text(text)
+    path = plain
+    if compression:
+        import bz2, gzip, lzma
+        opener = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}[compression]
+        path = tmp_path / f"hits.tsv.{compression}"
+        with opener(path, "wt") as out:
+            out.write(text)
+    hits = parse_blast.parse_blast(path, 1e-5, 30)
+    assert list(zip(hits["query"].astype(str), hits["subject"].astype(str), hits["% identity"].astype(float),
+                    hits["evalue"])) == baseline_hits(plain, 1e-5, 30)
+    assert [str(q) for q in hits["query"]] == ["sp|P1#2", "sp|P1#2", "q3"]
+
+
+def test_only_comments(tmp_path):
+    blast = tmp_path / "hits.tsv"
+    blast.write_text("# BLASTP 2.15.0+\n# 0 hits found\n")
+    assert len(parse_blast.parse_blast(blast, 1e-5, 30)) == 0
@@ -0,0 +1,197 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import COMPARE
+
+sys.path.insert(0, os.path.join(COMPARE, "orthofinder", "python"))
+import refine_tables
+
+SCRIPT = os.path.join(COMPARE, "orthofinder", "python", "refine_orthogroups.py")
+SeqIO = pytest.importorskip("Bio.SeqIO")
+
+
+def baseline_refine_orthogroup(fasta_path, basename, output_dir, og_df, method="sd"):
+    """The original refine_orthogroups.py refine_orthogroup (minus its log line), kept as the oracle."""
+    from Bio.Seq import Seq
+    from Bio.SeqRecord import SeqRecord
+
+    df = pd.DataFrame([{"seq_id": r.id, "seq_len": len(r), "seq_seq": str(r.seq)}
+                       for r in SeqIO.parse(fasta_path, "fasta")])
+    if df.empty:
+        return {}, None
+    mean_before, sd_before, total = df["seq_len"].mean(), df["seq_len"].std(), len(df)
+    lengths = df["seq_len"].values
+    if method == "sd":
+        mu, sigma = lengths.mean(), lengths.std()
+        keep_mask = (lengths >= mu - sigma) & (lengths <= mu + sigma)
+    elif method == "mad":
+        median = np.median(lengths)
+        cutoff = 2.5 * np.median(np.abs(lengths - median))
+        keep_mask = (lengths >= median - cutoff) & (lengths <= median + cutoff)
+    else:
+        low, high = np.quantile(lengths, [0.05, 0.95])
+        keep_mask = (lengths >= low) & (lengths <= high)
+    refined_df = df[keep_mask]
+    mean_after = refined_df["seq_len"].mean() if not refined_df.empty else 0
+    sd_after = refined_df["seq_len"].std() if not refined_df.empty else 0
+    refined = len(refined_df)
+    SeqIO.write([SeqRecord(Seq(row["seq_seq"]), id=row["seq_id"], description="")
+                 for _, row in refined_df.iterrows()], os.path.join(output_dir, f"{basename}.fa"), "fasta")
+
+    og_row = og_df[og_df["Orthogroup"] == basename]
+    seq_to_species = {}
+    for col in og_row.columns[1:]:
+        val = og_row.iloc[0][col] if not og_row.empty else None
+        if pd.notna(val) and val != "":
+            for seq_id in val.split(", "):
+                seq_to_species[seq_id] = col
+    species_counts = {col: 0 for col in og_df.columns[1:]}
+    for seq_id in refined_df["seq_id"]:
+        if seq_id in seq_to_species:
+            species_counts[seq_to_species[seq_id]] += 1
+    return species_counts, {
+        "Orthogroup": basename, "Total": total, "Refined": refined, "Removed": total - refined,
+        "Mean_Before": round(mean_before, 2), "SD_Before": round(sd_before, 2),
+        "Mean_After": round(mean_after, 2) if refined > 0 else 0,
+        "SD_After": round(sd_after, 2) if refined > 0 else 0, "Method": method}
+
+
+def baseline_refine(input_dir, output_dir, list_path, tsv, method="sd"):
+    """The original main(): refined FASTAs plus the count matrix and summary tables."""
+    os.makedirs(output_dir, exist_ok=True)
+    og_df = pd.read_csv(tsv, sep="\t", dtype=str).fillna("")
+    with open(list_path) as f:
+        og_list = [line.strip().replace(".fa", "") for line in f if line.strip()]
+    summary_matrix = pd.DataFrame(index=list(og_df.columns[1:]))
+    summary_rows = []
+    for og in og_list:
+        fasta_path = os.path.join(input_dir, f"{og}.fa")
+        if not os.path.exists(fasta_path):
+            continue
+        counts, summary_row = baseline_refine_orthogroup(fasta_path, og, output_dir, og_df, method=method)
+        if counts:
+            summary_matrix[og] = pd.Series(counts)
+        if summary_row:
+            summary_rows.append(summary_row)
+    summary_matrix.to_csv(os.path.join(output_dir, "Orthogroup_Refined_Gene_Counts.tsv"), sep="\t")
+    pd.DataFrame(summary_rows).to_csv(os.path.join(output_dir, "Orthogroup_Refinement_Summary.tsv"),
+                                      sep="\t", index=False)
+
+
+def refine(data, output, *options):
+    subprocess.run([sys.executable, SCRIPT, "-i", str(data / "Orthogroup_Sequences"), "-o", str(output),
+                    "-l", str(data / "Orthogroups" / "OG_list.txt"), "-t", str(data / "Orthogroups" / "Orthogroups.tsv"),
+                    *options], check=True, stdout=subprocess.DEVNULL)
+
+
+def fasta_records(path):
+    return [(record.id, str(record.seq)) for record in SeqIO.parse(path, "fasta")]
+
+
+def assert_same_outputs(expected, actual):
+    """Same tables byte for byte; refined FASTAs keep the input's line wrapping, so compare their records."""
+    names = sorted(os.listdir(expected))
+    assert names and set(names) <= set(os.listdir(actual))
+    for name in names:
+        if name.endswith(".fa"):
+            assert fasta_records(expected / name) == fasta_records(actual / name), name
+        else:
+            assert (expected / name).read_bytes() == (actual / name).read_bytes(), name
+
+
+@pytest.fixture
+def refine_data(synthetic):
+    """Synthetic data plus the cases the baseline skips or tolerates."""
+    sequences = synthetic / "Orthogroup_Sequences"
+    (sequences / "OG0000100.fa").write_text("")
+    with open(sequences / "OG0000003.fa", "a") as out:
+        out.write(">not_in_orthogroups_tsv unwrapped\n" + "M" * 300 + "\n")
+    with open(synthetic / "Orthogroups" / "OG_list.txt", "a") as out:
+        out.write("OG0000100.fa\nOG0000404\n")
+    return synthetic
+
+
+@pytest.mark.parametrize("method", ["sd", "mad", "quantile"])
+def test_matches_baseline(refine_data, tmp_path, method):
+    data = refine_data
+    baseline_refine(data / "Orthogroup_Sequences", tmp_path / "baseline", data / "Orthogroups" / "OG_list.txt",
+                    data / "Orthogroups" / "Orthogroups.tsv", method)
+    refine(data, tmp_path / "refined", "-m", method, "--index", str(tmp_path / "index.npz"))
+    assert_same_outputs(tmp_path / "baseline", tmp_path / "refined")
+
+    # A second run reads the saved index instead of Orthogroups.tsv
+    refine(data, tmp_path / "reindexed", "-m", method, "--index", str(tmp_path / "index.npz"))
+    assert_same_outputs(tmp_path / "baseline", tmp_path / "reindexed")
+
+
+def test_jobs_match_baseline(refine_data, tmp_path):
+    data = refine_data
+    baseline_refine(data / "Orthogroup_Sequences", tmp_path / "baseline", data / "Orthogroups" / "OG_list.txt",
+                    data / "Orthogroups" / "Orthogroups.tsv")
+    refine(data, tmp_path / "refined", "--jobs", "3")
+    assert_same_outputs(tmp_path / "baseline", tmp_path / "refined")
+
+
+def test_resume_matches_baseline(refine_data, tmp_path):
+    data = refine_data
+    refine(data, tmp_path / "refined")
+    # Drop the last member of one orthogroup; only that orthogroup is refined again
+    fasta = data / "Orthogroup_Sequences" / "OG0000005.fa"
+    fasta.write_text(">" + ">".join(fasta.read_text().split(">")[1:-1]))
+    baseline_refine(data / "Orthogroup_Sequences", tmp_path / "baseline", data / "Orthogroups" / "OG_list.txt",
+                    data / "Orthogroups" / "Orthogroups.tsv")
+    result = subprocess.run([sys.executable, SCRIPT, "-i", str(data / "Orthogroup_Sequences"),
+                             "-o", str(tmp_path / "refined"), "-l", str(data / "Orthogroups" / "OG_list.txt"),
+                             "-t", str(data / "Orthogroups" / "Orthogroups.tsv")],
+                            check=True, capture_output=True, text=True)
+    # The empty and the missing orthogroup are retried too
+    assert "Reusing 24 orthogroups" in result.stdout and "refining 3" in result.stdout
+    assert_same_outputs(tmp_path / "baseline", tmp_path / "refined")
+
+
+def test_sweep_matches_baseline(refine_data, tmp_path):
+    data = refine_data
+    refine(data, tmp_path / "sweep", "--sweep", "sd", "mad", "quantile")
+    summary = pd.read_csv(tmp_path / "sweep" / "Orthogroup_Refinement_Summary.tsv", sep="\t")
+    for method in ["sd", "mad", "quantile"]:
+        baseline = tmp_path / f"baseline_{method}"
+        baseline_refine(data / "Orthogroup_Sequences", baseline, data / "Orthogroups" / "OG_list.txt",
+                        data / "Orthogroups" / "Orthogroups.tsv", method)
+        assert (baseline / "Orthogroup_Refined_Gene_Counts.tsv").read_bytes() == \
+            (tmp_path / "sweep" / f"Orthogroup_Refined_Gene_Counts.{method}.tsv").read_bytes()
+        pd.testing.assert_frame_equal(summary[summary["Method"] == method].reset_index(drop=True),
+                                      pd.read_csv(baseline / "Orthogroup_Refinement_Summary.tsv", sep="\t"))
+    assert not list((tmp_path / "sweep").glob("*.fa"))
+
+
+def test_packed_store_matches_baseline(refine_data, tmp_path):
+    data = refine_data
+    store = tmp_path / "sequences.ogstore"
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(SCRIPT), "orthogroup_store.py"), "pack",
+                    str(data / "Orthogroup_Sequences"), str(store)], check=True, stdout=subprocess.DEVNULL)
+    baseline_refine(data / "Orthogroup_Sequences", tmp_path / "baseline", data / "Orthogroups" / "OG_list.txt",
+                    data / "Orthogroups" / "Orthogroups.tsv")
+    subprocess.run([sys.executable, SCRIPT, "-i", str(store), "-o", str(tmp_path / "refined"),
+                    "-l", str(data / "Orthogroups" / "OG_list.txt"), "-t", str(data / "Orthogroups" / "Orthogroups.tsv"),
+                    "--jobs", "2"], check=True, stdout=subprocess.DEVNULL)
+    assert_same_outputs(tmp_path / "baseline", tmp_path / "refined")
+
+
+def test_parquet_tables_load_like_baseline(refine_data, tmp_path):
+    pytest.importorskip("pyarrow")
+    data = refine_data
+    baseline_refine(data / "Orthogroup_Sequences", tmp_path / "baseline", data / "Orthogroups" / "OG_list.txt",
+                    data / "Orthogroups" / "Orthogroups.tsv", "mad")
+    refine(data, tmp_path / "refined", "-m", "mad", "--output-format", "parquet")
+    for name, load in [("Orthogroup_Refined_Gene_Counts", refine_tables.load_counts),
+                       ("Orthogroup_Refinement_Summary", refine_tables.load_summary)]:
+        assert not (tmp_path / "refined" / f"{name}.tsv").exists()
+        expected = load(tmp_path / "baseline" / f"{name}.tsv")
+        pd.testing.assert_frame_equal(load(tmp_path / "refined" / f"{name}.parquet"), expected)
+        pd.testing.assert_frame_equal(expected, pd.read_csv(tmp_path / "baseline" / f"{name}.tsv", sep="\t",
+                                                            index_col=0 if "Counts" in name else None))
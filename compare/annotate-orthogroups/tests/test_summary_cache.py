@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from summary_cache import SummaryCache
+
+
+def scan(cache_path, *directories):
+    """Read every file of the directories through the cache; returns (values, evicted)."""
+    cache = SummaryCache(str(cache_path), "test")
+    values = {}
+    for directory in directories:
+        for path in sorted(directory.iterdir()):
+            value = cache.get(path)
+            if value is None:
+                value = {"text": path.read_text()}
+                cache.put(path, value)
+            values[path.name] = value["text"]
+    return values, (cache.hits, cache.misses), cache.close()
+
+
+def test_reuse_and_eviction(tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    for directory in (first, second):
+        directory.mkdir()
+        for i in range(3):
+            (directory / f"OG{i}.tsv").write_text(f"{directory.name} {i}\n")
+
+    assert scan(tmp_path / "cache.sqlite", first)[1:] == ((0, 3), 0)
+    # A run over another directory keeps the first directory's entries
+    assert scan(tmp_path / "cache.sqlite", second)[1:] == ((0, 3), 0)
+    assert scan(tmp_path / "cache.sqlite", first)[1:] == ((3, 0), 0)
+
+    (first / "OG0.tsv").write_text("changed\n")
+    os.utime(first / "OG0.tsv", ns=(0, 0))
+    (first / "OG1.tsv").unlink()
+    values, counts, evicted = scan(tmp_path / "cache.sqlite", first)
+    assert values == {"OG0.tsv": "changed\n", "OG2.tsv": "first 2\n"}
+    assert (counts, evicted) == ((1, 1), 1)
+
+    # Files that no longer exist are evicted whichever directory is scanned
+    (first / "OG2.tsv").unlink()
+    assert scan(tmp_path / "cache.sqlite", second)[1:] == ((3, 0), 1)
+    assert scan(tmp_path / "cache.sqlite", first)[1:] == ((1, 0), 0)
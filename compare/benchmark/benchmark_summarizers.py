@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Benchmark the orthogroup summarizers on synthetic data of increasing size.
+
+For every size, a synthetic OrthoFinder results directory is generated (and
+reused on later runs), then each summarizer is run as a subprocess. Wall time,
+peak RSS and input files/second are saved as JSON together with the git commit,
+so results from different commits can be compared with --baseline.
+
+    python3 benchmark_summarizers.py --sizes 500 2000 10000 -o bench_$(git rev-parse --short HEAD).json
+    python3 benchmark_summarizers.py --sizes 500 2000 10000 -o new.json --baseline old.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+from make_synthetic_orthofinder import generate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COMPARE = os.path.dirname(HERE)
+
+SCRIPTS = {
+    "refine_orthogroups": os.path.join(COMPARE, "orthofinder", "python", "refine_orthogroups.py"),
+    "eggnog_summarize": os.path.join(COMPARE, "annotate-orthogroups", "eggnog-summarize-orthogroups.py"),
+    "interpro_summarize": os.path.join(COMPARE, "annotate-orthogroups", "interpro-summarize-orthogroups.py"),
+    "go_summary": os.path.join(COMPARE, "annotate-orthogroups", "go-summary.py"),
+}
+
+
+def command_for(name, data, out):
+    """Command line for one summarizer on a synthetic dataset."""
+    if name == "refine_orthogroups":
+        return [SCRIPTS[name], "-i", f"{data}/Orthogroup_Sequences", "-o", f"{out}/refined",
+                "-l", f"{data}/Orthogroups/OG_list.txt", "-t", f"{data}/Orthogroups/Orthogroups.tsv", "--force"]
+    if name == "eggnog_summarize":
+        return [SCRIPTS[name], "-i", f"{data}/eggnog",
+                "--summary-out", f"{out}/eggnog_orthogroup_summary.tsv",
+                "--per-protein-out", f"{out}/eggnog_per_protein.tsv"]
+    if name == "interpro_summarize":
+        return [SCRIPTS[name], "-i", f"{data}/iprscan-annotations",
+                "--summary-out", f"{out}/interproscan_orthogroup_summary.tsv",
+                "--per-protein-out", f"{out}/interproscan_per_protein.tsv"]
+    if name == "go_summary":
+        return [SCRIPTS[name], "--eggnog-dir", f"{data}/eggnog", "--interpro-dir", f"{data}/iprscan-annotations",
+                "--obo", f"{data}/go/go.obo", "-o", f"{out}/orthogroup_go_summary.tsv"]
+    raise ValueError(name)
+
+
+def check_output(name, out):
+    """Reason a successful run still did no real work, or None.
+
+    go-summary exits 0 even when it reads no GO ids at all (every column "-"),
+    which would make its timings measure an empty workload.
+    """
+    if name == "go_summary":
+        with open(f"{out}/orthogroup_go_summary.tsv") as f:
+            next(f, None)
+            annotated = sum(1 for line in f if any(cell != "-" for cell in line.rstrip("\n").split("\t")[1::2]))
+        if not annotated:
+            return "no orthogroup has a GO term"
+    return None
+
+
+def run_measured(cmd, log_path):
+    """Run a command; return (wall seconds, peak RSS in MB, return code)."""
+    with open(log_path, "w") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable] + cmd, stdout=log, stderr=subprocess.STDOUT)
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return wall, rusage.ru_maxrss / scale, proc.returncode
+
+
+def prepare_dataset(workdir, n_orthogroups, n_species, seed):
+    data = os.path.join(workdir, f"data_og{n_orthogroups}_sp{n_species}_seed{seed}")
+    stamp = os.path.join(data, ".complete")
+    if not os.path.exists(stamp):
+        shutil.rmtree(data, ignore_errors=True)
+        print(f"Generating {n_orthogroups} orthogroups x {n_species} species in {data}", flush=True)
+        generate(data, n_orthogroups, n_species, seed=seed)
+        open(stamp, "w").close()
+    return data
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "-C", HERE, "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_to_baseline(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["script"], r["orthogroups"], r["species"]): r for r in baseline["results"]}
+    print(f"\nCompared to {baseline_path} (commit {baseline.get('commit')}):")
+    print(f"{'script':<22}{'OGs':>8}{'wall':>10}{'old':>10}{'ratio':>8}{'RSS MB':>10}{'old':>10}")
+    for r in results:
+        old = previous.get((r["script"], r["orthogroups"], r["species"]))
+        if old is None or r["returncode"] != 0 or old["returncode"] != 0 or r["error"] or old.get("error"):
+            continue
+        ratio = r["wall_s"] / old["wall_s"] if old["wall_s"] else float("nan")
+        print(f"{r['script']:<22}{r['orthogroups']:>8}{r['wall_s']:>10.2f}{old['wall_s']:>10.2f}{ratio:>8.2f}"
+              f"{r['peak_rss_mb']:>10.1f}{old['peak_rss_mb']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the orthogroup summarizers on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 5000],
+                        help="Orthogroup counts to benchmark (default: 200 1000 5000)")
+    parser.add_argument("--species", type=int, default=50, help="Number of species (default: 50)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the synthetic data (default: 1)")
+    parser.add_argument("--scripts", nargs="+", choices=list(SCRIPTS), default=list(SCRIPTS),
+                        help="Summarizers to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per measurement; the fastest is kept")
+    parser.add_argument("-w", "--workdir", default="benchmark_work",
+                        help="Directory for synthetic data and outputs (default: ./benchmark_work)")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="Results JSON")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = []
+    for size in args.sizes:
+        data = prepare_dataset(args.workdir, size, args.species, args.seed)
+        for name in args.scripts:
+            best = None
+            for attempt in range(args.repeat):
+                out = os.path.join(args.workdir, f"out_og{size}", name)
+                shutil.rmtree(out, ignore_errors=True)
+                os.makedirs(out)
+                wall, rss, returncode = run_measured(command_for(name, data, out), os.path.join(out, "run.log"))
+                error = None if returncode else check_output(name, out)
+                if best is None or (returncode == 0 and not error and wall < best[0]):
+                    best = (wall, rss, returncode, error)
+            wall, rss, returncode, error = best
+            result = {
+                "script": name,
+                "orthogroups": size,
+                "species": args.species,
+                "wall_s": round(wall, 4),
+                "peak_rss_mb": round(rss, 1),
+                "files_per_s": round(size / wall, 1) if wall > 0 else None,
+                "returncode": returncode,
+                "error": error,
+            }
+            results.append(result)
+            status = ("ok" if returncode == 0 and not error else
+                      f"FAILED ({error or f'exit {returncode}'}, see {out}/run.log)")
+            print(f"{name:<22} {size:>7} OGs  {wall:8.2f}s  {rss:8.1f} MB  {status}", flush=True)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {args.output}")
+
+    if args.baseline:
+        compare_to_baseline(results, args.baseline)
+    failed = [r["script"] for r in results if r["returncode"] != 0 or r["error"]]
+    if failed:
+        sys.exit(f"{len(failed)} benchmark runs failed: {', '.join(sorted(set(failed)))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Generate a fake, scale-tunable OrthoFinder results directory for benchmarking.
+
+The layout mirrors what the summarizers expect on the cluster:
+
+    OUTDIR/Orthogroups/Orthogroups.tsv
+    OUTDIR/Orthogroups/OG_list.txt
+    OUTDIR/Orthogroup_Sequences/OGxxxxxxx.fa
+    OUTDIR/eggnog/OGxxxxxxx.emapper.annotations
+    OUTDIR/iprscan-annotations/OGxxxxxxx.interproscan.tsv
+    OUTDIR/go/go.obo
+    OUTDIR/Annotate_Orthogroups/            (empty, for summarizer outputs)
+
+Output depends only on the parameters and --seed.
+"""
+import argparse
+import os
+import random
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+NAMESPACES = ["biological_process", "molecular_function", "cellular_component"]
+COG_LETTERS = "CDEGHIJKLMNOPQSTUVWYZ"
+EMAPPER_COLUMNS = [
+    "query", "seed_ortholog", "evalue", "score", "eggNOG_OGs", "max_annot_lvl", "COG_category",
+    "Description", "Preferred_name", "GOs", "EC", "KEGG_ko", "KEGG_Pathway", "KEGG_Module",
+    "KEGG_Reaction", "KEGG_rclass", "BRITE", "KEGG_TC", "CAZy", "BiGG_Reaction", "PFAMs",
+]
+
+
+def write_go_obo(path, n_terms, rng):
+    """Small GO-like DAG: three roots, is_a parents within a namespace, some alt_ids and obsolete terms."""
+    with open(path, "w") as out:
+        out.write("format-version: 1.2\ndata-version: synthetic\n\n")
+        by_namespace = {ns: [] for ns in NAMESPACES}
+        for i in range(1, n_terms + 1):
+            go_id = f"GO:{i:07d}"
+            ns = NAMESPACES[i % 3]
+            out.write(f"[Term]\nid: {go_id}\nname: synthetic {ns.replace('_', ' ')} term {i}\nnamespace: {ns}\n")
+            if i % 50 == 0:
+                out.write(f"alt_id: GO:{n_terms + i:07d}\n")
+            if i > 3 and i % 97 == 0:
+                out.write("is_obsolete: true\n\n")
+                continue
+            parents = by_namespace[ns]
+            if parents:
+                for parent in sorted(set(rng.sample(parents, min(len(parents), rng.randint(1, 2))))):
+                    out.write(f"is_a: {parent} ! parent\n")
+            parents.append(go_id)
+            out.write("\n")
+    return [f"GO:{i:07d}" for i in range(1, n_terms + 1)]
+
+
+def random_sequence(pool, rng, length):
+    start = rng.randrange(0, len(pool) - length)
+    return pool[start:start + length]
+
+
+def write_fasta(path, records, width=60):
+    with open(path, "w") as out:
+        for seq_id, seq in records:
+            out.write(f">{seq_id}\n")
+            for i in range(0, len(seq), width):
+                out.write(seq[i:i + width] + "\n")
+
+
+def write_emapper(path, og_index, proteins, family, rng):
+    with open(path, "w") as out:
+        out.write("## synthetic emapper output\n## emapper-2.1.12\n## command: emapper.py -i synthetic.fa\n##\n")
+        out.write("#" + "\t".join(EMAPPER_COLUMNS) + "\n")
+        for seq_id, seq in proteins:
+            if rng.random() < 0.1:
+                continue  # unannotated proteins are not reported by emapper
+            gos = ",".join(sorted(rng.sample(family["go"], rng.randint(0, len(family["go"]))))) or "-"
+            kegg = ",".join(rng.sample(family["kegg"], rng.randint(0, len(family["kegg"])))) or "-"
+            fields = {
+                "query": seq_id,
+                "seed_ortholog": f"{rng.randint(4000, 5000)}.XP_{rng.randint(1, 999999):06d}.1",
+                "evalue": f"{rng.uniform(1, 9):.1f}e-{rng.randint(10, 200)}",
+                "score": f"{rng.uniform(50, 900):.1f}",
+                "eggNOG_OGs": ",".join(family["eggnog_ogs"]),
+                "max_annot_lvl": "4751|Fungi",
+                "COG_category": family["cog"],
+                "Description": rng.choice(family["descriptions"]),
+                "Preferred_name": rng.choice(["-", f"gene{og_index}"]),
+                "GOs": gos,
+                "KEGG_ko": kegg,
+                "PFAMs": ",".join(family["pfam_names"]),
+            }
+            out.write("\t".join(fields.get(col, "-") for col in EMAPPER_COLUMNS) + "\n")
+        out.write(f"## {len(proteins)} queries scanned\n## Total time (seconds): 1.0\n")
+
+
+def write_interproscan(path, proteins, family, rng):
+    with open(path, "w") as out:
+        for seq_id, seq in proteins:
+            for _ in range(rng.randint(0, 4)):
+                source, acc = rng.choice(family["signatures"])
+                ipr, ipr_desc = rng.choice(family["ipr"] + [("-", "-")])
+                go = "|".join(f"{g}(InterPro)" for g in rng.sample(family["go"], rng.randint(0, min(2, len(family["go"]))))) or "-"
+                pathways = "|".join(rng.sample(family["pathways"], rng.randint(0, len(family["pathways"])))) or "-"
+                start = rng.randint(1, max(1, len(seq) - 50))
+                out.write("\t".join([
+                    seq_id, "0" * 32, str(len(seq)), source, acc, f"{source} signature {acc}",
+                    str(start), str(min(len(seq), start + 49)), f"{rng.uniform(1, 9):.1E}", "T",
+                    "01-01-2025", ipr, ipr_desc, go, pathways,
+                ]) + "\n")
+
+
+def make_family(rng, go_ids, og_index):
+    return {
+        "go": rng.sample(go_ids, min(len(go_ids), rng.randint(0, 6))),
+        "kegg": [f"ko:K{rng.randint(1, 25000):05d}" for _ in range(rng.randint(0, 2))],
+        "cog": rng.choice(COG_LETTERS) if rng.random() < 0.9 else "-",
+        "eggnog_ogs": [f"KOG{rng.randint(1, 4999):04d}@2759|Eukaryota", f"{og_index:X}@4751|Fungi"],
+        "descriptions": [f"Protein family {og_index % 997}", f"Hydrolase, family {og_index % 31}", "-"],
+        "pfam_names": [f"Pfam_{rng.randint(1, 2000)}"],
+        "signatures": [("Pfam", f"PF{rng.randint(1, 20000):05d}"), ("CDD", f"cd{rng.randint(1, 20000):05d}"),
+                       ("SMART", f"SM{rng.randint(1, 2000):05d}"), ("PANTHER", f"PTHR{rng.randint(1, 40000):05d}")],
+        "ipr": [(f"IPR{rng.randint(1, 50000):06d}", f"Domain of family {rng.randint(1, 500)}")
+                for _ in range(rng.randint(1, 3))],
+        "pathways": [f"MetaCyc: PWY-{rng.randint(100, 8000)}", f"Reactome: R-HSA-{rng.randint(10000, 99999)}"],
+    }
+
+
+def generate(outdir, n_orthogroups, n_species, mean_members=12, n_go_terms=3000, seed=1):
+    """Write the synthetic dataset to outdir; returns the list of orthogroup IDs."""
+    rng = random.Random(seed)
+    for sub in ["Orthogroups", "Orthogroup_Sequences", "eggnog", "iprscan-annotations", "go",
+                "Annotate_Orthogroups"]:
+        os.makedirs(os.path.join(outdir, sub), exist_ok=True)
+
+    go_ids = write_go_obo(os.path.join(outdir, "go", "go.obo"), n_go_terms, rng)
+    species = [f"Species_{i:03d}" for i in range(1, n_species + 1)]
+    gene_counter = [0] * n_species
+    pool = "".join(rng.choice(AMINO_ACIDS) for _ in range(1 << 16))
+
+    orthogroups = []
+    with open(os.path.join(outdir, "Orthogroups", "Orthogroups.tsv"), "w") as tsv:
+        tsv.write("\t".join(["Orthogroup"] + species) + "\n")
+        for og_index in range(n_orthogroups):
+            og = f"OG{og_index:07d}"
+            orthogroups.append(og)
+            size = max(2, int(rng.expovariate(1.0 / mean_members)))
+            base_length = rng.randint(80, 1200)
+            cells = [[] for _ in species]
+            proteins = []
+            for _ in range(size):
+                sp = rng.randrange(n_species)
+                gene_counter[sp] += 1
+                seq_id = f"{species[sp]}_g{gene_counter[sp]:06d}"
+                cells[sp].append(seq_id)
+                # mostly similar lengths, with a few fragments and fusions
+                factor = rng.choice([1.0] * 8 + [0.3, 2.5]) * rng.uniform(0.9, 1.1)
+                length = max(20, min(len(pool) - 1, int(base_length * factor)))
+                proteins.append((sp, seq_id, random_sequence(pool, rng, length)))
+            tsv.write("\t".join([og] + [", ".join(cell) for cell in cells]) + "\n")
+            # Members are written in Orthogroups.tsv order: species columns left to right, genes as listed
+            proteins = [(seq_id, seq) for _, seq_id, seq in sorted(proteins, key=lambda protein: protein[0])]
+
+            family = make_family(rng, go_ids, og_index)
+            write_fasta(os.path.join(outdir, "Orthogroup_Sequences", f"{og}.fa"), proteins)
+            write_emapper(os.path.join(outdir, "eggnog", f"{og}.emapper.annotations"), og_index, proteins, family, rng)
+            write_interproscan(os.path.join(outdir, "iprscan-annotations", f"{og}.interproscan.tsv"),
+                               proteins, family, rng)
+
+    with open(os.path.join(outdir, "Orthogroups", "OG_list.txt"), "w") as out:
+        out.write("".join(f"{og}.fa\n" for og in orthogroups))
+    return orthogroups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic OrthoFinder results for benchmarking")
+    parser.add_argument("-o", "--output", required=True, help="Output directory")
+    parser.add_argument("-n", "--orthogroups", type=int, default=1000, help="Number of orthogroups (default: 1000)")
+    parser.add_argument("-s", "--species", type=int, default=50, help="Number of species (default: 50)")
+    parser.add_argument("--mean-members", type=int, default=12, help="Mean orthogroup size (default: 12)")
+    parser.add_argument("--go-terms", type=int, default=3000, help="Number of GO terms in go.obo (default: 3000)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    args = parser.parse_args()
+    generate(args.output, args.orthogroups, args.species, args.mean_members, args.go_terms, args.seed)
+    print(f"Synthetic OrthoFinder results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ import shutil
 import copy
 import math
 from base64 import b16encode
+import numpy as np
 
 
 # Python 2 compatability:
@@ -58,6 +59,39 @@ def get_pvalue_asterisks(node):
     else:
         return ''
 
+# family size at the end of each node label, e.g. "species_12:" or ")_7" (postorder)
+FAMSIZE_RE = re.compile(r'_(\d+)(?=[:,)]|$)')
+
+
+def family_events(sizes, branch_pvalues, parent, branch_p_cutoff):
+    '''
+    vectorized expansion (+1) and contraction (-1) calls for a (families x
+    nodes) matrix of family sizes in ArrayTree order: a node changed if its
+    branch p-value is <= the cutoff and its size differs from its parent's.
+    Nodes without a p-value (NaN) or parent get 0.
+    '''
+    has_parent = parent >= 0
+    parent_sizes = sizes[:, np.where(has_parent, parent, 0)]
+    significant = (branch_pvalues <= branch_p_cutoff) & has_parent
+    return np.where(significant, np.sign(sizes - parent_sizes), 0).astype(np.int8)
+
+
+class ArrayTree():
+    '''
+    compact array form of the species tree: the ete3 nodes in postorder (the
+    order of node labels in CAFE's Newick strings), the parent index of each
+    node (-1 for the root), a map from CAFE's numerical node IDs to indices,
+    and the indices that CAFE's branch p-values belong to.
+    '''
+    def __init__(self, tree, cafe_node_id_order):
+        self.nodes = list(tree.traverse('postorder'))
+        index = {id(node): i for i, node in enumerate(self.nodes)}
+        self.parent = np.array([index[id(node.up)] if node.up else -1 for node in self.nodes], dtype=np.int64)
+        self.id_to_index = {node.id: i for i, node in enumerate(self.nodes)}
+        self.pvalue_index = np.array([self.id_to_index[node_id] for node_id in cafe_node_id_order], dtype=np.int64)
+        return
+
+
 def to_rgb(v_abs, min_v, max_v):
     if min_v == max_v:
         hex_color = "#A9A9A9"
@@ -159,21 +193,24 @@ class CAFE_fig():
                     break  # end of header lines
 
         # count the number of significant expansions
-        # and significant contractions per node:
+        # and significant contractions per node, from the family size and
+        # p-value vectors of all significant families at once:
+        self.array_tree = ArrayTree(self.tree, self.cafe_node_id_order)
+        sizes, pvalues = [], []
         for family in self:
             if family.pvalue > self.family_p_cutoff:
                 continue  # insignificant family
-            family.get_tree_with_famsizes()
-            for node, fam_tree_node in zip(
-                self.tree.traverse(),
-                family.tree.traverse()
-            ):
-                if not fam_tree_node.event:
-                    continue
-                if fam_tree_node.event == '+':
-                    node.sig_expansions += 1
-                elif fam_tree_node.event == '-':
-                    node.sig_contractions += 1
+            family.parse_vectors()
+            sizes.append(family.sizes)
+            pvalues.append(family.branch_pvalues)
+        if sizes:
+            events = family_events(np.array(sizes), np.array(pvalues),
+                                   self.array_tree.parent, self.branch_p_cutoff)
+            for node, n_exp, n_con in zip(self.array_tree.nodes,
+                                          (events == 1).sum(axis=0).tolist(),
+                                          (events == -1).sum(axis=0).tolist()):
+                node.sig_expansions = n_exp
+                node.sig_contractions = n_con
         print('Parsing CAFE report... done!')
         return
 
@@ -418,42 +455,55 @@ class Family():
     def __init__(self, txtline, cafe_fig_instance):
         values = txtline.strip().split()
         self.name = values[0]
-        self.nwk_famsize_str = values[1].replace(')_', ')') + ';'
+        self.famsize_str = values[1]
         self.pvalue = float(values[2])
         self.branch_pvalue_str = values[3]
         self.c = cafe_fig_instance
         return
 
+    def parse_vectors(self):
+        '''
+        read the family sizes and branch p-values into arrays in ArrayTree
+        order, without building an ete3 tree. Branch p-values are NaN where
+        CAFE wrote "-", for nodes without one, and for insignificant families.
+        '''
+        array_tree = self.c.array_tree
+        sizes = FAMSIZE_RE.findall(self.famsize_str)
+        if len(sizes) != len(array_tree.nodes):
+            raise ValueError('family {}: found {} node sizes for a tree of {} nodes'.format(
+                self.name, len(sizes), len(array_tree.nodes)))
+        self.sizes = np.array(sizes, dtype=np.int64)
+        node_pvalues = re.findall(r'[\d\.]+|-', self.branch_pvalue_str)
+        index = array_tree.pvalue_index[:len(node_pvalues)]
+        self.has_pvalue = np.zeros(len(sizes), dtype=bool)
+        self.has_pvalue[index] = True
+        self.branch_pvalues = np.full(len(sizes), np.nan)
+        if self.pvalue <= self.c.family_p_cutoff:
+            self.branch_pvalues[index] = [np.nan if p == '-' else float(p) for p in node_pvalues[:len(index)]]
+        return
+
     def get_tree_with_famsizes(self):
-        self.fam_sizes = []
-        size_tree = ete3.Tree(self.nwk_famsize_str)
+        '''
+        build the ete3 tree of this family (only needed for rendering) with
+        fam_size, pvalue and event node attributes.
+        '''
+        if not hasattr(self, 'sizes'):
+            self.parse_vectors()
+        events = family_events(self.sizes[None], self.branch_pvalues[None],
+                               self.c.array_tree.parent, self.c.branch_p_cutoff)[0]
         self.tree = copy.deepcopy(self.c.tree)
-        # parse family sizes:
-        for node, size_tree_node in zip(
-            self.tree.traverse(),
-            size_tree.traverse()
+        self.fam_sizes = self.sizes.tolist()
+        for node, size, event, has_pvalue, pvalue in zip(
+            self.tree.traverse('postorder'),
+            self.fam_sizes,
+            events.tolist(),
+            self.has_pvalue.tolist(),
+            self.branch_pvalues.tolist()
         ):
-            if size_tree_node.is_leaf():
-                node.fam_size = int(size_tree_node.name.split('_')[1])
-            else:
-                node.fam_size = int(size_tree_node.support)
-            self.fam_sizes.append(node.fam_size)
-            node.event = None
-        # parse family pvalues:
-        node_pvalues = re.findall(r'[\d\.]+|-', self.branch_pvalue_str)
-        for node_id, node_size in zip(self.c.cafe_node_id_order, node_pvalues):
-            nodes = self.tree.search_nodes(id=node_id)
-            assert len(nodes) == 1
-            node = nodes[0]
-            if node_size == '-' or self.pvalue > self.c.family_p_cutoff:
-                node.pvalue = None
-            else:
-                node.pvalue = float(node_size)
-                if node.pvalue <= self.c.branch_p_cutoff:
-                    if node.fam_size > node.up.fam_size:
-                        node.event = '+'
-                    elif node.fam_size < node.up.fam_size:
-                        node.event = '-'
+            node.fam_size = size
+            node.event = {1: '+', -1: '-'}.get(event)
+            if has_pvalue:
+                node.pvalue = None if math.isnan(pvalue) else pvalue
         return
 
 
@@ -471,18 +521,18 @@ def main(report_cafe, families, clades, pb, pf, dump, gfx_output_format, count_a
         if hasattr(c, 'families_of_interest'):
             if family.name not in c.families_of_interest:
                 continue  # skip family since the user didn't specifically select it
-            family.get_tree_with_famsizes()  # prepare to plot
         else:
             if family.pvalue > c.family_p_cutoff:
                 continue  # skip family since it's not significant
-            family.get_tree_with_famsizes()
             if hasattr(c, 'clades_of_interest'):
+                family.parse_vectors()
                 for __, node_id in c.clades_of_interest:
-                    p_value = family.tree.search_nodes(id=node_id)[0].pvalue
+                    p_value = family.branch_pvalues[c.array_tree.id_to_index[node_id]]
                     if p_value <= c.branch_p_cutoff:
                         break
                 else:  # loop wasnt broken = no significant event found
                     continue
+        family.get_tree_with_famsizes()  # only families that are plotted get an ete3 tree
         c.show_fam_size_tree(family)
 
 
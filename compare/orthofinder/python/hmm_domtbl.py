@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Read hmmsearch --domtblout tables and compute per-sequence HMM coverage.
+
+02_OG_hmmsearch.sh writes one HMM_Profiles/hmmsearch/<OG>.tbl per orthogroup
+(the orthogroup's profile searched against its own sequences). Each table is
+read in one go into NumPy columns, and the domains of every target are merged
+into the fraction of HMM positions they cover:
+
+    python3 hmm_domtbl.py HMM_Profiles/hmmsearch -o hmm_coverage.tsv -j 16
+
+refine_orthogroups.py uses the same functions for its `hmm` method.
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# (name, column in domtblout, dtype)
+DOMTBL_COLUMNS = [
+    ("target", 0, str),
+    ("tlen", 2, np.int32),
+    ("query", 3, str),
+    ("qlen", 5, np.int32),
+    ("dom_score", 13, np.float64),
+    ("i_evalue", 12, np.float64),
+    ("hmm_from", 15, np.int32),
+    ("hmm_to", 16, np.int32),
+    ("ali_from", 17, np.int32),
+    ("ali_to", 18, np.int32),
+]
+
+
+def read_domtblout(path):
+    """Read a --domtblout file into a dict of NumPy columns (one row per domain)."""
+    with open(path) as f:
+        rows = [line.split(None, 22) for line in f.read().splitlines() if line and not line.startswith("#")]
+    fields = list(zip(*rows)) if rows else None
+    table = {}
+    for name, col, dtype in DOMTBL_COLUMNS:
+        if fields is None:
+            table[name] = np.array([], dtype=object if dtype is str else dtype)
+        elif dtype is str:
+            table[name] = np.array(fields[col], dtype=object)
+        else:
+            table[name] = np.array(fields[col]).astype(dtype)
+    return table
+
+
+def hmm_coverage(table, max_evalue=None):
+    """Merge the domains of each target into HMM coverage.
+
+    Domains above max_evalue (i-Evalue) are dropped first. Returns a dict of
+    arrays, one entry per target: target, qlen, tlen, covered (HMM positions
+    covered by the union of domain hmm_from..hmm_to intervals), coverage
+    (covered / qlen), score (sum of domain scores) and n_domains.
+    """
+    keep = np.ones(len(table["target"]), dtype=bool)
+    if max_evalue is not None:
+        keep &= table["i_evalue"] <= max_evalue
+    targets, group = np.unique(table["target"][keep].astype(str), return_inverse=True)
+    start = table["hmm_from"][keep].astype(np.int64)
+    end = table["hmm_to"][keep].astype(np.int64)
+    n = len(targets)
+    if n == 0:
+        empty = np.zeros(0)
+        return {"target": targets, "qlen": empty.astype(np.int32), "tlen": empty.astype(np.int32),
+                "covered": empty.astype(np.int64), "coverage": empty, "score": empty,
+                "n_domains": empty.astype(np.int64)}
+
+    # Union of intervals per target: sort by (target, start), then each domain only
+    # adds the part beyond the furthest end seen so far within its target
+    order = np.lexsort((start, group))
+    g, s, e = group[order], start[order], end[order]
+    offset = g * (e.max() + 1)
+    running_end = np.maximum.accumulate(e + offset) - offset
+    prev_end = np.empty_like(running_end)
+    prev_end[0] = 0
+    prev_end[1:] = running_end[:-1]
+    prev_end[np.r_[True, g[1:] != g[:-1]]] = 0
+    added = np.maximum(0, e - np.maximum(s - 1, prev_end))
+    covered = np.bincount(g, weights=added, minlength=n).astype(np.int64)
+
+    first = np.zeros(n, dtype=np.int64)
+    first[group[::-1]] = np.arange(len(group))[::-1]
+    qlen = table["qlen"][keep][first]
+    return {
+        "target": targets,
+        "qlen": qlen,
+        "tlen": table["tlen"][keep][first],
+        "covered": covered,
+        "coverage": covered / np.maximum(qlen, 1),
+        "score": np.bincount(group, weights=table["dom_score"][keep], minlength=n),
+        "n_domains": np.bincount(group, minlength=n),
+    }
+
+
+def _summarize_table(job):
+    path, max_evalue = job
+    return hmm_coverage(read_domtblout(path), max_evalue=max_evalue)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-sequence HMM coverage from hmmsearch --domtblout tables")
+    parser.add_argument("table_dir", help="Directory of <OG>.tbl domain tables")
+    parser.add_argument("-o", "--output", required=True, help="Output TSV")
+    parser.add_argument("--suffix", default=".tbl", help="Domain table suffix (default: .tbl)")
+    parser.add_argument("-E", "--max-evalue", type=float, default=None,
+                        help="Ignore domains with i-Evalue above this (default: keep all)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes (default: 1)")
+    args = parser.parse_args()
+
+    orthogroups = sorted(entry.name[:-len(args.suffix)] for entry in os.scandir(args.table_dir)
+                         if entry.is_file() and entry.name.endswith(args.suffix))
+    jobs = [(os.path.join(args.table_dir, og + args.suffix), args.max_evalue) for og in orthogroups]
+    if args.jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=args.jobs)
+        results = pool.map(_summarize_table, jobs, chunksize=max(1, len(jobs) // (args.jobs * 8)))
+    else:
+        pool = None
+        results = map(_summarize_table, jobs)
+
+    with open(args.output, "w") as out:
+        out.write("Orthogroup\tTarget\tQlen\tTlen\tHMM_Covered\tHMM_Coverage\tScore\tN_Domains\n")
+        for og, cov in zip(orthogroups, results):
+            for target, qlen, tlen, covered, coverage, score, n_domains in zip(
+                    cov["target"].tolist(), cov["qlen"].tolist(), cov["tlen"].tolist(), cov["covered"].tolist(),
+                    cov["coverage"].tolist(), cov["score"].tolist(), cov["n_domains"].tolist()):
+                out.write(f"{og}\t{target}\t{qlen}\t{tlen}\t{covered}\t{coverage:.4f}\t{score:.1f}\t{n_domains}\n")
+    if pool is not None:
+        pool.shutdown()
+    print(f"HMM coverage for {len(orthogroups)} orthogroups written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
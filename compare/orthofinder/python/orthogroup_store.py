@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""Byte-level access to orthogroup sequences.
+
+Orthogroup FASTAs can be read either from an OrthoFinder Orthogroup_Sequences
+directory (one OGxxxxxxx.fa per orthogroup) or from a packed store: a single
+sequence blob plus a sorted offset index, memory-mapped for random access, so
+that 20k+ orthogroups cost two file opens instead of 20k.
+
+    # pack an Orthogroup_Sequences directory
+    python3 orthogroup_store.py pack Orthogroup_Sequences Orthogroup_Sequences.ogstore
+    # stream orthogroups back out as FASTA for external tools
+    python3 orthogroup_store.py extract Orthogroup_Sequences.ogstore OG0000001 > OG0000001.fa
+    mafft --auto <(python3 orthogroup_store.py extract Orthogroup_Sequences.ogstore OG0000001)
+    python3 orthogroup_store.py extract Orthogroup_Sequences.ogstore -l OG_list.txt -o fasta_dir/
+
+The store is a directory holding sequences.bin (the original FASTA files
+concatenated byte for byte, in sorted orthogroup order) and index.npz
+(orthogroup -> byte range and record range, record -> header/sequence/end
+offsets and residue count).
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import sys
+import numpy as np
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-1 of a file, read in chunks."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FastaRecords:
+    """Record layout of a FASTA file held in one buffer.
+
+    Each record spans buf[starts[i]:ends[i]]; its residues start at seq_starts[i]
+    and lengths[i] counts them (whitespace excluded). Nothing is decoded except
+    the IDs, and only when asked for.
+    """
+
+    def __init__(self, buf, starts, seq_starts, ends, lengths):
+        self.buf = buf
+        self.starts = starts
+        self.seq_starts = seq_starts
+        self.ends = ends
+        self.lengths = lengths
+        self._ids = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            view = memoryview(self.buf)
+            ids = []
+            for start, seq_start in zip(self.starts.tolist(), self.seq_starts.tolist()):
+                title = bytes(view[start + 1:seq_start]).split(None, 1)
+                ids.append(title[0].decode() if title else "")
+            self._ids = ids
+        return self._ids
+
+    def write(self, path, keep_mask):
+        """Write the kept records by slicing the original bytes (no re-wrapping)."""
+        view = memoryview(self.buf)
+        with open(path, "wb") as out:
+            for start, end in zip(self.starts[keep_mask].tolist(), self.ends[keep_mask].tolist()):
+                out.write(view[start:end])
+                if end == len(view) and view[end - 1] != 10:
+                    out.write(b"\n")
+
+
+def scan_fasta(buf):
+    """Locate the records of a FASTA buffer with NumPy, without parsing sequences."""
+    data = np.frombuffer(buf, dtype=np.uint8)
+    size = len(data)
+    newlines = np.flatnonzero(data == 10)
+    line_starts = np.concatenate(([0], newlines + 1))
+    line_starts = line_starts[line_starts < size]
+    starts = line_starts[data[line_starts] == ord(">")]
+
+    # Header ends at the next newline; the sequence runs up to the next record
+    nl_after = np.searchsorted(newlines, starts)
+    header_ends = np.full(len(starts), size, dtype=np.int64)
+    has_nl = nl_after < len(newlines)
+    header_ends[has_nl] = newlines[nl_after[has_nl]]
+    seq_starts = np.minimum(header_ends + 1, size)
+    ends = np.append(starts[1:], size).astype(np.int64) if len(starts) else starts.astype(np.int64)
+
+    # Residues = bytes in the sequence block minus line breaks and spaces
+    whitespace = np.flatnonzero((data == 10) | (data == 13) | (data == 32) | (data == 9))
+    n_whitespace = np.searchsorted(whitespace, ends) - np.searchsorted(whitespace, seq_starts)
+    lengths = (ends - seq_starts) - n_whitespace
+    return FastaRecords(buf, starts, seq_starts, ends, lengths)
+
+
+def read_fasta(fasta_path):
+    with open(fasta_path, "rb") as f:
+        return scan_fasta(f.read())
+
+
+class FastaDirectory:
+    """Orthogroup FASTAs stored as {og}.fa files in a directory."""
+
+    def __init__(self, path, suffix=".fa"):
+        self.path = path
+        self.suffix = suffix
+
+    def describe(self, og):
+        return os.path.join(self.path, f"{og}{self.suffix}")
+
+    def __contains__(self, og):
+        return os.path.exists(self.describe(og))
+
+    def stat(self, og):
+        """(size, mtime_ns) of an orthogroup's FASTA."""
+        stat = os.stat(self.describe(og))
+        return stat.st_size, stat.st_mtime_ns
+
+    def digest(self, og):
+        return file_digest(self.describe(og))
+
+    def fingerprint(self, og):
+        size, mtime_ns = self.stat(og)
+        return {"size": size, "mtime_ns": mtime_ns, "sha1": self.digest(og)}
+
+    def records(self, og):
+        return read_fasta(self.describe(og))
+
+
+class PackedOrthogroupStore:
+    """Read-only, memory-mapped packed orthogroup sequence store."""
+
+    BLOB = "sequences.bin"
+    INDEX = "index.npz"
+
+    def __init__(self, path):
+        self.path = path
+        with np.load(os.path.join(path, self.INDEX)) as npz:
+            self.orthogroups = npz["orthogroups"]
+            self.og_bytes = npz["og_bytes"]
+            self.og_records = npz["og_records"]
+            self.rec_start = npz["rec_start"]
+            self.rec_seq_start = npz["rec_seq_start"]
+            self.rec_end = npz["rec_end"]
+            self.rec_length = npz["rec_length"]
+        self.mtime_ns = os.stat(os.path.join(path, self.INDEX)).st_mtime_ns
+        blob_path = os.path.join(path, self.BLOB)
+        if os.path.getsize(blob_path) > 0:
+            with open(blob_path, "rb") as f:
+                self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.blob = b""
+
+    @staticmethod
+    def is_store(path):
+        return (os.path.isdir(path) and os.path.exists(os.path.join(path, PackedOrthogroupStore.INDEX))
+                and os.path.exists(os.path.join(path, PackedOrthogroupStore.BLOB)))
+
+    def _find(self, og):
+        i = int(np.searchsorted(self.orthogroups, og))
+        if i < len(self.orthogroups) and self.orthogroups[i] == og:
+            return i
+        return None
+
+    def describe(self, og):
+        return f"{og} in {self.path}"
+
+    def __contains__(self, og):
+        return self._find(og) is not None
+
+    def __len__(self):
+        return len(self.orthogroups)
+
+    def raw(self, og):
+        """The orthogroup's original FASTA bytes (a zero-copy view of the mapped blob)."""
+        i = self._find(og)
+        if i is None:
+            raise KeyError(og)
+        return memoryview(self.blob)[self.og_bytes[i]:self.og_bytes[i + 1]]
+
+    def stat(self, og):
+        """(size, mtime_ns) of an orthogroup; the mtime is that of the store."""
+        i = self._find(og)
+        return int(self.og_bytes[i + 1] - self.og_bytes[i]), self.mtime_ns
+
+    def digest(self, og):
+        return hashlib.sha1(self.raw(og)).hexdigest()
+
+    def fingerprint(self, og):
+        size, mtime_ns = self.stat(og)
+        return {"size": size, "mtime_ns": mtime_ns, "sha1": self.digest(og)}
+
+    def records(self, og):
+        i = self._find(og)
+        if i is None:
+            raise KeyError(og)
+        base = self.og_bytes[i]
+        first, last = self.og_records[i], self.og_records[i + 1]
+        return FastaRecords(
+            memoryview(self.blob)[base:self.og_bytes[i + 1]],
+            self.rec_start[first:last] - base,
+            self.rec_seq_start[first:last] - base,
+            self.rec_end[first:last] - base,
+            self.rec_length[first:last],
+        )
+
+
+def open_sequences(path):
+    """Open an Orthogroup_Sequences directory or a packed store."""
+    if PackedOrthogroupStore.is_store(path):
+        return PackedOrthogroupStore(path)
+    return FastaDirectory(path)
+
+
+def pack(fasta_dir, store_path, suffix=".fa"):
+    """Pack every {og}{suffix} file of fasta_dir into a store; returns the number of orthogroups."""
+    names = sorted(entry.name[:-len(suffix)] for entry in os.scandir(fasta_dir)
+                   if entry.is_file() and entry.name.endswith(suffix))
+    os.makedirs(store_path, exist_ok=True)
+    og_bytes = [0]
+    og_records = [0]
+    rec_arrays = {"rec_start": [], "rec_seq_start": [], "rec_end": [], "rec_length": []}
+    with open(os.path.join(store_path, PackedOrthogroupStore.BLOB), "wb") as blob:
+        for og in names:
+            with open(os.path.join(fasta_dir, og + suffix), "rb") as f:
+                buf = f.read()
+            records = scan_fasta(buf)
+            base = og_bytes[-1]
+            rec_arrays["rec_start"].append(records.starts + base)
+            rec_arrays["rec_seq_start"].append(records.seq_starts + base)
+            rec_arrays["rec_end"].append(records.ends + base)
+            rec_arrays["rec_length"].append(records.lengths)
+            blob.write(buf)
+            og_bytes.append(base + len(buf))
+            og_records.append(og_records[-1] + len(records))
+    arrays = {key: np.concatenate(parts).astype(np.int64) if parts else np.zeros(0, dtype=np.int64)
+              for key, parts in rec_arrays.items()}
+    tmp_path = os.path.join(store_path, "index.tmp.npz")
+    np.savez(tmp_path, orthogroups=np.array(names, dtype=str), og_bytes=np.array(og_bytes, dtype=np.int64),
+             og_records=np.array(og_records, dtype=np.int64), **arrays)
+    os.replace(tmp_path, os.path.join(store_path, PackedOrthogroupStore.INDEX))
+    return len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack OrthoFinder orthogroup FASTAs into one memory-mapped store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_pack = sub.add_parser("pack", help="Pack an Orthogroup_Sequences directory")
+    p_pack.add_argument("fasta_dir", help="Orthogroup_Sequences directory")
+    p_pack.add_argument("store", help="Output store directory")
+    p_pack.add_argument("--suffix", default=".fa", help="FASTA file suffix (default: .fa)")
+
+    p_extract = sub.add_parser("extract", help="Write orthogroup FASTAs from a store")
+    p_extract.add_argument("store", help="Store directory")
+    p_extract.add_argument("orthogroups", nargs="*", help="Orthogroup IDs (.fa suffix allowed)")
+    p_extract.add_argument("-l", "--list", help="File with orthogroup IDs, one per line")
+    p_extract.add_argument("-o", "--output", default=None,
+                           help="Write {og}.fa files to this directory (default: concatenated to stdout)")
+
+    p_list = sub.add_parser("list", help="List orthogroups and record counts in a store")
+    p_list.add_argument("store", help="Store directory")
+
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        n = pack(args.fasta_dir, args.store, args.suffix)
+        print(f"Packed {n} orthogroups into {args.store}")
+        return
+
+    store = PackedOrthogroupStore(args.store)
+    if args.command == "list":
+        counts = np.diff(store.og_records)
+        for og, n in zip(store.orthogroups.tolist(), counts.tolist()):
+            print(f"{og}\t{n}")
+        return
+
+    ogs = list(args.orthogroups)
+    if args.list:
+        with open(args.list) as f:
+            ogs.extend(line.strip() for line in f if line.strip())
+    ogs = [og[:-3] if og.endswith(".fa") else og for og in ogs]
+    missing = [og for og in ogs if og not in store]
+    if missing:
+        print(f"Warning: {len(missing)} orthogroups not in {args.store}: {', '.join(missing[:10])}", file=sys.stderr)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    out = sys.stdout.buffer
+    skip = set(missing)
+    for og in ogs:
+        if og in skip:
+            continue
+        raw = store.raw(og)
+        if args.output:
+            with open(os.path.join(args.output, f"{og}.fa"), "wb") as f:
+                f.write(raw)
+        else:
+            out.write(raw)
+            if len(raw) and raw[-1] != 10:
+                out.write(b"\n")
+    out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,144 +1,640 @@
 #!/usr/bin/env python3
 import argparse
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
-from Bio import SeqIO
-from Bio.SeqRecord import SeqRecord
-from Bio.Seq import Seq
-
-def refine_orthogroup(fasta_path, basename, output_dir, og_df, method="sd"):
-    """Refine sequences in a single orthogroup and return counts + summary stats."""
-    seq_data = []
-    for seq_record in SeqIO.parse(fasta_path, "fasta"):
-        seq_data.append({
-            'seq_id': seq_record.id,
-            'seq_len': len(seq_record),
-            'seq_seq': str(seq_record.seq)
-        })
-    df = pd.DataFrame(seq_data)
-
-    if df.empty:
-        return {}, None
-
-    # Stats before
-    mean_before = df['seq_len'].mean()
-    sd_before = df['seq_len'].std()
-    total = len(df)
-
-    lengths = df['seq_len'].values
-
-    if method == "sd":
-        mu, sigma = lengths.mean(), lengths.std()
-        keep_mask = (lengths >= mu - sigma) & (lengths <= mu + sigma)
-    elif method == "mad":
-        median = np.median(lengths)
-        mad = np.median(np.abs(lengths - median))
-        cutoff = 2.5 * mad
-        keep_mask = (lengths >= median - cutoff) & (lengths <= median + cutoff)
-    elif method == "quantile":
-        low, high = np.quantile(lengths, [0.05, 0.95])
-        keep_mask = (lengths >= low) & (lengths <= high)
-    else:
-        keep_mask = np.ones_like(lengths, dtype=bool)
+from hmm_domtbl import hmm_coverage, read_domtblout
+from orthogroup_store import FastaDirectory, FastaRecords, file_digest, open_sequences, read_fasta
+import refine_tables
 
-    refined_df = df[keep_mask]
 
-    # Stats after
-    mean_after = refined_df['seq_len'].mean() if not refined_df.empty else 0
-    sd_after = refined_df['seq_len'].std() if not refined_df.empty else 0
-    refined = len(refined_df)
-    removed = total - refined
+class OrthogroupIndex:
+    """Integer-coded index of Orthogroups.tsv, built in a single pass.
 
-    # Save refined FASTA as {basename}.fa
-    refined_records = [
-        SeqRecord(Seq(row['seq_seq']), id=row['seq_id'], description="")
-        for _, row in refined_df.iterrows()
-    ]
-    file_out = os.path.join(output_dir, f"{basename}.fa")
-    SeqIO.write(refined_records, file_out, "fasta")
+    Sequences are stored grouped by orthogroup: the members of orthogroup i are
+    seq_ids[og_offsets[i]:og_offsets[i + 1]], with their species codes (column
+    positions in Orthogroups.tsv) in the same slice of seq_species. The
+    inverted lookup, sequence ID -> (orthogroup, species), is seq_order (the
+    argsort of seq_ids, searched with np.searchsorted) plus seq_og, the
+    orthogroup code of every entry.
+    """
 
-    # Map sequences → species
-    og_row = og_df[og_df['Orthogroup'] == basename]
-    seq_to_species = {}
-    for col in og_row.columns[1:]:
-        val = og_row.iloc[0][col] if not og_row.empty else None
-        if pd.notna(val) and val != "":
-            seq_ids = val.split(", ")
-            for seq_id in seq_ids:
-                seq_to_species[seq_id] = col
-
-    species_counts = {col: 0 for col in og_df.columns[1:]}
-    for seq_id in refined_df['seq_id']:
-        if seq_id in seq_to_species:
-            sp = seq_to_species[seq_id]
-            species_counts[sp] += 1
-
-    # Summary row
-    summary_row = {
+    def __init__(self, species, orthogroups, seq_ids, seq_species, og_offsets, seq_order=None, seq_og=None):
+        self.species = list(species)
+        self.orthogroups = list(orthogroups)
+        self.seq_ids = seq_ids
+        self.seq_species = np.asarray(seq_species, dtype=np.int32)
+        self.og_offsets = np.asarray(og_offsets, dtype=np.int64)
+        self.og_lookup = {og: i for i, og in enumerate(self.orthogroups)}
+        ids = np.array(seq_ids, dtype=str)
+        if seq_order is None:
+            seq_order = np.argsort(ids, kind="stable")
+        if seq_og is None:
+            seq_og = np.repeat(np.arange(len(self.orthogroups), dtype=np.int32), np.diff(self.og_offsets))
+        self.seq_order = np.asarray(seq_order, dtype=np.int64)
+        self.seq_og = np.asarray(seq_og, dtype=np.int32)
+        self._sorted_ids = ids[self.seq_order]
+
+    @classmethod
+    def from_tsv(cls, tsv_path):
+        with open(tsv_path) as f:
+            header = f.readline().rstrip("\r\n").split("\t")
+            orthogroups = []
+            seq_ids = []
+            seq_species = []
+            og_offsets = [0]
+            for line in f:
+                cells = line.rstrip("\r\n").split("\t")
+                if not cells[0]:
+                    continue
+                orthogroups.append(cells[0])
+                for sp, cell in enumerate(cells[1:]):
+                    if cell:
+                        members = cell.split(", ")
+                        seq_ids.extend(members)
+                        seq_species.extend([sp] * len(members))
+                og_offsets.append(len(seq_ids))
+        return cls(header[1:], orthogroups, seq_ids, seq_species, og_offsets)
+
+    def save(self, path, tsv_path=None):
+        """Save the index as .npz; names are stored as newline-joined UTF-8 blobs."""
+        stat = os.stat(tsv_path) if tsv_path else None
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                species=_pack_names(self.species),
+                orthogroups=_pack_names(self.orthogroups),
+                seq_ids=_pack_names(self.seq_ids),
+                seq_species=self.seq_species,
+                og_offsets=self.og_offsets,
+                seq_order=self.seq_order,
+                seq_og=self.seq_og,
+                source=np.array([stat.st_size, stat.st_mtime_ns] if stat else [-1, -1], dtype=np.int64),
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            return cls(
+                _unpack_names(npz["species"]),
+                _unpack_names(npz["orthogroups"]),
+                _unpack_names(npz["seq_ids"]),
+                npz["seq_species"],
+                npz["og_offsets"],
+                # Indexes saved before the inverted lookup was stored get it rebuilt
+                npz["seq_order"] if "seq_order" in npz.files else None,
+                npz["seq_og"] if "seq_og" in npz.files else None,
+            )
+
+    @classmethod
+    def load_or_build(cls, tsv_path, index_path=None):
+        """Load a saved index if it matches Orthogroups.tsv (size + mtime), else rebuild it."""
+        if index_path and os.path.exists(index_path):
+            stat = os.stat(tsv_path)
+            with np.load(index_path) as npz:
+                source = npz["source"].tolist()
+            if source == [stat.st_size, stat.st_mtime_ns]:
+                return cls.load(index_path)
+        index = cls.from_tsv(tsv_path)
+        if index_path:
+            index.save(index_path, tsv_path)
+        return index
+
+    def members(self, og):
+        """Return (seq_ids, species codes) for an orthogroup, or None if it is not in the index."""
+        i = self.og_lookup.get(og)
+        if i is None:
+            return None
+        start, end = self.og_offsets[i], self.og_offsets[i + 1]
+        return self.seq_ids[start:end], self.seq_species[start:end]
+
+    def locate(self, seq_ids):
+        """(orthogroup codes, species codes) of the given sequence IDs; -1 where an ID is not in the index."""
+        ids = np.array(seq_ids, dtype=str)
+        og_codes = np.full(len(ids), -1, dtype=np.int32)
+        species_codes = np.full(len(ids), -1, dtype=np.int32)
+        if len(self._sorted_ids) and len(ids):
+            pos = np.minimum(np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+            found = self._sorted_ids[pos] == ids
+            rows = self.seq_order[pos[found]]
+            og_codes[found] = self.seq_og[rows]
+            species_codes[found] = self.seq_species[rows]
+        return og_codes, species_codes
+
+    def species_codes(self, og, seq_ids):
+        """Species code of each given sequence that is a member of og (-1 for the others)."""
+        og_codes, species_codes = self.locate(seq_ids)
+        species_codes[og_codes != self.og_lookup.get(og, -1)] = -1
+        return species_codes
+
+    def species_counts(self, og, seq_ids):
+        """Count the given sequences of an orthogroup per species (in self.species order)."""
+        codes = self.species_codes(og, seq_ids)
+        return np.bincount(codes[codes >= 0], minlength=len(self.species)).astype(np.int64)
+
+
+def _pack_names(names):
+    return np.frombuffer("\n".join(names).encode(), dtype=np.uint8)
+
+
+def _unpack_names(blob):
+    text = blob.tobytes().decode()
+    return text.split("\n") if text else []
+
+
+class CountMatrix:
+    """Species × orthogroup gene counts in a preallocated integer array.
+
+    Rows follow the species order of the index; columns are orthogroups in the
+    order they were first added, as in the old column-by-column DataFrame.
+    """
+
+    def __init__(self, species, capacity):
+        self.species = list(species)
+        self.counts = np.zeros((len(self.species), capacity), dtype=np.int32)
+        self.orthogroups = []
+        self._columns = {}
+
+    def add(self, og, counts):
+        col = self._columns.get(og)
+        if col is None:
+            col = len(self.orthogroups)
+            if col == self.counts.shape[1]:
+                grown = np.zeros((len(self.species), max(1, 2 * col)), dtype=np.int32)
+                grown[:, :col] = self.counts
+                self.counts = grown
+            self._columns[og] = col
+            self.orthogroups.append(og)
+        self.counts[:, col] = counts
+
+    @property
+    def matrix(self):
+        return self.counts[:, :len(self.orthogroups)]
+
+    def write_tsv(self, path, chunk_size=4096):
+        """Stream the matrix as TSV in column chunks (same layout as DataFrame.to_csv)."""
+        matrix = self.matrix
+        with open(path, "w") as out:
+            out.write("\t".join([""] + self.orthogroups) + "\n" if self.orthogroups else '""\n')
+            for name, row in zip(self.species, matrix):
+                out.write(name)
+                for start in range(0, len(row), chunk_size):
+                    out.write("\t" + "\t".join(map(str, row[start:start + chunk_size].tolist())))
+                out.write("\n")
+
+    def write_npz(self, path, sparse=False):
+        """Save as .npz: dense `counts`, or COO `row`/`col`/`data` triplets with `sparse`."""
+        arrays = {
+            "species": np.array(self.species, dtype=str),
+            "orthogroups": np.array(self.orthogroups, dtype=str),
+            "shape": np.array(self.matrix.shape, dtype=np.int64),
+        }
+        if sparse:
+            row, col = np.nonzero(self.matrix)
+            arrays.update(row=row.astype(np.int32), col=col.astype(np.int32), data=self.matrix[row, col])
+        else:
+            arrays["counts"] = self.matrix
+        np.savez_compressed(path, **arrays)
+
+    def write_parquet(self, path):
+        """Save as long-format Parquet (see refine_tables.py)."""
+        refine_tables.write_counts_parquet(path, self.species, self.orthogroups, self.matrix)
+
+
+class RefinementManifest:
+    """Per-orthogroup record of inputs and results, kept in the output directory.
+
+    Entries are only reused while Orthogroups.tsv (by hash) and the method are
+    the same as when they were written. An input FASTA counts as unchanged if
+    its size and mtime match, or failing that, its hash (for a packed store the
+    mtime is the store's, so a repack falls back to per-orthogroup hashes).
+    The same check is applied to the orthogroup's domain table for hmm runs.
+    """
+
+    NAME = "refine_manifest.json"
+
+    def __init__(self, output_dir, tsv_digest, method, check_outputs=True):
+        self.path = os.path.join(output_dir, self.NAME)
+        self.output_dir = output_dir
+        self.tsv_digest = tsv_digest
+        self.method = method
+        self.check_outputs = check_outputs
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved.get("orthogroups_tsv_sha1") == tsv_digest and saved.get("method") == method:
+                self.entries = saved["orthogroups"]
+        self.last_save = time.monotonic()
+
+    @staticmethod
+    def _unchanged(og, store, source):
+        if og not in store:
+            return False
+        size, mtime_ns = store.stat(og)
+        if size != source["size"]:
+            return False
+        if mtime_ns != source["mtime_ns"]:
+            if store.digest(og) != source["sha1"]:
+                return False
+            source["mtime_ns"] = mtime_ns
+        return True
+
+    def lookup(self, og, sequences, n_species, tables=None):
+        """Return cached [(counts, summary_row), ...] if og is up to date in `sequences`, else None.
+
+        tables holds the domain tables of an hmm run (FastaDirectory of .tbl files).
+        """
+        entry = self.entries.get(og)
+        if entry is None:
+            return None
+        if self.check_outputs and not os.path.exists(os.path.join(self.output_dir, f"{og}.fa")):
+            return None
+        if not self._unchanged(og, sequences, entry["source"]):
+            return None
+        if tables is not None and not ("hmm_table" in entry and self._unchanged(og, tables, entry["hmm_table"])):
+            return None
+        results = []
+        for cached in entry["results"]:
+            counts = np.zeros(n_species, dtype=np.int64)
+            for sp, n in cached["counts"]:
+                counts[sp] = n
+            results.append((counts, cached["summary"]))
+        return results
+
+    def record(self, og, source, results, hmm_table=None):
+        self.entries[og] = {
+            "source": source,
+            "results": [
+                {"counts": [[int(sp), int(counts[sp])] for sp in np.flatnonzero(counts)], "summary": summary_row}
+                for counts, summary_row in results
+            ],
+        }
+        if hmm_table is not None:
+            self.entries[og]["hmm_table"] = hmm_table
+
+    def save(self, min_interval=0.0):
+        """Write the manifest atomically, at most every `min_interval` seconds."""
+        now = time.monotonic()
+        if now - self.last_save < min_interval:
+            return
+        self.last_save = now
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"orthogroups_tsv_sha1": self.tsv_digest, "method": self.method,
+                       "orthogroups": self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+
+class ProgressReporter:
+    """Print a progress line at most once every `interval` seconds."""
+
+    def __init__(self, total, interval=30.0, label="orthogroups"):
+        self.total = total
+        self.interval = interval
+        self.label = label
+        self.done = 0
+        self.start = time.monotonic()
+        self.last = self.start
+
+    def update(self, n=1):
+        self.done += n
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            self._report(now)
+
+    def finish(self):
+        self._report(time.monotonic())
+
+    def _report(self, now):
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        print(f"Processed {self.done}/{self.total} {self.label} "
+              f"({rate:.1f}/s, {elapsed:.0f}s elapsed)", flush=True)
+
+
+def _sd(values):
+    # Sample SD (ddof=1), NaN for a single value, as pandas reports it
+    return values.std(ddof=1) if len(values) > 1 else np.nan
+
+
+class FilterMethod:
+    """A filter given as NAME[:PARAM[:PARAM]], e.g. sd, sd:2, mad:3, quantile:0.1:0.9, hmm:0.6:50.
+
+    sd keeps mean ± k·SD (k=1), mad keeps median ± c·MAD (c=2.5) and quantile
+    keeps lengths between two quantiles (0.05, 0.95). hmm keeps members whose
+    domains in the orthogroup's hmmsearch --domtblout table cover at least a
+    fraction of the HMM (0.5) with a summed domain score of at least a minimum
+    (0), counting only domains up to a maximum i-Evalue (0.01); members without
+    a hit are removed. The spec string is used as the label in the Method column.
+    """
+
+    DEFAULTS = {"sd": (1.0,), "mad": (2.5,), "quantile": (0.05, 0.95), "hmm": (0.5, 0.0, 0.01)}
+
+    def __init__(self, spec):
+        name, *params = spec.split(":")
+        if name not in self.DEFAULTS:
+            raise argparse.ArgumentTypeError(f"unknown method '{name}' (choose from {', '.join(self.DEFAULTS)})")
+        defaults = self.DEFAULTS[name]
+        if len(params) > len(defaults):
+            raise argparse.ArgumentTypeError(f"'{name}' takes at most {len(defaults)} parameter(s): {spec}")
+        try:
+            values = tuple(float(p) for p in params)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid method parameters: {spec}")
+        self.name = name
+        self.params = values + defaults[len(values):]
+        self.label = spec
+
+    def __repr__(self):
+        return f"FilterMethod({self.label!r})"
+
+    @property
+    def uses_hmm(self):
+        return self.name == "hmm"
+
+    def keep_mask(self, lengths, ids=None, hmm_table=None):
+        """Boolean mask of members to keep; hmm also needs the member ids and domain table."""
+        if self.name == "hmm":
+            min_coverage, min_score, max_evalue = self.params
+            cov = hmm_coverage(hmm_table, max_evalue=max_evalue)
+            passing = set(cov["target"][(cov["coverage"] >= min_coverage) & (cov["score"] >= min_score)].tolist())
+            return np.array([seq_id in passing for seq_id in ids], dtype=bool)
+        if self.name == "sd":
+            k, = self.params
+            mu, sigma = lengths.mean(), lengths.std()
+            return (lengths >= mu - k * sigma) & (lengths <= mu + k * sigma)
+        if self.name == "mad":
+            c, = self.params
+            median = np.median(lengths)
+            mad = np.median(np.abs(lengths - median))
+            cutoff = c * mad
+            return (lengths >= median - cutoff) & (lengths <= median + cutoff)
+        low, high = np.quantile(lengths, self.params)
+        return (lengths >= low) & (lengths <= high)
+
+
+def summarize_refinement(basename, lengths, keep_mask, label):
+    """Summary row for one orthogroup and filter."""
+    total = len(lengths)
+    refined_lengths = lengths[keep_mask]
+    refined = len(refined_lengths)
+    return {
         "Orthogroup": basename,
         "Total": total,
         "Refined": refined,
-        "Removed": removed,
-        "Mean_Before": round(mean_before, 2),
-        "SD_Before": round(sd_before, 2),
-        "Mean_After": round(mean_after, 2) if refined > 0 else 0,
-        "SD_After": round(sd_after, 2) if refined > 0 else 0,
-        "Method": method
+        "Removed": total - refined,
+        "Mean_Before": round(lengths.mean(), 2),
+        "SD_Before": round(_sd(lengths), 2),
+        "Mean_After": round(refined_lengths.mean(), 2) if refined > 0 else 0,
+        "SD_After": round(_sd(refined_lengths), 2) if refined > 0 else 0,
+        "Method": label
     }
 
-    print(f"{basename}: total={total}, refined={refined}, removed={removed}, "
-          f"mean_before={mean_before:.1f}, sd_before={sd_before:.1f}, "
-          f"mean_after={mean_after:.1f}, sd_after={sd_after:.1f}, method={method}")
 
-    return species_counts, summary_row
+def _records(fasta):
+    return fasta if isinstance(fasta, FastaRecords) else read_fasta(fasta)
+
+
+def refine_orthogroup(fasta, basename, output_dir, og_index, method="sd", hmm_table=None):
+    """Refine sequences in a single orthogroup and return counts + summary stats.
+
+    fasta is a FASTA path or FastaRecords (e.g. from a packed store); hmm_table
+    is the orthogroup's domain table (read_domtblout) for the hmm method.
+    """
+    if not isinstance(method, FilterMethod):
+        method = FilterMethod(method)
+    records = _records(fasta)
+
+    if len(records) == 0:
+        return None, None
+
+    keep_mask = method.keep_mask(records.lengths, records.ids, hmm_table)
+
+    # Save refined FASTA as {basename}.fa
+    file_out = os.path.join(output_dir, f"{basename}.fa")
+    records.write(file_out, keep_mask)
+
+    # Map sequences → species
+    kept_ids = [seq_id for seq_id, keep in zip(records.ids, keep_mask.tolist()) if keep]
+    species_counts = og_index.species_counts(basename, kept_ids)
+
+    return species_counts, summarize_refinement(basename, records.lengths, keep_mask, method.label)
+
+
+def sweep_orthogroup(fasta, basename, og_index, methods, hmm_table=None):
+    """Evaluate several filters on one parse of an orthogroup; returns [(counts, summary_row), ...].
+
+    No refined FASTAs are written in a sweep.
+    """
+    records = _records(fasta)
+
+    if len(records) == 0:
+        return None
+
+    species_codes = og_index.species_codes(basename, records.ids)
+    known = species_codes >= 0
+
+    results = []
+    for method in methods:
+        keep_mask = method.keep_mask(records.lengths, records.ids, hmm_table)
+        counts = np.bincount(species_codes[keep_mask & known], minlength=len(og_index.species))
+        results.append((counts, summarize_refinement(basename, records.lengths, keep_mask, method.label)))
+    return results
+
+
+def format_summary(row):
+    """One-line log message for a summary row."""
+    return (f"{row['Orthogroup']}: total={row['Total']}, refined={row['Refined']}, removed={row['Removed']}, "
+            f"mean_before={row['Mean_Before']:.1f}, sd_before={row['SD_Before']:.1f}, "
+            f"mean_after={row['Mean_After']:.1f}, sd_after={row['SD_After']:.1f}, method={row['Method']}")
+
+
+# Per-process state for worker processes, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(og_index, input_path, output_dir, methods, sweep, hmm_dir=None):
+    # Each worker opens (and for a packed store, memory-maps) the input itself
+    _worker.update(og_index=og_index, sequences=open_sequences(input_path), output_dir=output_dir,
+                   methods=methods, sweep=sweep, tables=FastaDirectory(hmm_dir, ".tbl") if hmm_dir else None)
+
+
+def _refine_task(og):
+    """Refine one orthogroup inside a worker; returns (og, results, warning, source).
+
+    results is a list of (counts, summary_row), one per method, or None for an
+    empty FASTA. source is the input fingerprint, with the domain table's under
+    "hmm_table" for hmm runs.
+    """
+    sequences = _worker["sequences"]
+    tables = _worker["tables"]
+    if og not in sequences:
+        return og, None, f"Warning: {sequences.describe(og)} not found, skipping", None
+    if tables is not None and og not in tables:
+        return og, None, f"Warning: {tables.describe(og)} not found, skipping", None
+    source = sequences.fingerprint(og)
+    records = sequences.records(og)
+    hmm_table = None
+    if tables is not None:
+        source["hmm_table"] = tables.fingerprint(og)
+        hmm_table = read_domtblout(tables.describe(og))
+    if _worker["sweep"]:
+        results = sweep_orthogroup(records, og, _worker["og_index"], _worker["methods"], hmm_table)
+    else:
+        counts, summary_row = refine_orthogroup(records, og, _worker["output_dir"], _worker["og_index"],
+                                                method=_worker["methods"][0], hmm_table=hmm_table)
+        results = [(counts, summary_row)] if summary_row else None
+    return og, results, None, source
+
+
+def run_refinement(og_list, og_index, input_path, output_dir, methods, sweep=False, jobs=1, hmm_dir=None):
+    """Yield (og, results, warning, source) for og_list, in og_list order.
+
+    With jobs > 1 orthogroups are spread over a process pool; results are still
+    yielded in input order, so the merged tables do not depend on which worker
+    finishes first. hmm_dir holds the <OG>.tbl domain tables for hmm methods.
+    """
+    init_args = (og_index, input_path, output_dir, methods, sweep, hmm_dir)
+    if jobs <= 1:
+        _init_worker(*init_args)
+        yield from map(_refine_task, og_list)
+        return
+    chunksize = max(1, min(64, len(og_list) // (jobs * 8)))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=init_args) as pool:
+        yield from pool.map(_refine_task, og_list, chunksize=chunksize)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Refine Orthogroups by seq length filtering")
-    parser.add_argument("-i", "--input", required=True, help="Path to Orthogroup_Sequences directory")
+    parser.add_argument("-i", "--input", required=True,
+                        help="Path to Orthogroup_Sequences directory, or a store packed with orthogroup_store.py")
     parser.add_argument("-o", "--output", required=True, help="Output directory for refined FASTAs + summary tables")
     parser.add_argument("-l", "--list", required=True, help="File with orthogroup list (one per line, can include .fa)")
     parser.add_argument("-t", "--tsv", required=True, help="Path to Orthogroups.tsv")
-    parser.add_argument("-m","--method", choices=["sd", "mad", "quantile"], default="sd",
-                        help="Filtering method: sd (mean±SD), mad (median±MAD), or quantile (default 5–95 percent)")
+    parser.add_argument("--index", default=None,
+                        help="Cache the Orthogroups.tsv index here (.npz); reused while Orthogroups.tsv is unchanged")
+    parser.add_argument("-m","--method", type=FilterMethod, default=FilterMethod("sd"),
+                        help="Filtering method: sd (mean±SD), mad (median±MAD), or quantile (default 5–95 percent); "
+                             "parameters can be given as sd:K, mad:C or quantile:LOW:HIGH. "
+                             "hmm[:MIN_COVERAGE[:MIN_SCORE[:MAX_IEVALUE]]] filters on HMM coverage (needs --hmm-dir)")
+    parser.add_argument("--sweep", type=FilterMethod, nargs="+", default=None, metavar="METHOD",
+                        help="Evaluate several methods from one parse of each orthogroup, e.g. "
+                             "--sweep sd sd:2 mad:3 quantile:0.1:0.9. Writes one summary table and one count "
+                             "matrix per method; no refined FASTAs")
+    parser.add_argument("--hmm-dir", default=None,
+                        help="Directory of hmmsearch --domtblout tables (<OG>.tbl, from 02_OG_hmmsearch.sh) "
+                             "for the hmm method")
+    parser.add_argument("--output-format", choices=["tsv", "parquet", "both"], default="tsv",
+                        help="Format of the count matrix and summary tables: TSV, typed Parquet (needs pyarrow; "
+                             "read either with refine_tables.py), or both (default: tsv)")
+    parser.add_argument("--npz", choices=["dense", "coo"], default=None,
+                        help="Also save the count matrix as Orthogroup_Refined_Gene_Counts.npz (dense or sparse COO)")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocess every orthogroup instead of reusing results from the manifest")
+    parser.add_argument("-j", "--jobs", "--threads", dest="jobs", type=int, default=1,
+                        help="Number of worker processes (default: 1)")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Print one line per orthogroup instead of periodic progress")
+    parser.add_argument("--progress-interval", type=float, default=30.0,
+                        help="Seconds between progress lines (default: 30)")
     args = parser.parse_args()
 
     os.makedirs(args.output, exist_ok=True)
+    sweep = args.sweep is not None
+    methods = args.sweep if sweep else [args.method]
+    labels = [method.label for method in methods]
+    if len(set(labels)) != len(labels):
+        parser.error("--sweep methods must be unique")
+    uses_hmm = any(method.uses_hmm for method in methods)
+    if uses_hmm and not args.hmm_dir:
+        parser.error("the hmm method needs --hmm-dir")
+    hmm_dir = args.hmm_dir if uses_hmm else None
+    write_tsv = args.output_format in ("tsv", "both")
+    write_parquet = args.output_format in ("parquet", "both")
+    if write_parquet and refine_tables.pa is None:
+        parser.error("--output-format parquet needs pyarrow (pip install pyarrow)")
 
-    # Load Orthogroups.tsv
-    og_df = pd.read_csv(args.tsv, sep="\t", dtype=str).fillna("")
+    # Index Orthogroups.tsv once (sequence → orthogroup/species)
+    og_index = OrthogroupIndex.load_or_build(args.tsv, args.index)
 
     # Load OG list and strip ".fa" if present
     with open(args.list) as f:
         og_list = [line.strip().replace(".fa", "") for line in f if line.strip()]
 
-    all_species = list(og_df.columns[1:])
-    summary_matrix = pd.DataFrame(index=all_species)
+    n_columns = len(set(og_list))
+    summary_matrices = [CountMatrix(og_index.species, n_columns) for _ in methods]
     summary_rows = []
 
-    for og in og_list:
-        fasta_path = os.path.join(args.input, f"{og}.fa")
-        if not os.path.exists(fasta_path):
-            print(f"Warning: {fasta_path} not found, skipping")
-            continue
-        counts, summary_row = refine_orthogroup(fasta_path, og, args.output, og_df, method=args.method)
-        if counts:
-            summary_matrix[og] = pd.Series(counts)
-        if summary_row:
-            summary_rows.append(summary_row)
-
-    # Write all-species × OG counts matrix
-    summary_matrix_out = os.path.join(args.output, "Orthogroup_Refined_Gene_Counts.tsv")
-    summary_matrix.to_csv(summary_matrix_out, sep="\t")
+    # Reuse results for orthogroups whose inputs are unchanged since the last run
+    manifest_key = ("sweep:" + ",".join(labels)) if sweep else labels[0]
+    manifest = RefinementManifest(args.output, file_digest(args.tsv), manifest_key, check_outputs=not sweep)
+    sequences = open_sequences(args.input)
+    tables = FastaDirectory(hmm_dir, ".tbl") if hmm_dir else None
+    cached = {}
+    if not args.force:
+        for og in og_list:
+            hit = manifest.lookup(og, sequences, len(og_index.species), tables)
+            if hit is not None:
+                cached[og] = hit
+    pending = [og for og in og_list if og not in cached]
+    print(f"Reusing {len(cached)} orthogroups from {manifest.path}; refining {len(pending)}")
 
-    # Write refinement summary
-    refinement_summary_out = os.path.join(args.output, "Orthogroup_Refinement_Summary.tsv")
-    pd.DataFrame(summary_rows).to_csv(refinement_summary_out, sep="\t", index=False)
+    progress = ProgressReporter(len(pending), interval=args.progress_interval)
+    results_iter = run_refinement(pending, og_index, args.input, args.output, methods, sweep=sweep,
+                                 jobs=args.jobs, hmm_dir=hmm_dir)
+    try:
+        for og in og_list:
+            if og in cached:
+                results = cached[og]
+            else:
+                og, results, warning, source = next(results_iter)
+                progress.update()
+                if warning:
+                    print(warning)
+                    continue
+                if results:
+                    manifest.record(og, source, results, hmm_table=source.pop("hmm_table", None))
+                    manifest.save(min_interval=60.0)
+                    if args.verbose:
+                        for _, summary_row in results:
+                            print(format_summary(summary_row))
+            for summary_matrix, (counts, summary_row) in zip(summary_matrices, results or []):
+                summary_matrix.add(og, counts)
+                summary_rows.append(summary_row)
+    finally:
+        manifest.save()
+    progress.finish()
 
-    print(f"Species count matrix written to: {summary_matrix_out}")
-    print(f"Refinement summary written to: {refinement_summary_out}")
+    # Write all-species × OG counts matrix (one per method in a sweep)
+    for method, summary_matrix in zip(methods, summary_matrices):
+        name = f"Orthogroup_Refined_Gene_Counts.{method.label.replace(':', '_')}" if sweep \
+            else "Orthogroup_Refined_Gene_Counts"
+        if write_tsv:
+            summary_matrix_out = os.path.join(args.output, f"{name}.tsv")
+            summary_matrix.write_tsv(summary_matrix_out)
+            print(f"Species count matrix written to: {summary_matrix_out}")
+        if write_parquet:
+            summary_matrix_out = os.path.join(args.output, f"{name}.parquet")
+            summary_matrix.write_parquet(summary_matrix_out)
+            print(f"Species count matrix written to: {summary_matrix_out}")
+        if args.npz:
+            summary_matrix.write_npz(os.path.join(args.output, f"{name}.npz"), sparse=args.npz == "coo")
+
+    # Write refinement summary
+    if write_tsv:
+        refinement_summary_out = os.path.join(args.output, "Orthogroup_Refinement_Summary.tsv")
+        pd.DataFrame(summary_rows).to_csv(refinement_summary_out, sep="\t", index=False)
+        print(f"Refinement summary written to: {refinement_summary_out}")
+    if write_parquet:
+        refinement_summary_out = os.path.join(args.output, "Orthogroup_Refinement_Summary.parquet")
+        refine_tables.write_summary_parquet(refinement_summary_out, summary_rows)
+        print(f"Refinement summary written to: {refinement_summary_out}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
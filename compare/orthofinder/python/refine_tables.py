@@ -0,0 +1,122 @@
+"""Write and load the refine_orthogroups.py output tables as TSV or Parquet.
+
+The Parquet files hold typed columns instead of text:
+
+  - Orthogroup_Refined_Gene_Counts.parquet: long format, one row per non-zero
+    cell (Orthogroup and Species dictionary-encoded, Count int32). The full
+    species and orthogroup order is kept in the schema metadata, so the matrix
+    is rebuilt exactly, zeros included.
+  - Orthogroup_Refinement_Summary.parquet: int32 counts, float32 statistics,
+    dictionary-encoded Orthogroup and Method.
+
+The loaders accept either format and return what pd.read_csv returns for the
+TSV:
+
+    from refine_tables import load_counts, load_summary
+    counts = load_counts("refined/Orthogroup_Refined_Gene_Counts.parquet")   # species × orthogroups
+    summary = load_summary("refined/Orthogroup_Refinement_Summary.tsv")
+
+pyarrow is only needed for Parquet files.
+"""
+import json
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+SUMMARY_INT_COLUMNS = ["Total", "Refined", "Removed"]
+SUMMARY_FLOAT_COLUMNS = ["Mean_Before", "SD_Before", "Mean_After", "SD_After"]
+METADATA_KEY = b"refine_orthogroups"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet output needs pyarrow (pip install pyarrow, or conda install -c conda-forge pyarrow)")
+
+
+def _is_parquet(path):
+    return str(path).endswith(".parquet")
+
+
+def write_counts_parquet(path, species, orthogroups, matrix):
+    """Write a species × orthogroup count matrix as long-format Parquet (non-zero cells only)."""
+    _require_pyarrow()
+    sp_codes, og_codes = np.nonzero(matrix)
+    table = pa.table({
+        "Orthogroup": pa.DictionaryArray.from_arrays(og_codes.astype(np.int32), pa.array(orthogroups, pa.string())),
+        "Species": pa.DictionaryArray.from_arrays(sp_codes.astype(np.int32), pa.array(species, pa.string())),
+        "Count": pa.array(matrix[sp_codes, og_codes].astype(np.int32)),
+    })
+    layout = json.dumps({"species": list(species), "orthogroups": list(orthogroups)})
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: layout.encode()})
+    pq.write_table(table, path)
+
+
+def write_summary_parquet(path, rows):
+    """Write summary rows (list of dicts from summarize_refinement) as typed Parquet."""
+    _require_pyarrow()
+    summary = pd.DataFrame(rows)
+    columns = {}
+    for name in summary.columns:
+        values = summary[name]
+        if name in SUMMARY_INT_COLUMNS:
+            columns[name] = pa.array(values.to_numpy(np.int32))
+        elif name in SUMMARY_FLOAT_COLUMNS:
+            columns[name] = pa.array(values.to_numpy(np.float32))
+        else:
+            columns[name] = pa.array(values.astype(str)).dictionary_encode()
+    pq.write_table(pa.table(columns), path)
+
+
+def load_count_matrix(path):
+    """Return (species, orthogroups, int32 matrix) from a counts TSV or Parquet file."""
+    if not _is_parquet(path):
+        counts = pd.read_csv(path, sep="\t", index_col=0)
+        return counts.index.astype(str).tolist(), counts.columns.tolist(), counts.to_numpy(np.int32)
+    _require_pyarrow()
+    table = pq.read_table(path)
+    layout = json.loads(table.schema.metadata[METADATA_KEY])
+    species, orthogroups = layout["species"], layout["orthogroups"]
+    matrix = np.zeros((len(species), len(orthogroups)), dtype=np.int32)
+    if table.num_rows:
+        # Map each chunk's dictionary onto the stored order before scattering counts
+        sp_pos = {name: i for i, name in enumerate(species)}
+        og_pos = {name: i for i, name in enumerate(orthogroups)}
+        for sp_chunk, og_chunk, count_chunk in zip(table.column("Species").chunks, table.column("Orthogroup").chunks,
+                                                   table.column("Count").chunks):
+            sp_map = np.array([sp_pos[name] for name in sp_chunk.dictionary.to_pylist()], dtype=np.int64)
+            og_map = np.array([og_pos[name] for name in og_chunk.dictionary.to_pylist()], dtype=np.int64)
+            matrix[sp_map[sp_chunk.indices.to_numpy()], og_map[og_chunk.indices.to_numpy()]] = count_chunk.to_numpy()
+    return species, orthogroups, matrix
+
+
+def load_counts(path):
+    """Species × orthogroup counts as a DataFrame, from TSV or Parquet."""
+    if not _is_parquet(path):
+        return pd.read_csv(path, sep="\t", index_col=0)
+    species, orthogroups, matrix = load_count_matrix(path)
+    return pd.DataFrame(matrix.astype(np.int64), index=pd.Index(species), columns=orthogroups)
+
+
+def load_summary(path):
+    """Refinement summary as a DataFrame, from TSV or Parquet.
+
+    Parquet statistics are stored as float32 and rounded back to the 2 decimals
+    written to the TSV.
+    """
+    if not _is_parquet(path):
+        return pd.read_csv(path, sep="\t")
+    _require_pyarrow()
+    summary = pq.read_table(path).to_pandas()
+    for name in summary.columns:
+        if name in SUMMARY_FLOAT_COLUMNS:
+            summary[name] = summary[name].astype(np.float64).round(2)
+        elif name in SUMMARY_INT_COLUMNS:
+            summary[name] = summary[name].astype(np.int64)
+        else:
+            summary[name] = summary[name].astype(str)
+    return summary